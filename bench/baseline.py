@@ -0,0 +1,173 @@
+##############################################################################
+#
+# Command line interface manager (CLIManager) for FreeRTOS+CLI
+# File: baseline.py
+# This file contains the results of the benchmarks in JSON, and their
+# comparison with a baseline: a metric worse than the baseline by more than
+# a threshold is a regression.
+#
+# This software is released under the MIT licence
+#
+# Copyright (c) 2015 Jean-Baptiste Quelard
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+###############################################################################
+#!/usr/bin/python
+#
+# The results of a benchmark:
+#   {"benchmark": "network", "time": ..., "python": ..., "platform": ...,
+#    "parameters": {...},
+#    "metrics": {"latency.udp.p50_ms": {"value": 0.4, "unit": "ms", "better": "lower",
+#				       "tolerance": 0.1}, ...}}
+# A change smaller than the tolerance of a metric is noise, never a regression.
+# The baselines of the benchmarks are kept in bench/baselines. They depend on
+# the machine: to be saved again (--save-baseline) on the machine running them.
+
+import os
+import sys
+import json
+import time
+import platform
+
+
+BASELINE_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines")
+DEFAULT_THRESHOLD = 20.0	# Change (%) of a metric making a regression
+LOWER = "lower"
+HIGHER = "higher"
+
+
+def Metric(value, unit, better, tolerance=0.0):
+  return {"value": value, "unit": unit, "better": better, "tolerance": tolerance}
+
+
+def MedianMetrics(runs):
+  """ Metrics of several runs, each one the median of its values """
+  Metrics = {}
+  for Name in runs[0]:
+    Values = sorted([Run[Name]["value"] for Run in runs if Name in Run])
+    Metrics[Name] = dict(runs[0][Name], value=Values[len(Values) // 2])
+  return Metrics
+
+
+def BestMetrics(runs):
+  """ Metrics of several runs, each one the best of its values: a timing can
+      only be made longer by the rest of the machine """
+  Metrics = {}
+  for Name in runs[0]:
+    Values = [Run[Name]["value"] for Run in runs if Name in Run]
+    Best = min(Values) if runs[0][Name]["better"] == LOWER else max(Values)
+    Metrics[Name] = dict(runs[0][Name], value=Best)
+  return Metrics
+
+
+def MakeResults(benchmark, parameters, metrics):
+  return {"benchmark": benchmark,
+	  "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+	  "python": platform.python_version(),
+	  "platform": platform.platform(),
+	  "parameters": parameters,
+	  "metrics": metrics}
+
+
+def GetBaselineFilename(benchmark):
+  return os.path.join(BASELINE_DIRECTORY, benchmark + ".json")
+
+
+def WriteResults(results, filename=None):
+  """ Write the results to the file, or to the standard output """
+  Text = json.dumps(results, indent=2, sort_keys=True, separators=(",", ": ")) + "\n"
+  if filename is None:
+    sys.stdout.write(Text)
+  else:
+    Directory = os.path.dirname(filename)
+    if Directory and not os.path.isdir(Directory):
+      os.makedirs(Directory)
+    with open(filename, "w") as File:
+      File.write(Text)
+
+
+def LoadResults(filename):
+  with open(filename) as File:
+    return json.load(File)
+
+
+def Compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+  """ Compare the metrics found in both. Returns (name, baseline value, value,
+      change (%), regression) sorted by name, the change being positive when
+      the metric is better """
+  Comparison = []
+  Metrics = results["metrics"]
+  for Name, Base in sorted(baseline["metrics"].items()):
+    if Name not in Metrics:
+      continue
+    Value = Metrics[Name]["value"]
+    if Base["value"]:
+      Change = (Value - Base["value"]) * 100.0 / Base["value"]
+    else:
+      Change = 100.0 if Value > 0 else 0.0	# From nothing, e.g. errors
+    if Base["better"] == LOWER:
+      Change = -Change or 0.0  # Not -0.0
+    Noise = abs(Value - Base["value"]) <= Base.get("tolerance", 0.0)
+    Comparison.append((Name, Base["value"], Value, Change, Change < -threshold and not Noise))
+  return Comparison
+
+
+def PrintComparison(comparison, stream=sys.stderr):
+  """ Print the comparison, returns the number of regressions """
+  Regressions = 0
+  for Name, Base, Value, Change, Regression in comparison:
+    stream.write("%-40s %12.3f %12.3f %+8.1f%%%s\n" % (Name, Base, Value, Change, \
+							   "  REGRESSION" if Regression else ""))
+    Regressions += Regression
+  stream.write("%d metrics compared, %d regressions\n" % (len(comparison), Regressions))
+  return Regressions
+
+
+def AddBaselineArguments(argparser, benchmark, threshold=DEFAULT_THRESHOLD):
+  """ Options shared by the benchmarks writing JSON """
+  argparser.add_argument("-o", "--output", default=None, help="file receiving the results (default: standard output)")
+  argparser.add_argument("-b", "--baseline", default=GetBaselineFilename(benchmark), \
+			 help="results compared with (default: %(default)s)")
+  argparser.add_argument("--threshold", type=float, default=threshold, \
+			 help="change (%%) of a metric making a regression (default: %(default)s)")
+  argparser.add_argument("--save-baseline", action="store_true", help="save the results as the baseline")
+
+
+def Conclude(results, args):
+  """ Write the results, compare them with the baseline or save them as the
+      baseline. Returns the exit status: 1 on regression. The results of other
+      parameters than the baseline are not compared """
+  WriteResults(results, args.output)
+  if args.save_baseline:
+    WriteResults(results, args.baseline)
+    sys.stderr.write("Baseline saved to %s\n" % args.baseline)
+    return 0
+  if not os.path.exists(args.baseline):
+    sys.stderr.write("No baseline %s, --save-baseline to create it\n" % args.baseline)
+    return 0
+  Baseline = LoadResults(args.baseline)
+  Differing = sorted([Name for Name in set(Baseline["parameters"]) | set(results["parameters"]) \
+		      if Baseline["parameters"].get(Name) != results["parameters"].get(Name)])
+  if Differing:
+    # The metrics depend on them: another run can't be compared
+    sys.stderr.write("Not compared, the baseline was measured with other parameters: %s\n" % \
+		     json.dumps(dict([(Name, Baseline["parameters"].get(Name)) for Name in Differing]), \
+				sort_keys=True))
+    return 0
+  return 1 if PrintComparison(Compare(results, Baseline, args.threshold)) else 0
@@ -0,0 +1,227 @@
+##############################################################################
+#
+# Command line interface manager (CLIManager) for FreeRTOS+CLI
+# File: corpus.py
+# This file contains the generator of synthetic sets of commands: FreeRTOS+CLI
+# sources and .set files declaring any number of commands, written in all the
+# ways met in real projects, for the benchmarks of the parser and of the
+# syntax assistant.
+#
+# This software is released under the MIT licence
+#
+# Copyright (c) 2015 Jean-Baptiste Quelard
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+###############################################################################
+#!/usr/bin/python
+#
+# A corpus of a size holds that many definitions. Some of them define again a
+# command already defined, as happens when several files are imported: the
+# same definition or another one (a conflict). The commands are named
+# <module>-<action>-<number>, so that the prefixes typed share many commands
+# at first and few at the end. The same seed gives the same corpus.
+
+import os
+import sys
+import random
+import argparse
+
+MODULES = ["net", "ip", "tcp", "udp", "task", "heap", "file", "dir", "trace", "log",
+	   "gpio", "adc", "uart", "spi", "i2c", "rtc", "power", "flash", "sensor", "led"]
+ACTIONS = ["show", "set", "get", "reset", "start", "stop", "list", "stats", "dump", "test"]
+PARAMETERS = ["index", "value", "name", "address", "port", "count", "mode", "level"]
+SIZES = [10, 1000, 10000, 100000]
+DUPLICATES = 0.05	# Part of the definitions naming a command already defined
+CONFLICTS = 0.5		# Part of those defining it differently
+DEFAULT_SEED = 1
+
+
+class Definition:
+  """ A command as declared: name, number of arguments and help string """
+
+  def __init__(self, name, args, help, arglist):
+    self.Name = name
+    self.Args = args
+    self.Help = help
+    self.ArgList = arglist	# Arguments of the help string
+
+
+def SizeName(size):
+  """ 10, 1k, 10k... """
+  if size >= 1000 and size % 1000 == 0:
+    return "%dk" % (size // 1000)
+  return str(size)
+
+
+def MakeHelp(rand, name, args):
+  """ Help string as FreeRTOS+CLI expects it, the arguments between <> or []
+      (choices) when they are known, <...> for any number of arguments.
+      Returns the help string and its arguments """
+  if args < 0:
+    ArgList = ["<...>"]
+  else:
+    ArgList = []
+    for Argument in range(args):
+      if rand.random() < 0.2:
+	ArgList.append("[on | off]")
+      else:
+	ArgList.append("<%s>" % rand.choice(PARAMETERS))
+  Help = "\\r\\n%s%s:\\r\\n %s the %s\\r\\n" % (name, "".join([" " + Arg for Arg in ArgList]), \
+					     rand.choice(ACTIONS).capitalize(), name.split("-")[0])
+  return Help, [Arg[1:-1] for Arg in ArgList]
+
+
+def MakeArgs(rand):
+  Draw = rand.random()
+  if Draw < 0.3:
+    return 0
+  if Draw < 0.4:
+    return -1	# Any number of arguments
+  return rand.randint(1, 3)
+
+
+def MakeDefinitions(size, seed=DEFAULT_SEED):
+  """ The definitions of a corpus, duplicates included """
+  rand = random.Random(seed)
+  Definitions = []
+  for Number in range(size):
+    if Definitions and rand.random() < DUPLICATES:
+      Previous = rand.choice(Definitions)
+      if rand.random() < CONFLICTS:
+	Args = MakeArgs(rand)
+	Help, ArgList = MakeHelp(rand, Previous.Name, Args)
+	Definitions.append(Definition(Previous.Name, Args, Help, ArgList))
+      else:
+	Definitions.append(Previous)
+      continue
+    Name = "%s-%s-%d" % (rand.choice(MODULES), rand.choice(ACTIONS), Number)
+    Args = MakeArgs(rand)
+    Help, ArgList = MakeHelp(rand, Name, Args)
+    Definitions.append(Definition(Name, Args, Help, ArgList))
+  return Definitions
+
+
+def Identifier(definition):
+  return "".join([Word.capitalize() for Word in definition.Name.split("-")])
+
+
+def FormatDeclaration(rand, definition, number):
+  """ The declaration of a definition in one of the layouts found in sources """
+  Name = Identifier(definition)
+  Layout = rand.randint(0, 5)
+  if Layout == 0:
+    # As in the demo
+    return "/* Structure that defines the \"%s\" command line command. */\n" \
+	   "static const CLI_Command_Definition_t x%s%d =\n{\n" \
+	   "\t\"%s\", /* The command string to type. */\n" \
+	   "\t\"%s\",\n" \
+	   "\tprv%sCommand, /* The function to run. */\n" \
+	   "\t%d /* Number of parameters expected. */\n};\n\n" % \
+	   (definition.Name, Name, number, definition.Name, definition.Help, Name, definition.Args)
+  if Layout == 1:
+    # On a single line
+    return "static const CLI_Command_Definition_t x%s%d={\"%s\",\"%s\",prv%sCommand,%d};\n" % \
+	   (Name, number, definition.Name, definition.Help, Name, definition.Args)
+  if Layout == 2:
+    # Odd whitespace and Windows line ends
+    return "static   const\tCLI_Command_Definition_t   x%s%d   =\r\n\t\t{  \r\n   \"%s\"  ,\r\n" \
+	   "\t\"%s\"\t,\r\n\r\n   prv%sCommand ,\t\t%d\r\n  } ;\r\n" % \
+	   (Name, number, definition.Name, definition.Help, Name, definition.Args)
+  if Layout == 3:
+    # Line comments, an explicit sign and a conditional compilation
+    return "#if configINCLUDE_%s_COMMAND == 1\n" \
+	   "\tstatic const CLI_Command_Definition_t x%s%d =\n\t{ // \"%s\"\n" \
+	   "\t\t\"%s\", // Command\n\t\t\"%s\", // Help\n" \
+	   "\t\tprv%sCommand,\n\t\t%+d // Parameters\n\t};\n#endif\n\n" % \
+	   (Name.upper(), Name, number, definition.Name, definition.Name, definition.Help, \
+	    Name, definition.Args)
+  if Layout == 4:
+    # A former declaration commented out, which isn't to be imported
+    return "/* Replaced:\nstatic const CLI_Command_Definition_t xOld%s%d =\n" \
+	   "{ \"old-%s\", \"\\r\\nold-%s:\\r\\n Former\\r\\n\", prvOld%s, 0 };\n*/\n" \
+	   "static const CLI_Command_Definition_t x%s%d = { \"%s\", /* name */ \"%s\", prv%sCommand, " \
+	   "/* args */ %d };\n\n" % \
+	   (Name, number, definition.Name, definition.Name, Name, Name, number, definition.Name, \
+	    definition.Help, Name, definition.Args)
+  # Among other code, with strings and characters looking like declarations
+  return "static const char *pc%sUsage = \"static const CLI_Command_Definition_t x = {\";\n" \
+	 "static const char c%sOpen = '{';\n" \
+	 "static const CLI_Command_Definition_t x%s%d =\n{\n\t\"%s\",\n\t\"%s\",\n" \
+	 "\tprv%sCommand,\n\t%d\n};\n\n" % \
+	 (Name, Name, Name, number, definition.Name, definition.Help, Name, definition.Args)
+
+
+def WriteSource(filename, definitions, seed=DEFAULT_SEED):
+  """ Write the definitions as a FreeRTOS+CLI source file """
+  rand = random.Random(seed)
+  with open(filename, "w") as Source:
+    Source.write("/* Synthetic FreeRTOS+CLI commands: %d definitions */\n\n" \
+		 "#include \"FreeRTOS.h\"\n#include \"FreeRTOS_CLI.h\"\n\n" % len(definitions))
+    for Number, Definition in enumerate(definitions):
+      Source.write(FormatDeclaration(rand, Definition, Number))
+    Source.write("\nvoid vRegisterSyntheticCommands( void )\n{\n\t/* Registered elsewhere */\n}\n")
+
+
+def WriteSet(filename, definitions, seed=DEFAULT_SEED):
+  """ Write the definitions as a text .set file. Some lines hold the arguments
+      found at import, the others have their help string parsed again """
+  rand = random.Random(seed)
+  with open(filename, "w") as SetFile:
+    SetFile.write("# Synthetic set: %d definitions\n" % len(definitions))
+    for Definition in definitions:
+      if rand.random() < 0.5:
+	Arguments = ""
+      else:
+	Arguments = ',"%s"' % "".join(["<" + Arg + ">" for Arg in Definition.ArgList])
+      if rand.random() < 0.2:
+	SetFile.write('  "%s" ,\t"%s" , %d %s\n' % (Definition.Name, Definition.Help, Definition.Args, Arguments))
+      else:
+	SetFile.write('"%s","%s",%d%s\n' % (Definition.Name, Definition.Help, Definition.Args, Arguments))
+
+
+def WriteCorpus(directory, size, seed=DEFAULT_SEED):
+  """ Write the source and the .set file of a corpus. Returns their names and
+      the definitions """
+  Definitions = MakeDefinitions(size, seed)
+  Base = os.path.join(directory, "commands_%s" % SizeName(size))
+  WriteSource(Base + ".c", Definitions, seed)
+  WriteSet(Base + ".set", Definitions, seed)
+  return Base + ".c", Base + ".set", Definitions
+
+
+def Main(argv):
+  ArgParser = argparse.ArgumentParser(description="Write synthetic FreeRTOS+CLI sources and .set files")
+  ArgParser.add_argument("-n", "--size", type=int, action="append", default=None, \
+			 help="definitions in a corpus, can be repeated (default: %s)" % \
+			 ", ".join([str(Size) for Size in SIZES]))
+  ArgParser.add_argument("-o", "--directory", default=".", help="directory written (default: %(default)s)")
+  ArgParser.add_argument("--seed", type=int, default=DEFAULT_SEED, help="seed of the corpus (default: %(default)s)")
+  Args = ArgParser.parse_args(argv)
+
+  if not os.path.isdir(Args.directory):
+    os.makedirs(Args.directory)
+  for Size in Args.size or SIZES:
+    Source, SetFile, Definitions = WriteCorpus(Args.directory, Size, Args.seed)
+    print "%s, %s: %d definitions, %d commands" % (Source, SetFile, len(Definitions), \
+						   len(set([Definition.Name for Definition in Definitions])))
+  return 0
+
+
+if __name__ == "__main__":
+  sys.exit(Main(sys.argv[1:]))
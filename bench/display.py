@@ -0,0 +1,138 @@
+##############################################################################
+#
+# Command line interface manager (CLIManager) for FreeRTOS+CLI
+# File: display.py
+# This file contains the benchmark of the display of the responses: a burst
+# of responses is inserted in a text view one by one, then through the output
+# backlog one frame at a time. The throughput is given in MB/s.
+#
+# This software is released under the MIT licence
+#
+# Copyright (c) 2015 Jean-Baptiste Quelard
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+###############################################################################
+#!/usr/bin/python
+#
+# The text view needs a display. Without Gtk only the backlog is measured.
+
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from render import OutputBacklog
+
+
+def MakeResponses(count, size):
+  Line = "".join([chr(ord("a") + Index % 26) for Index in range(size - 1)]) + "\n"
+  return ["%06d " % Number + Line[7:] for Number in range(count)]
+
+
+class TextView:
+  """ Text view of the CLI, with the prompt mark of the main window """
+
+  def __init__(self, Gtk):
+    self.Gtk = Gtk
+    self.Window = Gtk.OffscreenWindow()
+    self.Window.set_default_size(800, 600)
+    Scrolled = Gtk.ScrolledWindow()
+    self.CLITextview = Gtk.TextView()
+    self.CLITextbuffer = self.CLITextview.get_buffer()
+    Scrolled.add(self.CLITextview)
+    self.Window.add(Scrolled)
+    self.Window.show_all()
+    self.CLITextbuffer.create_mark("CmdId", self.CLITextbuffer.get_end_iter(), True)
+
+
+  def Insert(self, data):
+    """ Same steps as MainWindow.OnOutputFrame """
+    CmdStartMark = self.CLITextbuffer.get_mark("CmdId")
+    Start = self.CLITextbuffer.get_iter_at_mark(CmdStartMark)
+    end = self.CLITextbuffer.get_end_iter()
+    self.CLITextbuffer.delete(Start, end)
+    self.CLITextbuffer.insert(Start, data)
+    self.CLITextbuffer.place_cursor(self.CLITextbuffer.get_end_iter())
+    self.CLITextbuffer.delete_mark_by_name("CmdId")
+    self.CLITextbuffer.create_mark("CmdId", self.CLITextbuffer.get_end_iter(), True)
+    self.CLITextview.scroll_to_mark(self.CLITextbuffer.get_insert(), 0.0, True, 0.5, 0.5)
+
+
+  def Redraw(self):
+    """ Let Gtk do the layout and the drawing, as the main loop would """
+    while self.Gtk.events_pending():
+      self.Gtk.main_iteration()
+
+
+def RunPerResponse(view, responses):
+  """ Before: one insert, scroll and redraw per response """
+  for Response in responses:
+    view.Insert(Response + "\n> ")
+    view.Redraw()
+
+
+def RunCoalesced(view, responses):
+  """ After: the burst is queued, then displayed one frame at a time """
+  Backlog = OutputBacklog()
+  for Response in responses:
+    Backlog.Add(Response + "\n> ")
+  while len(Backlog):
+    Data = Backlog.Take()
+    if view is not None:
+      view.Insert(Data)
+      view.Redraw()
+
+
+def Measure(function, view, responses):
+  Start = time.time()
+  function(view, responses)
+  return time.time() - Start
+
+
+def Main(argv):
+  ArgParser = argparse.ArgumentParser(description="Throughput of the display of the responses")
+  ArgParser.add_argument("-n", "--count", type=int, default=5000, help="responses in the burst (default: %(default)s)")
+  ArgParser.add_argument("-s", "--size", type=int, default=80, help="size (bytes) of a response (default: %(default)s)")
+  Args = ArgParser.parse_args(argv)
+
+  Responses = MakeResponses(Args.count, max(Args.size, 8))
+  Size = sum([len(Response) for Response in Responses])
+
+  Rows = [("backlog only", Measure(RunCoalesced, None, Responses))]
+  try:
+    from gi.repository import Gtk
+    if not Gtk.init_check(sys.argv)[0]:
+      raise RuntimeError("no display")
+  except (ImportError, RuntimeError), Error:
+    print "Text view not measured: %s" % Error
+  else:
+    Rows.append(("per response", Measure(RunPerResponse, TextView(Gtk), Responses)))
+    Rows.append(("coalesced", Measure(RunCoalesced, TextView(Gtk), Responses)))
+
+  print "%d responses, %.1f MB" % (Args.count, Size / 1e6)
+  print "%-14s %10s %10s" % ("display", "s", "MB/s")
+  for Name, Elapsed in Rows:
+    print "%-14s %10.3f %10.1f" % (Name, Elapsed, Size / 1e6 / Elapsed)
+  return 0
+
+
+if __name__ == "__main__":
+  sys.exit(Main(sys.argv[1:]))
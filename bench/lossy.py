@@ -0,0 +1,187 @@
+##############################################################################
+#
+# Command line interface manager (CLIManager) for FreeRTOS+CLI
+# File: lossy.py
+# This file contains a UDP stand-in for a device on a lossy network: the
+# commands and the responses are dropped at a given rate and the responses
+# are delayed. It checks the retransmission of the command queue.
+#
+# This software is released under the MIT licence
+#
+# Copyright (c) 2015 Jean-Baptiste Quelard
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+###############################################################################
+#!/usr/bin/python
+#
+# With --serve the stand-in runs alone, to be used from the GUI or the headless
+# mode. Else it runs in a thread and commands are sent to it through the
+# command queue: each response must match its command. By default the jitter
+# makes some responses later than the timeout, their copies must be dropped.
+# --reply gives the same response to all the commands, as a device answering
+# "OK": the copies can't be told apart from the responses by their content.
+# The automated tests of the queue are in tests/test_pipeline.py.
+
+import os
+import sys
+import time
+import heapq
+import random
+import select
+import socket
+import argparse
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from transport import Protocol, SelectLoop, OpenTransport
+from pipeline import CommandQueue
+
+
+TERMINATOR = "\r\n> "
+
+
+class LossyDevice(threading.Thread):
+  """ Answer each command with 'resp:<command>', or the reply given, followed
+      by the terminator """
+
+  def __init__(self, port, loss, latency, jitter, seed=None, reply=None):
+    threading.Thread.__init__(self)
+    self.daemon = True
+    self.Socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    self.Socket.bind(("127.0.0.1", port))
+    self.Port = self.Socket.getsockname()[1]
+    self.Loss = loss
+    self.Latency = latency
+    self.Jitter = jitter
+    self.Random = random.Random(seed)
+    self.Reply = reply
+    self.Dropped = 0
+    self.Answered = 0
+    self.Running = True
+
+
+  def run(self):
+    Delayed = []  # Responses to send: (time, response, address)
+    while self.Running:
+      Timeout = max(Delayed[0][0] - time.time(), 0) if Delayed else 0.1
+      if select.select([self.Socket], [], [], Timeout)[0]:
+	self.Receive(Delayed)
+      while Delayed and Delayed[0][0] <= time.time():
+	Due, Response, Address = heapq.heappop(Delayed)
+	self.Socket.sendto(Response, Address)
+
+
+  def Receive(self, delayed):
+    Command, Address = self.Socket.recvfrom(65536)
+    if self.Random.random() < self.Loss:
+      self.Dropped += 1	# Command lost
+      return
+    if self.Random.random() < self.Loss:
+      self.Dropped += 1	# Response lost
+      return
+    self.Answered += 1
+    Due = time.time() + self.Latency + self.Random.uniform(0, self.Jitter)
+    heapq.heappush(delayed, (Due, GetReply(Command, self.Reply) + TERMINATOR, Address))
+
+
+def GetReply(command, reply):
+  return "resp:" + command if reply is None else reply
+
+
+class Client(Protocol):
+  """ Send the commands through the queue and check the responses """
+
+  def __init__(self, loop, port, count, timeout, retries, reply=None):
+    self.Loop = loop
+    self.Count = count
+    self.Reply = reply
+    self.Received = 0
+    self.Mismatches = 0
+    self.NoResponse = 0
+    self.Transport = OpenTransport(loop, self, "UDP", "127.0.0.1", str(port))
+    self.Queue = CommandQueue(loop, self.Transport.Write, self.ResponseReceived, TERMINATOR, \
+			      timeout, timeout, 1, "", retries)
+
+
+  def ConnectionMade(self, transport):
+    for Number in range(self.Count):
+      self.Queue.Send("cmd %d" % Number)
+
+
+  def DataReceived(self, data):
+    self.Queue.Feed(data)
+
+
+  def ResponseReceived(self, response):
+    if response.Command is None:
+      return  # Late copy arrived after its deadline
+    self.Received += 1
+    if response.Size == 0:
+      self.NoResponse += 1
+    elif response.GetData() != GetReply(response.Command, self.Reply):
+      self.Mismatches += 1
+    if self.Received == self.Count:
+      self.Loop.Stop()
+
+
+def Main(argv):
+  ArgParser = argparse.ArgumentParser(description="UDP device dropping and delaying datagrams")
+  ArgParser.add_argument("-p", "--port", type=int, default=0, help="port of the stand-in (default: any)")
+  ArgParser.add_argument("-l", "--loss", type=float, default=0.1, \
+			 help="rate at which the commands and the responses are dropped (default: %(default)s)")
+  ArgParser.add_argument("--latency", type=float, default=0.01, help="delay (s) of the responses (default: %(default)s)")
+  ArgParser.add_argument("--jitter", type=float, default=0.06, \
+			 help="random delay (s) added to the latency (default: %(default)s)")
+  ArgParser.add_argument("--serve", action="store_true", help="only run the stand-in")
+  ArgParser.add_argument("-n", "--count", type=int, default=200, help="commands sent (default: %(default)s)")
+  ArgParser.add_argument("--timeout", type=float, default=0.05, \
+			 help="time (s) waiting for the first response (default: %(default)s)")
+  ArgParser.add_argument("--retries", type=int, default=3, help="retransmissions of a command (default: %(default)s)")
+  ArgParser.add_argument("--seed", type=int, default=None, help="seed of the losses")
+  ArgParser.add_argument("--reply", default=None, help="response to all the commands (default: resp:<command>)")
+  Args = ArgParser.parse_args(argv)
+
+  Device = LossyDevice(Args.port, Args.loss, Args.latency, Args.jitter, Args.seed, Args.reply)
+  if Args.serve:
+    print "Lossy UDP device on port %d, terminator %r" % (Device.Port, TERMINATOR)
+    try:
+      Device.run()
+    except KeyboardInterrupt:
+      pass
+    return 0
+
+  Device.start()
+  Loop = SelectLoop()
+  Start = time.time()
+  Tester = Client(Loop, Device.Port, Args.count, Args.timeout, Args.retries, Args.reply)
+  Loop.Run()
+  Elapsed = time.time() - Start
+  Device.Running = False
+  Device.join()
+
+  print "device: %d datagrams dropped, %d responses sent" % (Device.Dropped, Device.Answered)
+  print "queue: %s" % Tester.Queue.Stats
+  print "client: %d/%d answered, %d without response, %d mismatched in %.2f s" % \
+	(Tester.Received - Tester.NoResponse, Args.count, Tester.NoResponse, Tester.Mismatches, Elapsed)
+  return 1 if Tester.Mismatches else 0
+
+
+if __name__ == "__main__":
+  sys.exit(Main(sys.argv[1:]))
@@ -0,0 +1,329 @@
+##############################################################################
+#
+# Command line interface manager (CLIManager) for FreeRTOS+CLI
+# File: network.py
+# This file contains the benchmark of the network: commands are sent through
+# ConnectionManagement to the device emulator and the responses go through
+# the output backlog of the display. It measures the round-trip latency, the
+# throughput of large responses and the behaviour with many connections.
+#
+# This software is released under the MIT licence
+#
+# Copyright (c) 2015 Jean-Baptiste Quelard
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+###############################################################################
+#!/usr/bin/python
+#
+# The emulator runs in its own process, so it doesn't share the interpreter
+# with the connections measured. The responses end with a terminator: the
+# idle gap would be measured otherwise. The results are written in JSON and
+# compared with bench/baselines/network.json.
+
+import os
+import re
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(BENCH_DIR, "..", "src")
+sys.path.insert(0, SRC_DIR)
+
+from CLIManager import ConnectionManagement
+from transport import SelectLoop
+from render import OutputBacklog, FRAME_INTERVAL
+from baseline import Metric, MedianMetrics, MakeResults, AddBaselineArguments, Conclude, LOWER, HIGHER
+
+
+TERMINATOR = "\r\n> "
+TCP_COMMAND_END = "\n"	# The commands are split as a device reading a stream does
+COMMAND = "query-heap"
+LARGE_COMMAND = "task-stats"
+RECEIVE_BUFFER_SIZE = 4 << 20	# Large responses over UDP come in bursts of datagrams
+PERCENTILES = (50, 90, 99)
+TAIL_SAMPLES = 5	# Samples needed above a percentile to report it
+LATENCY_TOLERANCE = 0.1	# Change (ms) of a latency taken as noise
+THRESHOLD = 50.0	# Change (%) making a regression, the timings over loopback vary a lot
+
+
+class Emulator:
+  """ Device emulator run in another process, on free ports """
+
+  def __init__(self, *options):
+    self.Process = subprocess.Popen([sys.executable, os.path.join(SRC_DIR, "emulator.py"), \
+				     "-u", "0", "-t", "0", "--terminator", TERMINATOR.encode("string_escape"), \
+				     "--command-end", TCP_COMMAND_END.encode("string_escape")] + \
+				    list(options), stdout=subprocess.PIPE)
+    Line = self.Process.stdout.readline()
+    Ports = dict(re.findall("(UDP|TCP) [^:]+:(\d+)", Line))
+    if len(Ports) != 2:
+      self.Stop()
+      raise RuntimeError("Emulator not started: " + Line.strip())
+    self.Ports = Ports
+
+
+  def Stop(self):
+    self.Process.terminate()
+    self.Process.wait()
+
+
+class OutputDisplay:
+  """ Output of the responses, taken from the backlog once per frame as the
+      main window does, without Gtk """
+
+  def __init__(self, loop):
+    self.Loop = loop
+    self.Backlog = OutputBacklog()
+    self.Displayed = 0
+    self.Frames = 0
+    self.Timer = None
+
+
+  def DataHandler(self, response):
+    self.Backlog.Add(response.Text.encode("utf-8"))
+    if self.Timer is None:
+      self.Timer = self.Loop.CallLater(FRAME_INTERVAL / 1000.0, self.OnFrame)
+
+
+  def OnFrame(self):
+    self.Timer = None
+    self.Displayed += len(self.Backlog.Take())
+    self.Frames += 1
+    if len(self.Backlog):
+      self.Timer = self.Loop.CallLater(FRAME_INTERVAL / 1000.0, self.OnFrame)
+
+
+class Client:
+  """ Connection sending a command once the previous one is answered """
+
+  def __init__(self, loop, display, connectiontype, port, command, count, done):
+    self.Loop = loop
+    self.Display = display
+    self.Command = command
+    self.Remaining = count
+    self.Done = done
+    self.Latencies = []
+    self.Bytes = 0
+    self.Incomplete = 0	# Responses without terminator: lost datagrams
+    self.Error = None
+    self.Sent = None
+    self.Started = None	# Time of the first command, once connected
+    self.Finished = None
+
+    self.Connection = ConnectionManagement()
+    self.Connection.ConnectionType = connectiontype
+    if connectiontype == "UDP":
+      self.Connection.UDPAddress, self.Connection.UDPPort = "127.0.0.1", port
+    else:
+      self.Connection.TCPAddress, self.Connection.TCPPort = "127.0.0.1", port
+    self.Connection.Terminator = TERMINATOR
+    self.Connection.PipelineDepth = 1
+    self.Connection.CommandEnd = TCP_COMMAND_END if connectiontype == "TCP" else ""
+    self.Connection.Retries = 0
+    self.Connection.ReceiveBufferSize = RECEIVE_BUFFER_SIZE
+    self.Connection.SessionLogDirectory = ""  # The disk is not measured
+    Error = self.Connection.Connect(self.DataHandler, self.StateChanged, loop)
+    if Error is not None:
+      raise RuntimeError(Error)
+
+
+  def StateChanged(self, error):
+    if error is not None:
+      self.Error = error
+      self.Finish()
+    elif self.Sent is None:
+      self.SendNext()
+
+
+  def SendNext(self):
+    self.Sent = self.Loop.Time()
+    if self.Started is None:
+      self.Started = self.Sent
+    self.Connection.Send(self.Command)
+
+
+  def DataHandler(self, response):
+    self.Latencies.append(self.Loop.Time() - self.Sent)
+    self.Bytes += response.Size
+    if response.End != "terminator":
+      self.Incomplete += 1
+    self.Display.DataHandler(response)
+    self.Remaining -= 1
+    if self.Remaining > 0:
+      self.SendNext()
+    else:
+      self.Finish()
+
+
+  def Finish(self):
+    if self.Connection is not None:
+      self.Finished = self.Loop.Time()
+      self.Connection.Disconnect()
+      self.Connection = None
+      self.Done(self)
+
+
+def Percentile(values, percent):
+  Values = sorted(values)
+  return Values[min(int(round(percent / 100.0 * (len(Values) - 1))), len(Values) - 1)]
+
+
+def Run(connectiontype, port, clients, command, count, maxtime):
+  """ Run the clients together until they have their responses. Returns the
+      clients, the display and the time from the first command sent to the
+      last response, the connections are not timed """
+  Loop = SelectLoop()
+  Display = OutputDisplay(Loop)
+  Running = set()
+
+  def Done(client):
+    Running.discard(client)
+    if not Running:
+      Loop.Stop()
+
+  Clients = []
+  for Number in range(clients):
+    Clients.append(Client(Loop, Display, connectiontype, str(port), command, count, Done))
+  Running.update(Clients)
+  Loop.CallLater(maxtime, Loop.Stop)
+  Loop.Run()
+  for Remaining in list(Running):
+    Remaining.Error = Remaining.Error or "Not answered in time"
+    Remaining.Finish()
+  Started = [Each.Started for Each in Clients if Each.Started is not None]
+  Elapsed = max([Each.Finished for Each in Clients]) - min(Started) if Started else 0.0
+  while Display.Timer is not None:
+    Loop.RunOnce()	# The last frames
+  return Clients, Display, Elapsed
+
+
+def Summarize(clients):
+  """ Latencies (ms) of all the responses and the totals of the clients """
+  Latencies = [Latency * 1000 for Client in clients for Latency in Client.Latencies]
+  Errors = [Client.Error for Client in clients if Client.Error is not None]
+  Incomplete = sum([Client.Incomplete for Client in clients])
+  Bytes = sum([Client.Bytes for Client in clients])
+  return Latencies, Errors, Incomplete, Bytes
+
+
+def AddLatencies(metrics, prefix, latencies):
+  """ Percentiles of the latencies, those with enough samples to be compared """
+  for Percent in PERCENTILES:
+    if len(latencies) * (100 - Percent) >= TAIL_SAMPLES * 100:
+      metrics["%s.p%d_ms" % (prefix, Percent)] = Metric(Percentile(latencies, Percent), "ms", LOWER, \
+							 LATENCY_TOLERANCE)
+
+
+def Report(name, latencies, errors, incomplete, extra=""):
+  Text = "%-22s p50 %7.2f ms  p99 %7.2f ms" % (name, Percentile(latencies, 50), Percentile(latencies, 99)) \
+	 if latencies else "%-22s no response" % name
+  if extra:
+    Text += "  " + extra
+  if incomplete:
+    Text += "  %d incomplete" % incomplete
+  if errors:
+    Text += "  %d errors (%s)" % (len(errors), errors[0])
+  sys.stderr.write(Text + "\n")
+
+
+def RunSuite(args, types, clientcounts, small, large):
+  """ Metrics of one run of the scenarios """
+  Metrics = {}
+  for Type in types:
+    Name = Type.lower()
+    Clients, Display, Elapsed = Run(Type, small.Ports[Type], 1, COMMAND, args.count, args.max_time)
+    Latencies, Errors, Incomplete, Bytes = Summarize(Clients)
+    Report("latency " + Type, Latencies, Errors, Incomplete)
+    if Latencies:
+      AddLatencies(Metrics, "latency." + Name, Latencies)
+
+    Clients, Display, Elapsed = Run(Type, large.Ports[Type], 1, LARGE_COMMAND, args.responses, args.max_time)
+    Latencies, Errors, Incomplete, Bytes = Summarize(Clients)
+    Throughput = Bytes / Elapsed / 1000000 if Elapsed else 0.0
+    Report("throughput " + Type, Latencies, Errors, Incomplete, "%.1f MB/s, %d frames" % (Throughput, Display.Frames))
+    Metrics["throughput.%s.mbps" % Name] = Metric(Throughput, "MB/s", HIGHER)
+    Metrics["throughput.%s.incomplete" % Name] = Metric(Incomplete, "responses", LOWER)
+
+    for Count in clientcounts:
+      Clients, Display, Elapsed = Run(Type, small.Ports[Type], Count, COMMAND, args.per_client, args.max_time)
+      Latencies, Errors, Incomplete, Bytes = Summarize(Clients)
+      Rate = len(Latencies) / Elapsed if Elapsed else 0.0
+      Report("%d clients %s" % (Count, Type), Latencies, Errors, Incomplete, "%.0f commands/s" % Rate)
+      Prefix = "concurrency.%s.%d" % (Name, Count)
+      Metrics[Prefix + ".commands_per_s"] = Metric(Rate, "commands/s", HIGHER)
+      Metrics[Prefix + ".errors"] = Metric(len(Errors), "connections", LOWER)
+      if Latencies:
+	AddLatencies(Metrics, Prefix, Latencies)
+  return Metrics
+
+
+def Main(argv):
+  ArgParser = argparse.ArgumentParser(description="Latency, throughput and concurrent connections against " \
+				      "the device emulator, written in JSON")
+  ArgParser.add_argument("-t", "--type", choices=["UDP", "TCP"], action="append", default=None, \
+			 help="connection types measured, can be repeated (default: both)")
+  ArgParser.add_argument("-n", "--count", type=int, default=1000, \
+			 help="commands sent to measure the latency (default: %(default)s)")
+  ArgParser.add_argument("-s", "--size", type=int, default=1000000, \
+			 help="size (bytes) of the large responses (default: %(default)s)")
+  ArgParser.add_argument("-r", "--responses", type=int, default=50, \
+			 help="large responses received to measure the throughput (default: %(default)s)")
+  ArgParser.add_argument("-c", "--clients", default="1,10,100,500", \
+			 help="numbers of concurrent connections (default: %(default)s)")
+  ArgParser.add_argument("-p", "--per-client", type=int, default=50, \
+			 help="commands sent by each concurrent connection (default: %(default)s)")
+  ArgParser.add_argument("--max-time", type=float, default=60.0, help="time (s) allowed to a run (default: %(default)s)")
+  ArgParser.add_argument("--repeat", type=int, default=3, \
+			 help="runs of the suite, the median of each metric is kept (default: %(default)s)")
+  AddBaselineArguments(ArgParser, "network", THRESHOLD)
+  Args = ArgParser.parse_args(argv)
+  Types = Args.type or ["UDP", "TCP"]
+  ClientCounts = [int(Count) for Count in Args.clients.split(",") if Count]
+  if Args.output is not None:
+    Args.output = os.path.abspath(Args.output)
+  Args.baseline = os.path.abspath(Args.baseline)
+
+  # The connections read and create their configuration file in the current directory
+  Directory = tempfile.mkdtemp()
+  Cwd = os.getcwd()
+  os.chdir(Directory)
+  Small = Emulator()
+  Large = Emulator("-s", str(Args.size))
+  Runs = []
+  try:
+    for Repeat in range(Args.repeat):
+      sys.stderr.write("Run %d/%d\n" % (Repeat + 1, Args.repeat))
+      Runs.append(RunSuite(Args, Types, ClientCounts, Small, Large))
+  finally:
+    Small.Stop()
+    Large.Stop()
+    os.chdir(Cwd)
+    shutil.rmtree(Directory)
+
+  Parameters = {"types": Types, "count": Args.count, "size": Args.size, "responses": Args.responses, \
+		"clients": ClientCounts, "per_client": Args.per_client, "repeat": Args.repeat}
+  return Conclude(MakeResults("network", Parameters, MedianMetrics(Runs)), Args)
+
+
+if __name__ == "__main__":
+  sys.exit(Main(sys.argv[1:]))
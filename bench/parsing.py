@@ -0,0 +1,229 @@
+##############################################################################
+#
+# Command line interface manager (CLIManager) for FreeRTOS+CLI
+# File: parsing.py
+# This file contains the benchmark of the parser and of the syntax assistant
+# on synthetic sets of 10 to 100000 commands: the import of a source and of a
+# .set file (text and binary), the lookup of a command in a binary set, the
+# parsing of the help strings, the merge of the commands with their duplicates
+# and the cost of each key typed.
+#
+# This software is released under the MIT licence
+#
+# Copyright (c) 2015 Jean-Baptiste Quelard
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+###############################################################################
+#!/usr/bin/python
+#
+# The keys are those of commands typed letter by letter, then a space, as the
+# main window gives them to the syntax assistant (FillSyntaxAssistantContent)
+# and to the completion (GetCompletionString, timed as if Tab was pressed at
+# each key). The window itself isn't involved: Gtk is not loaded. The first key
+# of a command is timed apart, it has the most commands to suggest. The help
+# strings are timed on a fixed number of parses whatever the size.
+# The results are written in JSON and compared with bench/baselines/parsing.json.
+# Each metric is the best of several runs: on an unchanged tree, the best of 5
+# runs still varies by up to a third at some sizes, hence the threshold. The
+# garbage collector is off during the runs, as timeit does: its passes depend
+# on the objects left by the previous sizes and doubled the time of a merge.
+
+import gc
+import os
+import sys
+import time
+import random
+import shutil
+import argparse
+import itertools
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "src"))
+
+from parser import CmdParser
+from registry import CommandRegistry
+from setfile import BinarySet, WriteBinarySet, BINARY_SET_EXTENSION
+from assistant import SyntaxAssistant
+from corpus import WriteCorpus, SizeName, SIZES, DEFAULT_SEED
+from baseline import Metric, BestMetrics, MakeResults, AddBaselineArguments, Conclude, LOWER
+
+TYPED_COMMANDS = 100	# Commands typed at each size
+HELP_STRINGS = 1000	# Help strings parsed at each size, again if there are fewer
+TIME_TOLERANCE = 1.0	# Change (ms) of an import taken as noise
+KEY_TOLERANCE = 5.0	# Change (us) of the time of a key taken as noise
+REPEAT = 5		# Runs of the suite
+THRESHOLD = 50.0	# Change (%) making a regression
+
+# Processor time of this process: all the work timed here is done by it, the
+# other processes of a loaded machine don't count
+Clock = time.clock
+
+
+def TimeImport(filename, source, expected):
+  """ Import a file in a new registry as the File menu does. Returns the time
+      (ms) and the registry """
+  Registry = CommandRegistry()
+  Start = Clock()
+  CmdParser().CmdParse(filename, source, Registry)
+  Elapsed = (Clock() - Start) * 1000
+  if len(Registry) != expected:
+    raise RuntimeError("%s: %d commands imported, %d expected" % (filename, len(Registry), expected))
+  return Elapsed, Registry
+
+
+def TimeHelpStrings(definitions):
+  """ Time (us) of the parsing of a help string, over the help strings of the
+      commands having arguments """
+  Parser = CmdParser()
+  Helps = [(Definition.Help, Definition.Args) for Definition in definitions if Definition.Args != 0]
+  Helps = list(itertools.islice(itertools.cycle(Helps), HELP_STRINGS))
+  Start = Clock()
+  for Help, Args in Helps:
+    Parser.ParseHelpString(Help, Args)
+  return (Clock() - Start) * 1e6 / max(len(Helps), 1)
+
+
+def TimeLookups(filename, names):
+  """ Time (us) of a command looked up in a binary set as the headless mode
+      checks it: the set is opened and the command searched in its index """
+  Start = Clock()
+  for Name in names:
+    Set = BinarySet(filename)
+    if Name not in Set:
+      raise RuntimeError("%s: %s not found" % (filename, Name))
+    Set.Close()
+  return (Clock() - Start) * 1e6 / len(names)
+
+
+def TimeDedup(records):
+  """ Time (ms) of the merge of parsed records, duplicates included, in a new
+      registry. Returns it with the number of conflicts found """
+  Registry = CommandRegistry()
+  Start = Clock()
+  Conflicts = Registry.AddRecords(records)
+  return (Clock() - Start) * 1000, len(Conflicts)
+
+
+def TimeKeys(registry, names):
+  """ Type the commands key by key. Returns the time (us) of each key given
+      to the syntax assistant, of the first keys only and of the completions """
+  Assistant = SyntaxAssistant(registry)
+  Keys = []
+  FirstKeys = []
+  Completions = []
+  for Name in names:
+    for Length in range(1, len(Name) + 2):
+      Line = (Name + " ")[:Length]
+      Start = Clock()
+      Assistant.Update(Line)
+      Keys.append((Clock() - Start) * 1e6)
+      Start = Clock()
+      registry.Trie.LongestCommonPrefix(Line.split()[0])
+      Completions.append((Clock() - Start) * 1e6)
+    FirstKeys.append(Keys[-len(Name) - 1])
+    Assistant.Update("")  # Sent, the line is cleared
+  return Keys, FirstKeys, Completions
+
+
+def RunSize(directory, size, seed, typed):
+  gc.collect()	# What the previous size left
+  Source, SetFile, Definitions = WriteCorpus(directory, size, seed)
+  Names = sorted(set([Definition.Name for Definition in Definitions]))
+  Prefix = SizeName(size)
+  Metrics = {}
+
+  Elapsed, Registry = TimeImport(Source, "Source", len(Names))
+  Metrics["import.source.%s.ms" % Prefix] = Metric(Elapsed, "ms", LOWER, TIME_TOLERANCE)
+  Elapsed, Registry = TimeImport(SetFile, "List", len(Names))
+  Metrics["import.set.%s.ms" % Prefix] = Metric(Elapsed, "ms", LOWER, TIME_TOLERANCE)
+  BinaryFile = os.path.splitext(SetFile)[0] + BINARY_SET_EXTENSION
+  WriteBinarySet(BinaryFile, Registry)
+  Metrics["import.bset.%s.ms" % Prefix] = Metric(TimeImport(BinaryFile, "List", len(Names))[0], "ms", \
+						  LOWER, TIME_TOLERANCE)
+  Typed = random.Random(seed).sample(Names, min(typed, len(Names)))
+  Metrics["lookup.bset.%s.us" % Prefix] = Metric(TimeLookups(BinaryFile, Typed), "us", LOWER, KEY_TOLERANCE)
+  HelpString = TimeHelpStrings(Definitions)
+  Metrics["helpstring.%s.us" % Prefix] = Metric(HelpString, "us", LOWER, KEY_TOLERANCE)
+
+  Records = CmdParser().ParseFile(Source, "Source")
+  Dedup, Conflicts = TimeDedup(Records)
+  Metrics["dedup.%s.ms" % Prefix] = Metric(Dedup, "ms", LOWER, TIME_TOLERANCE)
+
+  Keys, FirstKeys, Completions = TimeKeys(Registry, Typed)
+  Metrics["keystroke.%s.mean_us" % Prefix] = Metric(sum(Keys) / len(Keys), "us", LOWER, KEY_TOLERANCE)
+  Metrics["keystroke.%s.first_us" % Prefix] = Metric(sum(FirstKeys) / len(FirstKeys), "us", LOWER, \
+						     KEY_TOLERANCE)
+  Metrics["completion.%s.mean_us" % Prefix] = Metric(sum(Completions) / len(Completions), "us", LOWER, \
+						     KEY_TOLERANCE)
+
+  sys.stderr.write("%7s definitions: import %9.1f ms (source) %9.1f ms (.set) %7.1f ms (.bset), " \
+		   "lookup %6.1f us (.bset), help string %6.1f us, dedup %7.1f ms (%d conflicts), " \
+		   "key %8.1f us (first %8.1f us), completion %6.1f us\n" % \
+		   (Prefix, Metrics["import.source.%s.ms" % Prefix]["value"], \
+		    Metrics["import.set.%s.ms" % Prefix]["value"], Metrics["import.bset.%s.ms" % Prefix]["value"], \
+		    Metrics["lookup.bset.%s.us" % Prefix]["value"], HelpString, Dedup, Conflicts, \
+		    Metrics["keystroke.%s.mean_us" % Prefix]["value"], \
+		    Metrics["keystroke.%s.first_us" % Prefix]["value"], \
+		    Metrics["completion.%s.mean_us" % Prefix]["value"]))
+  return Metrics
+
+
+def RunSuite(directory, sizes, seed, typed):
+  Metrics = {}
+  for Size in sizes:
+    Metrics.update(RunSize(directory, Size, seed, typed))
+  return Metrics
+
+
+def Main(argv):
+  ArgParser = argparse.ArgumentParser(description="Import, dedup and syntax assistant timings on synthetic " \
+				      "sets of commands, written in JSON")
+  ArgParser.add_argument("-n", "--size", type=int, action="append", default=None, \
+			 help="definitions in a set, can be repeated (default: %s)" % \
+			 ", ".join([str(Size) for Size in SIZES]))
+  ArgParser.add_argument("-k", "--typed", type=int, default=TYPED_COMMANDS, \
+			 help="commands typed at each size (default: %(default)s)")
+  ArgParser.add_argument("--seed", type=int, default=DEFAULT_SEED, help="seed of the sets (default: %(default)s)")
+  ArgParser.add_argument("--repeat", type=int, default=REPEAT, \
+			 help="runs of the suite, the best value of each metric is kept (default: %(default)s)")
+  AddBaselineArguments(ArgParser, "parsing", THRESHOLD)
+  Args = ArgParser.parse_args(argv)
+  Sizes = Args.size or SIZES
+
+  # The grammar of the text .set files is loaded once, its import is timed by startup.py
+  CmdParser('pyparsing').ParseHelpString("", 1)
+
+  Directory = tempfile.mkdtemp()
+  Runs = []
+  gc.disable()
+  try:
+    for Repeat in range(Args.repeat):
+      sys.stderr.write("Run %d/%d\n" % (Repeat + 1, Args.repeat))
+      Runs.append(RunSuite(Directory, Sizes, Args.seed, Args.typed))
+  finally:
+    gc.enable()
+    shutil.rmtree(Directory)
+
+  Parameters = {"sizes": Sizes, "typed": Args.typed, "seed": Args.seed, "repeat": Args.repeat}
+  return Conclude(MakeResults("parsing", Parameters, BestMetrics(Runs)), Args)
+
+
+if __name__ == "__main__":
+  sys.exit(Main(sys.argv[1:]))
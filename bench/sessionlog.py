@@ -0,0 +1,124 @@
+##############################################################################
+#
+# Command line interface manager (CLIManager) for FreeRTOS+CLI
+# File: sessionlog.py
+# This file contains the benchmark of the session logs: a transcript of the
+# given size is written, then opened and read at random places as the viewer
+# does when it scrolls. The cost of a record for the main loop, which only
+# queues it, is measured apart.
+#
+# This software is released under the MIT licence
+#
+# Copyright (c) 2015 Jean-Baptiste Quelard
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+###############################################################################
+#!/usr/bin/python
+
+import os
+import sys
+import time
+import random
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from sessionlog import LogSegment, SessionLog, SessionLogReader, SENT, RECEIVED, LOG_BATCH
+
+VISIBLE_LINES = 50	# Lines drawn by the viewer
+
+
+RESPONSE = "\r\n".join(["%02d " % Line + "x" * 57 for Line in range(20)])
+
+
+def WriteTranscript(filename, size):
+  """ Commands each answered by 20 lines of 60 characters, until the size (bytes),
+      written by batches as the writer thread does """
+  Log = LogSegment(filename)
+  Now = time.time()
+  while Log.Offset < size:
+    for Entry in range(LOG_BATCH // 2):
+      Log.Write(SENT, "task-stats", Now)
+      Log.Write(RECEIVED, RESPONSE, Now + 0.01)
+      Now += 0.1
+    Log.Flush()
+  Log.Close()
+
+
+def QueueRecords(directory, count, interval):
+  """ Records given to a session log as the main loop does, one every interval (s) """
+  Log = SessionLog(os.path.join(directory, "queued.log"))
+  Spent = 0.0
+  for Record in range(count):
+    Start = time.time()
+    Log.Write(RECEIVED, RESPONSE)
+    Spent += time.time() - Start
+    if interval:
+      time.sleep(interval)
+  Log.Close()
+  Log.Wait()
+  return Spent / count, Log.Stats
+
+
+def Main(argv):
+  ArgParser = argparse.ArgumentParser(description="Open and scroll a session log")
+  ArgParser.add_argument("-s", "--size", type=int, default=200, help="size (MB) of the transcript (default: %(default)s)")
+  ArgParser.add_argument("-f", "--file", default=None, help="existing transcript to read instead")
+  ArgParser.add_argument("-n", "--reads", type=int, default=1000, help="random pages read (default: %(default)s)")
+  ArgParser.add_argument("-r", "--records", type=int, default=100000, help="records queued (default: %(default)s)")
+  ArgParser.add_argument("-i", "--interval", type=float, default=0, \
+			 help="time (ms) between two records queued (default: %(default)s, at once)")
+  Args = ArgParser.parse_args(argv)
+
+  Directory = None
+  Filename = Args.file
+  if Filename is None:
+    Directory = tempfile.mkdtemp()
+    Filename = os.path.join(Directory, "bench.log")
+    Start = time.time()
+    WriteTranscript(Filename, Args.size * 1000000)
+    Elapsed = time.time() - Start
+    print "write:  %.1f MB in %.2f s (%.1f MB/s)" % (Args.size, Elapsed, Args.size / Elapsed)
+    Cost, Stats = QueueRecords(Directory, Args.records, Args.interval / 1000)
+    print "queue:  %.1f us per record, %s" % (Cost * 1000000, Stats)
+
+  try:
+    Start = time.time()
+    Reader = SessionLogReader(Filename)
+    print "open:   %d lines in %.2f ms" % (Reader.GetLineCount(), (time.time() - Start) * 1000)
+
+    Start = time.time()
+    for Read in range(Args.reads):
+      Reader.GetLines(random.randrange(Reader.GetLineCount()), VISIBLE_LINES)
+    print "scroll: %.3f ms per page of %d lines" % ((time.time() - Start) * 1000 / Args.reads, VISIBLE_LINES)
+
+    Start = time.time()
+    Events = sum([1 for Event in Reader.Events()])
+    print "replay: %d events read in %.2f s" % (Events, time.time() - Start)
+    Reader.Close()
+  finally:
+    if Directory is not None:
+      shutil.rmtree(Directory)
+  return 0
+
+
+if __name__ == "__main__":
+  sys.exit(Main(sys.argv[1:]))
@@ -0,0 +1,96 @@
+##############################################################################
+#
+# Command line interface manager (CLIManager) for FreeRTOS+CLI
+# File: startup.py
+# This file contains the benchmark of the startup time of the headless mode
+# and of the GUI. Each mode is started in a new interpreter several times.
+#
+# This software is released under the MIT licence
+#
+# Copyright (c) 2015 Jean-Baptiste Quelard
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+###############################################################################
+#!/usr/bin/python
+
+import os
+import sys
+import time
+import argparse
+import subprocess
+
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+HEAVY_MODULES = ("gi", "pyparsing")
+
+# Each mode imports what it needs at startup then prints the heavy modules loaded
+MODES = [
+  ("headless", "import headless"),
+  ("headless + set", "import headless; headless.LoadCommandSet(%r)"),
+  ("gui", "import guipy"),
+]
+
+_SCRIPT = """
+import sys
+sys.path.insert(0, %r)
+%s
+print ' '.join([Name for Name in %r if Name in sys.modules])
+"""
+
+
+def RunMode(statement, runs):
+  """ Start a new interpreter running the statement. Returns the sorted times and
+      the heavy modules loaded, or None if the mode can't start here """
+  Times = []
+  Modules = ""
+  for Run in range(runs):
+    Start = time.time()
+    Process = subprocess.Popen([sys.executable, "-c", _SCRIPT % (SRC_DIR, statement, HEAVY_MODULES)], \
+			       stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    Output, Errors = Process.communicate()
+    Times.append(time.time() - Start)
+    if Process.returncode != 0:
+      return None, Errors.strip().splitlines()[-1]
+    Modules = Output.strip()
+  return sorted(Times), Modules
+
+
+def Main(argv):
+  ArgParser = argparse.ArgumentParser(description="Startup time of the headless mode and of the GUI")
+  ArgParser.add_argument("-n", "--runs", type=int, default=10, help="runs of each mode (default: %(default)s)")
+  ArgParser.add_argument("-s", "--set", default=None, help="set of commands loaded by the 'headless + set' mode")
+  Args = ArgParser.parse_args(argv)
+
+  print "%-16s %10s %10s   %s" % ("mode", "median ms", "min ms", "heavy modules loaded")
+  for Name, Statement in MODES:
+    if "%r" in Statement:
+      if Args.set is None:
+	continue
+      Statement = Statement % os.path.abspath(Args.set)
+
+    Times, Modules = RunMode(Statement, Args.runs)
+    if Times is None:
+      print "%-16s %10s %10s   (%s)" % (Name, "-", "-", Modules)
+    else:
+      print "%-16s %10.1f %10.1f   %s" % (Name, Times[len(Times) // 2] * 1000, Times[0] * 1000, Modules or "none")
+  return 0
+
+
+if __name__ == "__main__":
+  sys.exit(Main(sys.argv[1:]))
@@ -34,9 +34,12 @@ import re
 import sys
 import fileinput
 import socket, errno
-#import guipy
-from gi.repository import Gtk, GObject	#TODO CHECK
-from guipy import *
+import codecs
+from setfile import WriteSet
+from transport import Protocol, OpenTransport
+from framer import RESPONSE_TIMEOUT
+from pipeline import CommandQueue
+from sessionlog import SessionLog, SessionFilename, SENT, RECEIVED, COMPRESSIONS, LOG_CLOSE_TIMEOUT
 
 
 #Default parameters
@@ -48,9 +51,24 @@ DefaultColor = "ColorNone"	  #Default color scheme for the CLI
 DefaultFont = "Helvetica 14"	  #Default font for the CLI
 DefaultSyntaxAssistant = "False"    #Default setting for the syntax assistant option
 DefaultEscapeChars = "False"	    #Default setting for the hide escape char option
-
-
-class ConnectionManagement:
+DefaultTerminator = ""		  #Default end of the responses (escaped), none: idle gap only
+DefaultIdleGap = "100"		  #Default time (ms) without data ending a response
+DefaultReceiveBuffer = "0"	  #Default size of the socket receive buffer (SO_RCVBUF), 0: system default
+DefaultPipeline = "1"		  #Default number of commands sent without waiting for their response
+DefaultRetries = "0"		  #Default retransmissions of a UDP command left without response
+DefaultSessionLog = "sessions"	  #Default directory of the session logs, none: not logged
+DefaultLogRotateSize = "0"	  #Default size (MB) of a session log segment, 0: no limit
+DefaultLogRotateTime = "0"	  #Default duration (minutes) of a session log segment, 0: no limit
+DefaultLogCompression = "gzip"	  #Default compression of the previous segments: gzip, lzma or none
+DefaultCommandEnd = ""		  #Default end appended to the commands (escaped), for devices reading a stream
+DefaultScrollbackLines = "100000" #Default lines kept in the CLI, 0: no limit
+DefaultScrollbackChars = "0"	  #Default characters kept in the CLI, 0: no limit
+DeviceEncoding = "utf-8"	  #Encoding of the text sent by the device
+
+
+class ConnectionManagement(Protocol):
+  """ Connection to the device. The socket is driven by an event loop: the
+      GObject main loop for the GUI or a SelectLoop """
 
   def __init__(self):
     if os.path.exists(CONFIG_FILENAME) == False:
@@ -60,69 +78,129 @@ class ConnectionManagement:
       #Load Connection parameters from existing config file
       self.UDPAddress, self.UDPPort, self.TCPAddress, self.TCPPort = self.GetConnectionsConfigFromFile()
       self.ConnectionType = self.GetConnectionTypeFromFile()
-
-    self.EventHandlerId = None
+      self.Terminator, self.IdleGap = self.GetFramingConfigFromFile()
+      self.ReceiveBufferSize = self.GetReceiveBufferConfigFromFile()
+      self.PipelineDepth, self.CommandEnd = self.GetPipelineConfigFromFile()
+      self.Retries = self.GetRetriesConfigFromFile()
+      self.SessionLogDirectory, self.LogRotateSize, self.LogRotateTime, \
+	self.LogCompression = self.GetSessionLogConfigFromFile()
+
+    self.Transport = None
+    self.Queue = None
+    self.SessionLog = None
+    self.LogStats = None  # Counters of the last session log
+    self.ResponseTimeout = RESPONSE_TIMEOUT
     self.IsConnected = False
     self.DataHandlerCallback = None
+    self.StateCallback = None
 
 
-  def Connect(self, callback):
+  def Connect(self, callback, statecallback=None, loop=None):
+    """ Open the connection without blocking. Each complete response (framer.Response)
+	is given to the callback. The state callback is called with None once
+	connected, or with an error message when the connection fails or is lost.
+	Returns an error message if the connection can't be started """
     self.IsConnected = False
+    if loop is None:
+      from transport import GObjectLoop # Only needed by the GUI
+      loop = GObjectLoop()
+    self.DataHandlerCallback = callback #Function that will handle the responses to display
+    self.StateCallback = statecallback
+    # Several commands in flight only when a terminator tells the responses apart,
+    # TCP delivers the commands itself
+    self.Queue = CommandQueue(loop, self.Write, self.ResponseReceived, self.Terminator, \
+			      self.IdleGap, self.ResponseTimeout, self.PipelineDepth, self.CommandEnd, \
+			      self.Retries if self.ConnectionType == "UDP" else 0)
+    # A character may be split between two responses
+    self.Decoder = codecs.getincrementaldecoder(DeviceEncoding)("replace")
+
+    if self.SessionLogDirectory:
+      Compression = None if self.LogCompression == "none" else self.LogCompression
+      if Compression is not None and Compression not in COMPRESSIONS:
+	return "Session log error: " + self.LogCompression + " compression not available"
+      try:
+	self.SessionLog = SessionLog(SessionFilename(self.SessionLogDirectory), \
+				     self.LogRotateSize, self.LogRotateTime, Compression)
+      except (IOError, OSError), Error:
+	return "Session log error: " + str(Error)
+      self.LogStats = self.SessionLog.Stats
+
     try:
       if self.ConnectionType == "UDP":
-	self.socket = socket.socket(socket.AF_INET,
-                      socket.SOCK_DGRAM) # UDP
-	self.IsConnected = True
-
-      if self.ConnectionType == "TCP":
-	self.socket = socket.socket(socket.AF_INET,
-                      socket.SOCK_STREAM) # TCP
-
-	self.socket.connect((self.TCPAddress, int(self.TCPPort)))
-	self.IsConnected = True
-
-      self.EventHandlerId = GObject.io_add_watch(self.socket, GObject.IO_IN, self.SocketListener)
-      self.DataHandlerCallback = callback #Function that will handle datas to display
+	self.Transport = OpenTransport(loop, self, "UDP", self.UDPAddress, self.UDPPort, \
+				       self.ReceiveBufferSize)
+      else:
+	self.Transport = OpenTransport(loop, self, "TCP", self.TCPAddress, self.TCPPort, \
+				       self.ReceiveBufferSize)
       return None
 
-    except socket.timeout:
-      return "Socket timeout"
-
     except socket.error, (errno, strerror):
+      self.CloseSessionLog()
       return("Socket error: " + strerror)
 
 
-  def Disconnect(self):
-    if self.IsConnected:
-      self.socket.close()
-      self.IsConnected = False
+  def Disconnect(self, wait=None):
+    """ wait: time (s) given to the session log to be written before returning,
+	when the application quits """
+    self.StateCallback = None # Closed on purpose, nothing to report
+    # First, closing the transport closes the log without waiting
+    self.CloseSessionLog(wait)
+    if self.Transport is not None:
+      self.Transport.Close()
+    self.Transport = None
+    self.IsConnected = False
+
+
+  def CloseSessionLog(self, wait=None):
+    """ The entries still queued are written in the background, or before
+	returning when a wait (s) is given """
+    if self.SessionLog is not None:
+      self.SessionLog.Close()
+      if wait is not None:
+	self.SessionLog.Wait(wait)
+      self.SessionLog = None
 
-    if self.EventHandlerId != None:
-      GObject.source_remove(self.EventHandlerId)
-      self.EventHandlerId = None
 
-    
   def Send(self, command):
-    if self.ConnectionType == "UDP":
-      self.socket.sendto(command, (self.UDPAddress, int(self.UDPPort)))
-    elif self.ConnectionType == "TCP":
-      self.socket.sendto(command, (self.TCPAddress, int(self.TCPPort)))
+    """ Queue the command, it is sent once the pipeline has room for it """
+    if self.SessionLog is not None:
+      self.SessionLog.Write(SENT, command)
+    self.Queue.Send(command)
 
-    return(self.socket) #for the socket listener
 
+  def Write(self, command):
+    self.Transport.Write(command)
 
-  def Receive(self):
-    Data = self.socket.recv( 1024 )
-    return Data
 
+  def ConnectionMade(self, transport):
+    self.IsConnected = True
+    if self.StateCallback is not None:
+      self.StateCallback(None)
+
+
+  def DataReceived(self, data):
+    self.Queue.Feed(data)
 
-  def SocketListener(self, source, condition):
-      Data = self.Receive()
-      self.DataHandlerCallback(Data)  #Let the GUI handle the data
-      if len(Data) > 0:
-	return True
-      else:
-	return False
+
+  def ResponseReceived(self, response):
+    if self.SessionLog is not None and response.Size:
+      self.SessionLog.Write(RECEIVED, response.GetData())
+    response.Text = self.Decoder.decode(response.GetData())
+    self.DataHandlerCallback(response)  #Let the GUI handle the data
+
+
+  def ErrorReceived(self, error):
+    if self.StateCallback is not None:
+      self.StateCallback(error)
+
+
+  def ConnectionLost(self, error):
+    self.IsConnected = False
+    self.Transport = None
+    self.Queue.Close()	# The end of a response may have been received
+    self.CloseSessionLog()
+    if self.StateCallback is not None:
+      self.StateCallback(error or "Connection closed by the device")
 
 
   def CreateDefaultConfigFile(self):
@@ -138,6 +216,19 @@ class ConnectionManagement:
       ConfigFile.write("#Preferences\n")
       ConfigFile.write("<SyntaxAssistant:" +  DefaultSyntaxAssistant + "\n")
       ConfigFile.write("<EscapeChars:" + DefaultEscapeChars + "\n")
+      ConfigFile.write("<ScrollbackLines:" + DefaultScrollbackLines + "\n")
+      ConfigFile.write("<ScrollbackChars:" + DefaultScrollbackChars + "\n")
+      ConfigFile.write("#Responses\n")
+      ConfigFile.write("<Terminator:" + DefaultTerminator + "\n")
+      ConfigFile.write("<IdleGap:" + DefaultIdleGap + "\n")
+      ConfigFile.write("<ReceiveBuffer:" + DefaultReceiveBuffer + "\n")
+      ConfigFile.write("<Pipeline:" + DefaultPipeline + "\n")
+      ConfigFile.write("<CommandEnd:" + DefaultCommandEnd + "\n")
+      ConfigFile.write("<Retries:" + DefaultRetries + "\n")
+      ConfigFile.write("<SessionLog:" + DefaultSessionLog + "\n")
+      ConfigFile.write("<LogRotateSize:" + DefaultLogRotateSize + "\n")
+      ConfigFile.write("<LogRotateTime:" + DefaultLogRotateTime + "\n")
+      ConfigFile.write("<LogCompression:" + DefaultLogCompression + "\n")
 
     ConfigFile.close()
 
@@ -147,6 +238,16 @@ class ConnectionManagement:
     self.TCPAddress = DefaultIP
     self.TCPPort = DefaultPort
     self.ConnectionType = DefaultType
+    self.Terminator = DefaultTerminator.decode("string_escape")
+    self.IdleGap = float(DefaultIdleGap) / 1000
+    self.ReceiveBufferSize = int(DefaultReceiveBuffer)
+    self.PipelineDepth = int(DefaultPipeline)
+    self.CommandEnd = DefaultCommandEnd.decode("string_escape")
+    self.Retries = int(DefaultRetries)
+    self.SessionLogDirectory = DefaultSessionLog
+    self.LogRotateSize = int(DefaultLogRotateSize) * 1000000
+    self.LogRotateTime = float(DefaultLogRotateTime) * 60
+    self.LogCompression = DefaultLogCompression
 
 
   def GetConnectionsConfig(self):
@@ -249,6 +350,110 @@ class ConnectionManagement:
     return self.ConnectionType
 
 
+  def GetFramingConfigFromFile(self):
+    """ End of the responses: terminator (escaped in the file, e.g. \\r\\n> ) and
+	idle gap (ms). The defaults are used when they are not in the file """
+
+    TerminatorPattern = re.compile("<Terminator:(.*)$")
+    IdleGapPattern = re.compile("<IdleGap:(.+)$")
+
+    Terminator = DefaultTerminator
+    IdleGap = DefaultIdleGap
+    with open(CONFIG_FILENAME, 'r') as ConfigFile:
+      for line in ConfigFile:
+	TerminatorMatch = re.search(TerminatorPattern, line.rstrip("\n"))
+	IdleGapMatch = re.search(IdleGapPattern, line)
+	if TerminatorMatch:
+	  Terminator = TerminatorMatch.group(1)
+	if IdleGapMatch:
+	  IdleGap = IdleGapMatch.group(1)
+
+    return Terminator.decode("string_escape"), float(IdleGap) / 1000
+
+
+  def GetReceiveBufferConfigFromFile(self):
+    """ Size of the socket receive buffer. The default is used when it is not in the file """
+
+    ReceiveBufferPattern = re.compile("<ReceiveBuffer:(\d+)$")
+
+    ReceiveBuffer = DefaultReceiveBuffer
+    with open(CONFIG_FILENAME, 'r') as ConfigFile:
+      for line in ConfigFile:
+	ReceiveBufferMatch = re.search(ReceiveBufferPattern, line)
+	if ReceiveBufferMatch:
+	  ReceiveBuffer = ReceiveBufferMatch.group(1)
+
+    return int(ReceiveBuffer)
+
+
+  def GetPipelineConfigFromFile(self):
+    """ Number of commands in flight and end of the commands (escaped in the file,
+	e.g. \\n). The defaults are used when they are not in the file """
+
+    PipelinePattern = re.compile("<Pipeline:(\d+)$")
+    CommandEndPattern = re.compile("<CommandEnd:(.*)$")
+
+    Pipeline = DefaultPipeline
+    CommandEnd = DefaultCommandEnd
+    with open(CONFIG_FILENAME, 'r') as ConfigFile:
+      for line in ConfigFile:
+	PipelineMatch = re.search(PipelinePattern, line)
+	CommandEndMatch = re.search(CommandEndPattern, line.rstrip("\n"))
+	if PipelineMatch:
+	  Pipeline = PipelineMatch.group(1)
+	if CommandEndMatch:
+	  CommandEnd = CommandEndMatch.group(1)
+
+    return int(Pipeline), CommandEnd.decode("string_escape")
+
+
+  def GetRetriesConfigFromFile(self):
+    """ Retransmissions of a UDP command. The default is used when it is not in the file """
+
+    RetriesPattern = re.compile("<Retries:(\d+)$")
+
+    Retries = DefaultRetries
+    with open(CONFIG_FILENAME, 'r') as ConfigFile:
+      for line in ConfigFile:
+	RetriesMatch = re.search(RetriesPattern, line)
+	if RetriesMatch:
+	  Retries = RetriesMatch.group(1)
+
+    return int(Retries)
+
+
+  def GetSessionLogConfigFromFile(self):
+    """ Directory of the session logs, empty when the sessions are not logged,
+	size (bytes) and duration (s) of their segments, compression of the
+	previous segments. The defaults are used when they are not in the file """
+
+    SessionLogPattern = re.compile("<SessionLog:(.*)$")
+    RotateSizePattern = re.compile("<LogRotateSize:(\d+)$")
+    RotateTimePattern = re.compile("<LogRotateTime:(\d+(\.\d*)?)$")
+    CompressionPattern = re.compile("<LogCompression:(\w+)$")
+
+    SessionLog = DefaultSessionLog
+    RotateSize = DefaultLogRotateSize
+    RotateTime = DefaultLogRotateTime
+    Compression = DefaultLogCompression
+    with open(CONFIG_FILENAME, 'r') as ConfigFile:
+      for line in ConfigFile:
+	SessionLogMatch = re.search(SessionLogPattern, line.rstrip("\n"))
+	RotateSizeMatch = re.search(RotateSizePattern, line)
+	RotateTimeMatch = re.search(RotateTimePattern, line)
+	CompressionMatch = re.search(CompressionPattern, line)
+	if SessionLogMatch:
+	  SessionLog = SessionLogMatch.group(1).strip()
+	if RotateSizeMatch:
+	  RotateSize = RotateSizeMatch.group(1)
+	if RotateTimeMatch:
+	  RotateTime = RotateTimeMatch.group(1)
+	if CompressionMatch:
+	  Compression = CompressionMatch.group(1)
+
+    return SessionLog, int(RotateSize) * 1000000, float(RotateTime) * 60, Compression
+
+
   def IsConnectionActive(self):
     return self.IsConnected #Tells the GUI if a connection is active
 
@@ -264,6 +469,8 @@ class CLIManager:
     self.HideSyntaxAssistant = DefaultSyntaxAssistant
     self.CLIColor = DefaultColor
     self.CLIFont = DefaultFont
+    self.ScrollbackLines = int(DefaultScrollbackLines)
+    self.ScrollbackChars = int(DefaultScrollbackChars)
     self.GetPreferencesFromConfigFile()	# Load user preferences from config file
 
 
@@ -275,13 +482,10 @@ class CLIManager:
     self.CommandsSetLoaded = value
 
 
-  def GenerateCommandsSetFile(self, filename, liststore):
+  def GenerateCommandsSetFile(self, filename, registry):
     #Generate the .set file from the list of commands currently loaded 
-    #(Imported from source file)
-    with open(filename,"w") as cfile:
-      for row in liststore:
-	cfile.write('"' + row[0] + '","' + row[2] + '",' + str(row[1]) + '\n')
-    cfile.close()
+    #(Imported from source file). The binary format is used for .bset files
+    WriteSet(filename, registry)
 
 
   def GetPreferencesFromConfigFile(self):
@@ -292,6 +496,8 @@ class CLIManager:
     CLIFontPattern = re.compile("<Font:(.+)$")
     EscapeCharsPattern = re.compile("<EscapeChars:(.+)$")
     SyntaxAssistantPattern = re.compile("<SyntaxAssistant:(.+)$")
+    ScrollbackLinesPattern = re.compile("<ScrollbackLines:(\d+)$")
+    ScrollbackCharsPattern = re.compile("<ScrollbackChars:(\d+)$")
 
     with open(CONFIG_FILENAME, 'r') as ConfigFile:
       for line in ConfigFile:
@@ -299,6 +505,8 @@ class CLIManager:
 	CLIFontMatch = re.search(CLIFontPattern,line)
 	EscapeCharsMatch = re.search(EscapeCharsPattern,line)
 	SyntaxAssistantMatch = re.search(SyntaxAssistantPattern,line)
+	ScrollbackLinesMatch = re.search(ScrollbackLinesPattern,line)
+	ScrollbackCharsMatch = re.search(ScrollbackCharsPattern,line)
 
 	if CLIColorMatch:
 	  self.CLIColor = CLIColorMatch.group(1)
@@ -314,10 +522,19 @@ class CLIManager:
 	    self.HideSyntaxAssistant = True
 	  else:
 	    self.HideSyntaxAssistant = False
+	elif ScrollbackLinesMatch:
+	  self.ScrollbackLines = int(ScrollbackLinesMatch.group(1))
+	elif ScrollbackCharsMatch:
+	  self.ScrollbackChars = int(ScrollbackCharsMatch.group(1))
 
       ConfigFile.close()
 
 
+  def GetScrollbackConfig(self):
+    """ Tells the GUI how many lines and characters the CLI keeps """
+    return self.ScrollbackLines, self.ScrollbackChars
+
+
   def GetCLIColorConfig(self):
     """ Tells the GUI which coor scheme to use """
     return self.CLIColor
@@ -392,11 +609,9 @@ class CLIManager:
     fileinput.close()
 
 
-  def SetHideEscapeCharColumn(self, liststore):
-    """ Remove the escape characters \r and \n from the help string and copy it in the 3rd column """
-    for row in liststore:
-      row[3] = row[2].replace("\\n", "")
-      row[3] = row[3].replace("\\r", "")
+  def StripEscapeChars(self, string):
+    """ Remove the escape characters \r and \n from the help string (content of the 3rd column) """
+    return string.replace("\\n", "").replace("\\r", "")
 
 
   def GetHideSyntaxAssistantParam(self):
@@ -426,10 +641,19 @@ class CLIManager:
 
 
 if __name__ == "__main__":
-	
+
+	if len(sys.argv) > 1:
+	  # Headless mode, Gtk is never loaded
+	  from headless import Main
+	  sys.exit(Main(sys.argv[1:]))
+
+	from gi.repository import Gtk, GObject
+	from guipy import MainWindow
+
+	GObject.threads_init()	# The imports are done in a background thread
 	app = CLIManager()
 	win = MainWindow(app)
-	win.connect("delete-event", Gtk.main_quit)
+	win.connect("delete-event", win.OnMenuFileQuit)
 	win.show_all()
 	Gtk.main()
 
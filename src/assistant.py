@@ -0,0 +1,115 @@
+##############################################################################
+#
+# Command line interface manager (CLIManager) for FreeRTOS+CLI
+# File: assistant.py
+# This file contains the syntax assistant: it builds the suggestions displayed
+# in the popover from what is typed in the CLI. It is independent from Gtk.
+#
+# This software is released under the MIT licence
+#
+# Copyright (c) 2015 Jean-Baptiste Quelard
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+###############################################################################
+#!/usr/bin/python
+
+
+class SyntaxAssistant:
+  """ Suggestions for the command being typed. The candidates of the previous
+      input are kept so they are only narrowed while the command grows """
+
+  def __init__(self, registry):
+    self.Registry = registry
+    self.Reset()
+
+
+  def Reset(self):
+    """ Forget the previous candidates """
+    self.Prefix = None
+    self.Candidates = []
+    self.Generation = None
+
+
+  def GetCandidates(self, command):
+    """ Records of the commands starting with the command typed """
+
+    if self.Prefix is not None and command.startswith(self.Prefix) and \
+       self.Generation == self.Registry.Generation:
+      # The command grew: the candidates are among the previous ones
+      Candidates = [Record for Record in self.Candidates if Record.Name.startswith(command)]
+    else:
+      Candidates = self.Registry.Complete(command)
+
+    self.Prefix = command
+    self.Candidates = Candidates
+    self.Generation = self.Registry.Generation
+    return Candidates
+
+
+  def Update(self, Line):
+    """ Returns whether the popover should be shown and its content (markup) """
+    AssistantPopoverContent = ""
+    ShowPopover = False
+
+    CurrentLine = Line.split() # Split to get the command without parameter
+    if len(CurrentLine) == 0:
+      return False, ""
+
+    for Record in self.GetCandidates(CurrentLine[0]):
+      ShowPopover = True
+      # Exact match no need to show assistant anymore
+      if Record.Name == CurrentLine[0] and Record.Args == 0:
+	ShowPopover = False
+
+      # Command input complete but the popover will display the parameters
+      elif Record.Name == CurrentLine[0] and Record.Args != 0:
+	# Parameters extracted from the help string at import
+	ParamList = Record.ArgList
+
+	if ParamList != None:
+	  if len(ParamList) != 0:
+	    for Param in ParamList:
+	      if AssistantPopoverContent != "":
+		AssistantPopoverContent += " "
+	      AssistantPopoverContent += "<b><i>[ " + Param + " ]</i></b>"
+	  else:
+	  # Special case. No argument found in the help string but
+	  # the nb of declared arguments is not 0
+	    AssistantPopoverContent += "<b><i>[ ... ]</i></b>"
+
+      # Handle whitespaces in the command string
+      elif (Record.Name != CurrentLine[0]) and (" " in Line):
+	  ShowPopover = False
+
+      # The command name is not complete yet
+      else:
+	# Command parameters extracted from the help string at import
+	ParamList = Record.ArgList
+
+	if AssistantPopoverContent != "":
+	  AssistantPopoverContent += "\n"
+	AssistantPopoverContent += '<b>' + Record.Name + "</b>"
+	if ParamList != None:
+	  if len(ParamList) != 0:
+	    for Param in ParamList:
+	      AssistantPopoverContent += " " + "<i>[ " + Param + " ]</i>"
+	  else:
+	      AssistantPopoverContent += " " + "<i>[ ... ]</i>"
+
+    return ShowPopover, AssistantPopoverContent
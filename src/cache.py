@@ -0,0 +1,153 @@
+##############################################################################
+#
+# Command line interface manager (CLIManager) for FreeRTOS+CLI
+# File: cache.py
+# This file contains the on-disk cache of the parsed source files. The records
+# of a file are stored under a key built from its content hash, size and mtime
+# and from the parser version.
+#
+# This software is released under the MIT licence
+#
+# Copyright (c) 2015 Jean-Baptiste Quelard
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+###############################################################################
+#!/usr/bin/python
+
+import os
+import hashlib
+import tempfile
+import cPickle
+
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "CLIManager")
+DEFAULT_CACHE_SIZE = 64 << 20	# Maximum size of the cache directory (bytes)
+CACHE_EXTENSION = ".records"
+TEMPORARY_EXTENSION = CACHE_EXTENSION + ".tmp"	# Entry being written
+HASH_CHUNK_SIZE = 1 << 20	# Size of the chunks read to hash a file
+
+
+class ParseCache:
+  """ Directory of parsed records with LRU eviction by total size """
+
+  def __init__(self, directory=DEFAULT_CACHE_DIR, maxsize=DEFAULT_CACHE_SIZE):
+    self.Directory = directory
+    self.MaxSize = maxsize
+    self.Hits = 0
+    self.Misses = 0
+    self.Digests = {}	# (filename, size, mtime) -> digest of the content, hashed once
+
+    if not os.path.isdir(self.Directory):
+      os.makedirs(self.Directory)
+
+
+  def Key(self, filename, *version):
+    """ Build the key of a file from its content, size, mtime and the parser version """
+    Stat = os.stat(filename)
+    Key = hashlib.sha1()
+    for Item in version + (Stat.st_size, Stat.st_mtime):
+      Key.update(str(Item) + "\0")
+
+    # The content is hashed by chunks, big files are never loaded at once. An
+    # unchanged file (same size and mtime) isn't read again
+    Unchanged = (filename, Stat.st_size, Stat.st_mtime)
+    Digest = self.Digests.get(Unchanged)
+    if Digest is None:
+      Content = hashlib.sha1()
+      with open(filename, "rb") as cfile:
+	for Chunk in iter(lambda: cfile.read(HASH_CHUNK_SIZE), ""):
+	  Content.update(Chunk)
+      Digest = self.Digests[Unchanged] = Content.hexdigest()
+    Key.update(Digest)
+    return Key.hexdigest()
+
+
+  def Get(self, key):
+    """ Returns the records stored under the key or None """
+    EntryName = os.path.join(self.Directory, key + CACHE_EXTENSION)
+    try:
+      with open(EntryName, "rb") as Entry:
+	Records = cPickle.load(Entry)
+    except (IOError, EOFError, cPickle.UnpicklingError):
+      self.Misses += 1
+      return None
+
+    # The mtime of an entry is its last use, for the eviction
+    try:
+      os.utime(EntryName, None)
+    except OSError:
+      pass
+    self.Hits += 1
+    return Records
+
+
+  def Put(self, key, records):
+    """ Store the records under the key and evict the least recently used entries """
+    EntryName = os.path.join(self.Directory, key + CACHE_EXTENSION)
+
+    # Written in a temporary file first so that a reader never gets a partial entry
+    Fd, TmpName = tempfile.mkstemp(suffix=TEMPORARY_EXTENSION, dir=self.Directory)
+    try:
+      with os.fdopen(Fd, "wb") as Entry:
+	cPickle.dump(records, Entry, cPickle.HIGHEST_PROTOCOL)
+      os.rename(TmpName, EntryName)
+    except (IOError, OSError, cPickle.PicklingError):
+      try:
+	os.remove(TmpName)
+      except OSError:
+	pass
+      raise
+
+    self.Evict()
+
+
+  def Evict(self):
+    """ Remove the least recently used entries until the cache fits in its maximum size """
+    Entries = []
+    TotalSize = 0
+    for Name in os.listdir(self.Directory):
+      # The temporary files left by a crash count too
+      if Name.endswith((CACHE_EXTENSION, TEMPORARY_EXTENSION)):
+	try:
+	  Stat = os.stat(os.path.join(self.Directory, Name))
+	except OSError:
+	  continue  # Removed by another instance
+	Entries.append((Stat.st_mtime, Stat.st_size, Name))
+	TotalSize += Stat.st_size
+
+    Entries.sort()
+    while TotalSize > self.MaxSize and Entries:
+      Mtime, Size, Name = Entries.pop(0)
+      try:
+	os.remove(os.path.join(self.Directory, Name))
+      except OSError:
+	pass
+      TotalSize -= Size
+
+
+  def Clear(self):
+    """ Remove all the entries of the cache """
+    for Name in os.listdir(self.Directory):
+      if Name.endswith((CACHE_EXTENSION, TEMPORARY_EXTENSION)):
+	os.remove(os.path.join(self.Directory, Name))
+
+
+  def GetStats(self):
+    """ Returns the number of hits and misses since the cache was created """
+    return self.Hits, self.Misses
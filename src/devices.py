@@ -0,0 +1,327 @@
+##############################################################################
+#
+# Command line interface manager (CLIManager) for FreeRTOS+CLI
+# File: devices.py
+# This file contains the device groups: a command is sent to all the devices
+# of a group at once and the response of each device is captured with its
+# timing. It is independent from Gtk.
+#
+# This software is released under the MIT licence
+#
+# Copyright (c) 2015 Jean-Baptiste Quelard
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+###############################################################################
+#!/usr/bin/python
+#
+# The groups are defined in the configuration file, one line per group:
+#   <Group:rack1:UDP:192.168.0.10:5005,UDP:192.168.0.11:5005,TCP:192.168.0.12:5005
+
+import re
+import csv
+import time
+import json
+import socket
+import StringIO
+
+from transport import Protocol, SelectLoop, OpenTransport
+from framer import Response, ResponseFramer, IDLE_GAP, RESPONSE_TIMEOUT
+from sessionlog import SessionLog, SessionFilename, SENT, RECEIVED
+
+
+CONNECT_TIMEOUT = 5.0	# Time (s) waiting for the connections
+COLUMN_WIDTH = 40	# Width of a device column in the side by side output
+
+_GROUP_PATTERN = re.compile("<Group:([^:]+):(.+)$")
+
+
+class Device:
+  """ Endpoint of a device """
+
+  def __init__(self, connectiontype, address, port):
+    if connectiontype not in ("UDP", "TCP"):
+      raise ValueError("Unknown connection type: " + connectiontype)
+    self.Type = connectiontype
+    self.Address = address
+    self.Port = port
+    self.Name = address + ":" + port
+
+
+  def __repr__(self):
+    return "Device(%r, %r, %r)" % (self.Type, self.Address, self.Port)
+
+
+def ParseDevice(string):
+  """ Build a device from its TYPE:ADDRESS:PORT description """
+  Fields = string.strip().split(":")
+  if len(Fields) != 3:
+    raise ValueError("Device expected as TYPE:ADDRESS:PORT: " + string)
+  return Device(Fields[0].upper(), Fields[1], Fields[2])
+
+
+def ReadDeviceGroups(filename):
+  """ Returns the groups defined in the configuration file: name -> list of devices """
+  Groups = {}
+  with open(filename, 'r') as ConfigFile:
+    for line in ConfigFile:
+      GroupMatch = re.search(_GROUP_PATTERN, line.strip())
+      if GroupMatch:
+	Groups[GroupMatch.group(1)] = [ParseDevice(Endpoint) for Endpoint in \
+				       GroupMatch.group(2).split(",") if Endpoint.strip()]
+  return Groups
+
+
+class DeviceResult:
+  """ Response of a device to a command """
+
+  def __init__(self, device, response, error=None):
+    self.Device = device
+    self.Response = response
+    self.Command = response.Command
+    self.FirstByte = response.FirstByte # Time to the first byte (s)
+    self.Elapsed = None	# Time to the last byte (s)
+    self.Error = error
+    if response.Size != 0:
+      self.Elapsed = response.Duration
+    elif error is None:
+      self.Error = "No response"
+
+
+  def GetResponse(self):
+    return self.Response.GetData()
+
+
+class DeviceSession(Protocol):
+  """ Connection to one device of the group """
+
+  def __init__(self, group, device):
+    self.Group = group
+    self.Device = device
+    self.Transport = None
+    self.Connected = False
+    self.Error = None
+    self.SendError = None # Error while sending the current command
+    self.SessionLog = None
+    self.Framer = ResponseFramer(group.Loop, self.ResponseReceived, group.Terminator, \
+				 group.Idle, group.Timeout)
+
+
+  def Open(self):
+    if self.Group.LogDirectory:
+      try:
+	self.SessionLog = SessionLog(SessionFilename(self.Group.LogDirectory, label=self.Device.Name), \
+				     self.Group.LogRotateSize, self.Group.LogRotateTime, \
+				     self.Group.LogCompression)
+      except (IOError, OSError), Error:
+	self.Error = "Session log error: " + str(Error)
+	return
+    try:
+      self.Transport = OpenTransport(self.Group.Loop, self, self.Device.Type, \
+				     self.Device.Address, self.Device.Port, self.Group.ReceiveBufferSize)
+    except (socket.error, ValueError), Error:
+      self.Error = "Socket error: " + str(Error)
+
+
+  def IsPending(self):
+    """ Tells if the connection is not established nor failed yet """
+    return not self.Connected and self.Error is None
+
+
+  def Send(self, command):
+    if not self.Connected:
+      Failed = Response(command, self.Group.Loop.Time())
+      self.Group.ResultReceived(DeviceResult(self.Device, Failed, self.Error or "Not connected"))
+      return
+    self.SendError = None
+    if self.SessionLog is not None:
+      self.SessionLog.Write(SENT, command)
+    self.Framer.Start(command)
+    self.Transport.Write(command)
+
+
+  def ResponseReceived(self, response):
+    if response.Command is None:
+      return  # Late data of a previous command
+    Error = None
+    if response.End == 'closed':
+      Error = self.Error
+    elif response.Size == 0:
+      Error = self.SendError
+    if self.SessionLog is not None and response.Size:
+      self.SessionLog.Write(RECEIVED, response.GetData())
+    self.Group.ResultReceived(DeviceResult(self.Device, response, Error))
+
+
+  def ConnectionMade(self, transport):
+    self.Connected = True
+    self.Group.StateChanged()
+
+
+  def DataReceived(self, data):
+    self.Framer.Feed(data)
+
+
+  def ErrorReceived(self, error):
+    self.SendError = error
+
+
+  def ConnectionLost(self, error):
+    self.Connected = False
+    self.Error = error or "Connection closed by the device"
+    self.Framer.Close()
+    self.Group.StateChanged()
+
+
+  def Close(self):
+    if self.Transport is not None:
+      self.Transport.Close()
+    if self.SessionLog is not None:
+      self.SessionLog.Close()
+
+
+class GroupSession:
+  """ Connections to all the devices of a group, driven by a single loop. A
+      command is sent to every device at once: the total time is the one of
+      the slowest device. Each device has its own session log, as a connection
+      of the GUI, when a directory is given """
+
+  def __init__(self, devices, timeout=RESPONSE_TIMEOUT, idle=IDLE_GAP, terminator="", \
+	       rcvbuf=None, loop=None, logdirectory=None, rotatesize=0, rotatetime=0, compression=None):
+    self.Loop = loop or SelectLoop()
+    self.LogDirectory = logdirectory
+    self.LogRotateSize = rotatesize
+    self.LogRotateTime = rotatetime
+    self.LogCompression = compression
+    self.Timeout = timeout
+    self.Idle = idle
+    self.Terminator = terminator
+    self.ReceiveBufferSize = rcvbuf
+    self.Sessions = [DeviceSession(self, Device) for Device in devices]
+    self.Results = None
+
+
+  def Connect(self, timeout=CONNECT_TIMEOUT):
+    """ Open all the connections at once. Returns the (device, error) failures """
+    for Session in self.Sessions:
+      Session.Open()
+    if [Session for Session in self.Sessions if Session.IsPending()]:
+      Timer = self.Loop.CallLater(timeout, self.Loop.Stop)
+      self.Loop.Run()
+      Timer.Cancel()
+
+    for Session in self.Sessions:
+      if Session.IsPending():
+	Session.Error = "Connection timeout"
+    return [(Session.Device, Session.Error) for Session in self.Sessions if not Session.Connected]
+
+
+  def StateChanged(self):
+    if self.Results is None and not [Session for Session in self.Sessions if Session.IsPending()]:
+      self.Loop.Stop()  # All the connections are established or failed
+
+
+  def Send(self, command):
+    """ Send the command to all the devices. Returns the results in the order of
+	the devices and the total time (s) """
+    self.Results = {}
+    Start = self.Loop.Time()
+    for Session in self.Sessions:
+      Session.Send(command)
+    if len(self.Results) < len(self.Sessions):
+      self.Loop.Run()
+    Results = [self.Results[Session.Device] for Session in self.Sessions]
+    self.Results = None
+    return Results, self.Loop.Time() - Start
+
+
+  def ResultReceived(self, result):
+    self.Results[result.Device] = result
+    if len(self.Results) == len(self.Sessions):
+      self.Loop.Stop()
+
+
+  def Close(self, wait=None):
+    """ wait: time (s) given to the session logs to be written before returning """
+    for Session in self.Sessions:
+      Session.Close()
+    if wait is not None:
+      Deadline = time.time() + wait
+      for Session in self.Sessions:
+	if Session.SessionLog is not None:
+	  Session.SessionLog.Wait(max(Deadline - time.time(), 0))
+
+
+def FormatTiming(result):
+  if result.Error is not None:
+    return result.Error
+  return "%.1f ms" % (result.Elapsed * 1000)
+
+
+def FormatSideBySide(results, width=COLUMN_WIDTH):
+  """ One column per device, the long lines are cut """
+  Columns = []
+  for Result in results:
+    Lines = [Result.Device.Name, FormatTiming(Result), "-" * width]
+    Lines.extend(Result.GetResponse().replace("\r", "").splitlines())
+    Columns.append(Lines)
+
+  Height = max([len(Lines) for Lines in Columns])
+  Rows = []
+  for Row in range(Height):
+    Cells = []
+    for Lines in Columns:
+      Cell = Lines[Row] if Row < len(Lines) else ""
+      Cells.append(Cell[:width].ljust(width))
+    Rows.append(" | ".join(Cells).rstrip())
+  return "\n".join(Rows) + "\n"
+
+
+def FormatList(results):
+  """ The responses one after the other """
+  Text = ""
+  for Result in results:
+    Text += "=== " + Result.Device.Name + " (" + FormatTiming(Result) + ")\n"
+    Text += Result.GetResponse().replace("\r", "")
+    if not Text.endswith("\n"):
+      Text += "\n"
+  return Text
+
+
+def FormatCsv(results):
+  """ One row per device: device, command, first byte and total time (ms), error, response """
+  Output = StringIO.StringIO()
+  Writer = csv.writer(Output)
+  for Result in results:
+    Writer.writerow([Result.Device.Name, Result.Command, \
+		     "" if Result.FirstByte is None else "%.3f" % (Result.FirstByte * 1000), \
+		     "" if Result.Elapsed is None else "%.3f" % (Result.Elapsed * 1000), \
+		     Result.Error or "", Result.GetResponse()])
+  return Output.getvalue()
+
+
+def FormatJson(results):
+  """ One JSON object per device, one line per command """
+  return json.dumps([{"device": Result.Device.Name, "type": Result.Device.Type, \
+		      "command": Result.Command.decode("utf-8", "replace"), \
+		      "first_byte": Result.FirstByte, "elapsed": Result.Elapsed, "error": Result.Error, \
+		      "response": Result.GetResponse().decode("utf-8", "replace")} \
+		     for Result in results]) + "\n"
+
+
+OUTPUT_FORMATS = {"side": FormatSideBySide, "list": FormatList, "csv": FormatCsv, "json": FormatJson}
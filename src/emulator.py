@@ -0,0 +1,592 @@
+##############################################################################
+#
+# Command line interface manager (CLIManager) for FreeRTOS+CLI
+# File: emulator.py
+# This file contains the device emulator: a local server answering the
+# commands parsed from FreeRTOS+CLI sources over UDP and TCP, as a board
+# would, so the CLI can be tried and load-tested without one.
+#
+# This software is released under the MIT licence
+#
+# Copyright (c) 2015 Jean-Baptiste Quelard
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+###############################################################################
+#!/usr/bin/python
+#
+# The commands of the demo (task-stats, echo-3-parameters, ping, dir...) give
+# an output close to the one of the FreeRTOS demo, the other ones a generated
+# line. As FreeRTOS+CLI, the number of parameters is checked and 'help' lists
+# the help strings. Each response may be padded to a size, cut in chunks sent
+# apart, delayed and, over UDP, lost. The responses of a client are sent in
+# order. All the clients are served by a single SelectLoop.
+
+import os
+import sys
+import errno
+import signal
+import random
+import socket
+import argparse
+import collections
+
+from registry import CommandRegistry
+from transport import SelectLoop
+
+
+DEMO_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "demo")
+DEFAULT_PORT = 5005
+MAX_UDP_PAYLOAD = 60000	# Chunk size of a UDP response when none is given
+LISTEN_BACKLOG = 128
+RECEIVE_SIZE = 64 << 10
+FILLER_LINE_LENGTH = 64	# Characters of a generated line, end of line included
+CHANNEL_LIMIT = 1024	# UDP clients remembered before the idle ones are forgotten
+
+NOT_RECOGNISED = "Command not recognised.  Enter 'help' to view a list of available commands.\r\n\r\n"
+INCORRECT_PARAMETERS = "Incorrect command parameter(s).  Enter \"help\" to view a list of available commands.\r\n\r\n"
+HELP_HELP = "\r\nhelp:\r\n Lists all the registered commands\r\n\r\n"
+
+_RETRY_ERRORS = (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR)
+
+
+def LoadCommands(paths):
+  """ Registry of the commands defined by the sources (or the .set and .bset
+      files) given """
+  from parser import CmdParser
+
+  Registry = CommandRegistry()
+  Parser = CmdParser()
+  Sources = []
+  for Path in paths:
+    if Path.endswith((".set", ".bset")):
+      Parser.CmdParse(Path, 'List', Registry)
+    else:
+      Sources.append(Path)
+  if Sources:
+    Parser.CmdParseFiles(Sources, 'Source', Registry, 1)
+  return Registry
+
+
+class EmulatorStats:
+  """ Counters of the emulator """
+
+  def __init__(self):
+    self.Commands = 0
+    self.Responses = 0
+    self.Bytes = 0	# Bytes of the responses sent
+    self.Dropped = 0	# Commands and chunks lost on purpose, or not sent
+    self.Clients = 0	# TCP connections open
+    self.Connections = 0  # TCP connections accepted
+
+
+  def __str__(self):
+    return "%d commands, %d responses (%d bytes), %d dropped, %d TCP connections (%d open)" % \
+	   (self.Commands, self.Responses, self.Bytes, self.Dropped, self.Connections, self.Clients)
+
+
+class Channel:
+  """ Where the responses of a client go. The next response is not sent before
+      the previous one, whatever the jitter """
+
+  def __init__(self, send):
+    self.Send = send
+    self.Ready = 0.0	# Loop time at which the last chunk is sent
+
+
+class DeviceEmulator:
+  """ Execute the command lines as a FreeRTOS+CLI device and send the responses.
+      size pads (or cuts) each output to this number of bytes, 0 keeps it as is.
+      chunk splits the responses, gap (s) separates the chunks. latency and
+      jitter (s) delay the responses, loss is the rate of UDP datagrams lost.
+      terminator ends each response, commandend splits the TCP stream into
+      commands. Without it, as the CLI sends them by default, each read holds
+      whole commands: its lines are executed at once """
+
+  def __init__(self, loop, registry, size=0, latency=0.0, jitter=0.0, chunk=0, gap=0.0, \
+	       loss=0.0, terminator="", commandend="", canned=None, seed=None):
+    self.Loop = loop
+    self.Registry = registry
+    self.Size = size
+    self.Latency = latency
+    self.Jitter = jitter
+    self.Chunk = chunk
+    self.Gap = gap
+    self.Loss = loss
+    self.Terminator = terminator
+    self.CommandEnd = commandend
+    self.Canned = canned or {}	# Command name -> output
+    self.Random = random.Random(seed)
+    self.Stats = EmulatorStats()
+    self.Servers = []
+
+    # State of the emulated board
+    self.Start = loop.Time()
+    self.Files = {"readme.txt": "Files of the CLIManager device emulator\r\n",
+		  "config.txt": "ip=127.0.0.1\r\nmask=255.0.0.0\r\n"}
+    self.Directory = "/"
+    self.Tracing = False
+    self.Pings = 0
+    self.Outputs = {"help": self.Help,
+		    "task-stats": self.TaskStats,
+		    "run-time-stats": self.RunTimeStats,
+		    "query-heap": self.QueryHeap,
+		    "echo-3-parameters": self.EchoParameters,
+		    "echo-parameters": self.EchoParameters,
+		    "trace": self.Trace,
+		    "ip-config": self.IPConfig,
+		    "ip-debug-stats": self.IPDebugStats,
+		    "ping": self.Ping,
+		    "dir": self.Dir,
+		    "cd": self.ChangeDirectory,
+		    "type": self.Type,
+		    "del": self.Delete,
+		    "copy": self.Copy}
+
+
+  def ListenUDP(self, address, port):
+    """ Returns the port, a free one when 0 is given """
+    Server = UDPServer(self, address, port)
+    self.Servers.append(Server)
+    return Server.Port
+
+
+  def ListenTCP(self, address, port):
+    Server = TCPServer(self, address, port)
+    self.Servers.append(Server)
+    return Server.Port
+
+
+  def Close(self):
+    for Server in self.Servers:
+      Server.Close()
+    self.Servers = []
+
+
+  def Execute(self, line):
+    """ Output of a command line """
+    Words = line.split()
+    if not Words:
+      return ""
+    Name, Parameters = Words[0], Words[1:]
+    Record = self.Registry.Get(Name)
+    if Name == "help" and Record is None:
+      return self.Help(Parameters)
+    if Record is None:
+      return NOT_RECOGNISED
+    if Record.Args >= 0 and len(Parameters) != Record.Args:
+      return INCORRECT_PARAMETERS
+    if Name in self.Canned:
+      return self.Canned[Name]
+    if Name in self.Outputs:
+      return self.Outputs[Name](Parameters)
+    return "%s: OK\r\n" % " ".join(Words)
+
+
+  def FitSize(self, output):
+    """ Output cut or padded with generated lines to the size, if one is given """
+    if self.Size <= 0 or len(output) == self.Size:
+      return output
+    if len(output) > self.Size:
+      return output[:self.Size]
+    Lines = [output]
+    Missing = self.Size - len(output)
+    Number = 0
+    while Missing > 0:
+      Line = ("%06d " % Number).ljust(FILLER_LINE_LENGTH - 2, "x") + "\r\n"
+      Lines.append(Line[:Missing])
+      Missing -= len(Line)
+      Number += 1
+    return "".join(Lines)
+
+
+  def Receive(self, line, channel, chunk):
+    """ Answer a command line, the response is sent in chunks of at most chunk
+	bytes, at once when 0 """
+    self.Stats.Commands += 1
+    Response = self.FitSize(self.Execute(line.rstrip("\r\n"))) + self.Terminator
+    chunk = chunk or max(len(Response), 1)
+    Now = self.Loop.Time()
+    Due = max(Now + self.Latency + self.Random.uniform(0, self.Jitter), channel.Ready)
+    for Start in range(0, max(len(Response), 1), chunk):
+      self.Loop.CallLater(Due - Now, channel.Send, Response[Start:Start + chunk])
+      channel.Ready = Due
+      Due += self.Gap
+    self.Stats.Responses += 1
+    self.Stats.Bytes += len(Response)
+
+
+  def IsLost(self):
+    return self.Loss > 0 and self.Random.random() < self.Loss
+
+
+  def GetTicks(self):
+    return int((self.Loop.Time() - self.Start) * 1000)
+
+
+  def Help(self, parameters):
+    Help = [HELP_HELP] + [Record.Help.decode("string_escape") for Record in self.Registry]
+    return "".join(Help)
+
+
+  def TaskStats(self, parameters):
+    Output = ["Task", "       State  Priority  Stack    #\r\n",
+	      "************************************************\r\n"]
+    for Number, (Name, State, Priority, Stack) in enumerate(self.GetTasks()):
+      Output.append("%s\t\t%s\t%d\t%d\t%d\r\n" % (Name, State, Priority, Stack, Number + 1))
+    return "".join(Output)
+
+
+  def RunTimeStats(self, parameters):
+    Output = ["Task", "  Abs Time      % Time\r\n",
+	      "****************************************\r\n"]
+    Ticks = max(self.GetTicks(), 1)
+    Tasks = self.GetTasks()
+    for Number, (Name, State, Priority, Stack) in enumerate(Tasks):
+      Share = (Ticks * (Number + 1)) // (len(Tasks) * (len(Tasks) + 1) // 2)
+      Output.append("%s\t\t%d\t\t%d%%\r\n" % (Name, Share, Share * 100 // Ticks))
+    return "".join(Output)
+
+
+  def GetTasks(self):
+    """ Tasks of the emulated board: name, state, priority, free stack """
+    Tasks = [("CLI", "R", 1, 180), ("IDLE", "R", 0, 100), ("Tmr Svc", "B", 3, 220), \
+	     ("IP-task", "B", 4, 250)]
+    if self.Tracing:
+      Tasks.append(("Trace", "B", 2, 120))
+    return Tasks
+
+
+  def QueryHeap(self, parameters):
+    return "Current free heap %d bytes, minimum ever free heap %d bytes\r\n" % (28672, 24576)
+
+
+  def EchoParameters(self, parameters):
+    Output = ["The three parameters were:\r\n" if len(parameters) == 3 else "The parameters were:\r\n"]
+    for Number, Parameter in enumerate(parameters):
+      Output.append("%d: %s\r\n" % (Number + 1, Parameter))
+    return "".join(Output)
+
+
+  def Trace(self, parameters):
+    if parameters[0] == "start":
+      self.Tracing = True
+      return "Trace recording (re)started.\r\n"
+    if parameters[0] == "stop":
+      self.Tracing = False
+      return "Stopping trace recording.\r\n"
+    return "Valid parameters are 'start' and 'stop'.\r\n"
+
+
+  def IPConfig(self, parameters):
+    return "\r\nIP address 127.0.0.1\r\nNet mask 255.0.0.0\r\nGateway address 127.0.0.1" \
+	   "\r\nDNS server address 127.0.0.1\r\n\r\n"
+
+
+  def IPDebugStats(self, parameters):
+    return "".join(["%s %d\r\n" % (Name, Value) for Name, Value in \
+		    (("Commands received", self.Stats.Commands), ("Responses sent", self.Stats.Responses), \
+		     ("Datagrams dropped", self.Stats.Dropped), ("Uptime (ms)", self.GetTicks()))])
+
+
+  def Ping(self, parameters):
+    if not parameters:
+      return INCORRECT_PARAMETERS
+    self.Pings += 1
+    return "Ping sent to %s with identifier %d\r\n" % (parameters[0], self.Pings)
+
+
+  def Dir(self, parameters):
+    return "".join(["%s [file] [size=%d]\r\n" % (Name, len(Content)) \
+		    for Name, Content in sorted(self.Files.items())])
+
+
+  def ChangeDirectory(self, parameters):
+    if parameters[0] in ("/", "\\"):
+      self.Directory = "/"
+    return "In: %s\r\n" % self.Directory
+
+
+  def Type(self, parameters):
+    return self.Files.get(parameters[0], "File not found.\r\n")
+
+
+  def Delete(self, parameters):
+    if self.Files.pop(parameters[0], None) is None:
+      return "Could not delete %s\r\n" % parameters[0]
+    return "%s was deleted\r\n" % parameters[0]
+
+
+  def Copy(self, parameters):
+    if parameters[0] not in self.Files:
+      return "Source file does not exist.\r\n"
+    self.Files[parameters[1]] = self.Files[parameters[0]]
+    return "Copy made.\r\n"
+
+
+class UDPServer:
+  """ Each datagram is a command, the response goes back to its sender """
+
+  def __init__(self, emulator, address, port):
+    self.Emulator = emulator
+    self.Socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    self.Socket.bind((address, port))
+    self.Socket.setblocking(False)
+    self.Port = self.Socket.getsockname()[1]
+    self.Channels = {}	# Client address -> Channel
+    self.ChannelLimit = CHANNEL_LIMIT
+    self.Chunk = min(emulator.Chunk or MAX_UDP_PAYLOAD, MAX_UDP_PAYLOAD)
+    emulator.Loop.AddReader(self.Socket.fileno(), self.OnReadable)
+
+
+  def OnReadable(self):
+    while True:
+      try:
+	Command, Address = self.Socket.recvfrom(RECEIVE_SIZE)
+      except socket.error, Error:
+	if Error.args[0] not in _RETRY_ERRORS:
+	  self.Emulator.Stats.Dropped += 1
+	return
+      if self.Emulator.IsLost():
+	self.Emulator.Stats.Dropped += 1
+	continue
+      Client = self.Channels.get(Address)
+      if Client is None:
+	if len(self.Channels) >= self.ChannelLimit:
+	  self.ForgetIdleChannels()
+	Client = self.Channels[Address] = Channel(lambda Data, Address=Address: self.SendTo(Data, Address))
+      self.Emulator.Receive(Command, Client, self.Chunk)
+
+
+  def ForgetIdleChannels(self):
+    """ The clients without response on the way need no order, they are
+	forgotten. The limit grows when most of them are still waiting """
+    Now = self.Emulator.Loop.Time()
+    for Address, Client in self.Channels.items():
+      if Client.Ready <= Now:
+	del self.Channels[Address]
+    self.ChannelLimit = max(CHANNEL_LIMIT, 2 * len(self.Channels))
+
+
+  def SendTo(self, data, address):
+    if self.Emulator.IsLost():
+      self.Emulator.Stats.Dropped += 1
+      return
+    try:
+      self.Socket.sendto(data, address)
+    except socket.error:
+      self.Emulator.Stats.Dropped += 1	# Lost as it would be on the network
+
+
+  def Close(self):
+    self.Emulator.Loop.RemoveReader(self.Socket.fileno())
+    self.Socket.close()
+
+
+class TCPServer:
+  """ Accept the clients, each one is a TCPClient """
+
+  def __init__(self, emulator, address, port):
+    self.Emulator = emulator
+    self.Socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    self.Socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    self.Socket.bind((address, port))
+    self.Socket.listen(LISTEN_BACKLOG)
+    self.Socket.setblocking(False)
+    self.Port = self.Socket.getsockname()[1]
+    self.Clients = set()
+    emulator.Loop.AddReader(self.Socket.fileno(), self.OnReadable)
+
+
+  def OnReadable(self):
+    while True:
+      try:
+	Socket, Address = self.Socket.accept()
+      except socket.error, Error:
+	return
+      self.Clients.add(TCPClient(self, Socket))
+      self.Emulator.Stats.Connections += 1
+      self.Emulator.Stats.Clients += 1
+
+
+  def Close(self):
+    for Client in list(self.Clients):
+      Client.Close()
+    self.Emulator.Loop.RemoveReader(self.Socket.fileno())
+    self.Socket.close()
+
+
+class TCPClient:
+  """ Connection of a client: the commands are read from the stream, the
+      responses written as the socket accepts them """
+
+  def __init__(self, server, sock):
+    self.Server = server
+    self.Emulator = server.Emulator
+    self.Socket = sock
+    self.Socket.setblocking(False)
+    self.Socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    self.Fd = sock.fileno()
+    self.InBuffer = ""	# Start of the next command, with a command end
+    self.OutBuffer = collections.deque()  # Chunks not sent yet, the first one from OutOffset
+    self.OutOffset = 0
+    self.Closed = False
+    self.Channel = Channel(self.Write)
+    self.Emulator.Loop.AddReader(self.Fd, self.OnReadable)
+
+
+  def OnReadable(self):
+    try:
+      Data = self.Socket.recv(RECEIVE_SIZE)
+    except socket.error, Error:
+      if Error.args[0] not in _RETRY_ERRORS:
+	self.Close()
+      return
+    if not Data:
+      self.Close()
+      return
+
+    if self.Emulator.CommandEnd:
+      # A command split over several reads waits for its end
+      Commands = (self.InBuffer + Data).split(self.Emulator.CommandEnd)
+      self.InBuffer = Commands.pop()
+    else:
+      # Nothing tells the commands apart but the reads: each line read is a
+      # command, the line read without its end too
+      Commands = Data.split("\n")
+      if Commands[-1] == "" and len(Commands) > 1:
+	Commands.pop()
+    for Command in Commands:
+      self.Emulator.Receive(Command, self.Channel, self.Emulator.Chunk)
+
+
+  def Write(self, data):
+    if self.Closed or not data:
+      return
+    self.OutBuffer.append(data)
+    self.Flush()
+
+
+  def Flush(self):
+    while self.OutBuffer:
+      try:
+	Sent = self.Socket.send(memoryview(self.OutBuffer[0])[self.OutOffset:])
+      except socket.error, Error:
+	if Error.args[0] in _RETRY_ERRORS:
+	  break
+	self.Close()
+	return
+      self.OutOffset += Sent
+      if self.OutOffset == len(self.OutBuffer[0]):
+	self.OutBuffer.popleft()
+	self.OutOffset = 0
+
+    if self.OutBuffer:
+      self.Emulator.Loop.AddWriter(self.Fd, self.Flush)
+    else:
+      self.Emulator.Loop.RemoveWriter(self.Fd)
+
+
+  def Close(self):
+    if self.Closed:
+      return
+    self.Closed = True
+    self.Emulator.Loop.RemoveReader(self.Fd)
+    self.Emulator.Loop.RemoveWriter(self.Fd)
+    self.Socket.close()
+    self.Server.Clients.discard(self)
+    self.Emulator.Stats.Clients -= 1
+
+
+def ParseCanned(values):
+  """ Canned outputs given as NAME=FILE """
+  Canned = {}
+  for Value in values:
+    Name, Separator, Filename = Value.partition("=")
+    if not Separator:
+      raise ValueError("expected NAME=FILE: " + Value)
+    with open(Filename, "rb") as File:
+      Canned[Name] = File.read()
+  return Canned
+
+
+def Main(argv):
+  ArgParser = argparse.ArgumentParser(description="Emulate a FreeRTOS+CLI device answering over UDP and TCP " \
+				      "the commands defined in the sources (the demo by default)")
+  ArgParser.add_argument("paths", nargs="*", default=[DEMO_DIRECTORY], \
+			 help="sources, directories or .set/.bset files defining the commands")
+  ArgParser.add_argument("-a", "--address", default="127.0.0.1", help="address listened to (default: %(default)s)")
+  ArgParser.add_argument("-u", "--udp", type=int, default=DEFAULT_PORT, \
+			 help="UDP port, 0 for any, -1 for none (default: %(default)s)")
+  ArgParser.add_argument("-t", "--tcp", type=int, default=DEFAULT_PORT, \
+			 help="TCP port, 0 for any, -1 for none (default: %(default)s)")
+  ArgParser.add_argument("-s", "--size", type=int, default=0, \
+			 help="size (bytes) of each output, padded or cut, 0 to keep them (default: %(default)s)")
+  ArgParser.add_argument("--latency", type=float, default=0.0, help="delay (s) of the responses (default: %(default)s)")
+  ArgParser.add_argument("--jitter", type=float, default=0.0, \
+			 help="random delay (s) added to the latency (default: %(default)s)")
+  ArgParser.add_argument("--chunk", type=int, default=0, \
+			 help="bytes sent at once, 0 for the whole response (default: %(default)s)")
+  ArgParser.add_argument("--gap", type=float, default=0.0, help="delay (s) between two chunks (default: %(default)s)")
+  ArgParser.add_argument("-l", "--loss", type=float, default=0.0, \
+			 help="rate at which the UDP commands and chunks are lost (default: %(default)s)")
+  ArgParser.add_argument("--terminator", default="", \
+			 help="end of the responses, with escapes such as \\r\\n> (default: none)")
+  ArgParser.add_argument("--command-end", default="", \
+			 help="end of the commands in the TCP stream, with escapes such as \\n (default: none, as the CLI: " \
+			 "each line read is a command)")
+  ArgParser.add_argument("--canned", action="append", default=[], \
+			 help="NAME=FILE, output of a command read from a file, can be repeated")
+  ArgParser.add_argument("--seed", type=int, default=None, help="seed of the jitter and the losses")
+  Args = ArgParser.parse_args(argv)
+
+  try:
+    Canned = ParseCanned(Args.canned)
+  except (ValueError, IOError), Error:
+    ArgParser.error(str(Error))
+  Registry = LoadCommands(Args.paths)
+  Loop = SelectLoop()
+  Emulator = DeviceEmulator(Loop, Registry, Args.size, Args.latency, Args.jitter, Args.chunk, Args.gap, \
+			    Args.loss, Args.terminator.decode("string_escape"), \
+			    Args.command_end.decode("string_escape"), Canned, Args.seed)
+  try:
+    Listening = []
+    if Args.udp >= 0:
+      Listening.append("UDP %s:%d" % (Args.address, Emulator.ListenUDP(Args.address, Args.udp)))
+    if Args.tcp >= 0:
+      Listening.append("TCP %s:%d" % (Args.address, Emulator.ListenTCP(Args.address, Args.tcp)))
+  except socket.error, (Errno, Strerror):
+    sys.stderr.write("Socket error: " + Strerror + "\n")
+    return 1
+  if not Listening:
+    ArgParser.error("no port to listen to")
+
+  print "Emulating %d commands on %s" % (len(Registry), " and ".join(Listening))
+  sys.stdout.flush()
+  signal.signal(signal.SIGTERM, lambda Signal, Frame: Loop.Stop())
+  try:
+    Loop.Run()
+  except KeyboardInterrupt:
+    pass
+  Emulator.Close()
+  print Emulator.Stats
+  return 0
+
+
+if __name__ == "__main__":
+  sys.exit(Main(sys.argv[1:]))
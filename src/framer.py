@@ -0,0 +1,166 @@
+##############################################################################
+#
+# Command line interface manager (CLIManager) for FreeRTOS+CLI
+# File: framer.py
+# This file contains the response framer: the chunks sent by the device for a
+# command are gathered until the end of the response, which is delivered as
+# a whole. It is independent from Gtk.
+#
+# This software is released under the MIT licence
+#
+# Copyright (c) 2015 Jean-Baptiste Quelard
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+###############################################################################
+#!/usr/bin/python
+#
+# A FreeRTOS+CLI command returns pdTRUE while it has more output: the device
+# sends its response in several chunks (datagrams or TCP segments) with
+# nothing marking the last one. The end of a response is either a terminator
+# configured for the device (e.g. a prompt it sends) or a gap without data.
+
+
+IDLE_GAP = 0.1	# Time (s) without data ending a response
+RESPONSE_TIMEOUT = 1.0	# Time (s) waiting for the beginning of a response
+
+
+class Response:
+  """ Response of the device. Command is None for data received while no
+      command was waiting for a response """
+
+  def __init__(self, command, start):
+    self.Command = command
+    self.Start = start
+    self.Chunks = []
+    self.Size = 0	# Bytes received
+    self.FirstByte = None # Time (s) from the start to the first byte
+    self.Duration = None  # Time (s) from the start to the last byte (or the timeout)
+    self.End = None	# 'terminator', 'idle', 'timeout', 'next' or 'closed'
+    self.TerminatorSize = 0
+    self.Text = None	# Decoded data, set by the receiver when needed
+    self.Number = None	# Number of the command in the queue (pipeline.CommandQueue)
+    self.Queued = 0.0	# Time (s) the command waited in the queue before being sent
+    self.Attempts = 1	# Times the command was sent, more than once when retransmitted
+
+
+  def Add(self, data, now):
+    if self.FirstByte is None:
+      self.FirstByte = now - self.Start
+    self.Chunks.append(data)
+    self.Size += len(data)
+    self.Duration = now - self.Start
+
+
+  def GetData(self):
+    """ The data of the response, without its terminator """
+    Data = "".join(self.Chunks)
+    if self.TerminatorSize:
+      Data = Data[:-self.TerminatorSize]
+    return Data
+
+
+class ResponseFramer:
+  """ Gather the chunks of a response and deliver it to the callback once complete """
+
+  def __init__(self, loop, callback, terminator="", idle=IDLE_GAP, timeout=RESPONSE_TIMEOUT):
+    self.Loop = loop
+    self.Callback = callback
+    self.Terminator = terminator  # Empty: only the idle gap ends a response
+    self.Idle = idle
+    self.Timeout = timeout
+    self.Current = None	# Response being received
+    self.Tail = ""	# End of the data received, the terminator may be split over chunks
+    self.Timer = None
+
+
+  def SetTimer(self, delay, end):
+    if self.Timer is not None:
+      self.Timer.Cancel()
+    self.Timer = self.Loop.CallLater(delay, self.Deliver, end)
+
+
+  def Start(self, command, start=None, timeout=None):
+    """ A command is sent, the data received from now on is its response. The
+	timing is measured from start, the current time by default """
+    if self.Current is not None:
+      self.Deliver('next')
+    self.Current = Response(command, self.Loop.Time() if start is None else start)
+    self.SetTimer(self.Timeout if timeout is None else timeout, 'timeout')
+
+
+  def Feed(self, data):
+    """ Data received from the device. It may hold the end of several responses """
+    Now = self.Loop.Time()
+    Terminator = self.Terminator
+    Offset = 0	# Start of the data not delivered yet
+
+    while True:
+      if self.Current is None:
+	self.Current = Response(None, Now)
+      if not Terminator:
+	break
+
+      End = -1
+      if self.Tail:
+	# Terminator split between the previous chunk and this one
+	Found = (self.Tail + data[Offset:Offset + len(Terminator) - 1]).find(Terminator)
+	if Found >= 0:
+	  End = Offset + Found + len(Terminator) - len(self.Tail)
+      if End < 0:
+	Found = data.find(Terminator, Offset)
+	if Found < 0:
+	  break
+	End = Found + len(Terminator)
+
+      # The response ends here, what follows starts the next one
+      self.Current.Add(data[Offset:End], Now)
+      self.Current.TerminatorSize = len(Terminator)
+      self.Deliver('terminator')
+      Offset = End
+      if Offset == len(data):
+	return
+
+    if Offset:
+      data = data[Offset:]
+    if len(Terminator) > 1:
+      self.Tail = (self.Tail + data[-(len(Terminator) - 1):])[-(len(Terminator) - 1):]
+    self.Current.Add(data, Now)
+    self.SetTimer(self.Idle, 'idle')
+
+
+  def Deliver(self, end):
+    """ The current response is complete """
+    if self.Timer is not None:
+      self.Timer.Cancel()
+      self.Timer = None
+    Current = self.Current
+    if Current is None:
+      return
+    self.Current = None
+    self.Tail = ""
+
+    Current.End = end
+    if Current.Size == 0:
+      Current.Duration = self.Loop.Time() - Current.Start
+    self.Callback(Current)
+
+
+  def Close(self):
+    """ The connection is closed, the response being received is delivered """
+    self.Deliver('closed')
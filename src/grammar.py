@@ -0,0 +1,82 @@
+##############################################################################
+#
+# Command line interface manager (CLIManager) for FreeRTOS+CLI
+# File: grammar.py
+# This file contains the pyparsing grammar of the command declarations, of the
+# .set file and of the help strings. It is only imported when needed.
+# See: sourceforge.net/projects/pyparsing
+#
+# This software is released under the MIT licence
+#
+# Copyright (c) 2015 Jean-Baptiste Quelard
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+###############################################################################
+#!/usr/bin/python
+
+from pyparsing import *
+
+
+#define grammar for parsing source .c file
+LEFT_BRACE,RIGHT_BRACE,EQ,COMMA = map(Suppress,"{}=,")
+_def = Suppress('static const CLI_Command_Definition_t')
+sign = oneOf("+ -")
+integer = Word(nums)
+signed_int = Combine(Optional(sign) + integer)
+CmdString = dblQuotedString(alphanums+"_")
+CmdHelp = dblQuotedString(alphanums+"_")
+identifier = Word(alphas,alphanums+'_')
+comment = Word(alphas,alphanums+'_')
+comment.ignore(cStyleComment)
+
+Declaration = Group( _def + identifier + EQ + LEFT_BRACE + \
+			  CmdString('NameString').setParseAction(removeQuotes)  + \
+			  COMMA + \
+			  Optional(comment) + \
+			  CmdHelp('Help').setParseAction(removeQuotes)  + \
+			  COMMA + \
+			  identifier + \
+			  COMMA + \
+			  Optional(comment) + \
+			  signed_int('Args').setParseAction( lambda s,l,t: [ int(t[0]) ] ) + \
+			  Optional(comment) + \
+			  RIGHT_BRACE )
+
+CommandDefinition = Declaration('Command')
+CommandDefinition.ignore(cStyleComment)
+
+#define grammar for parsing the set of commands (.set file)
+line = Group( CmdString('NameString').setParseAction(removeQuotes) + \
+		      COMMA + \
+		      CmdHelp('Help').setParseAction(removeQuotes) + \
+		      COMMA + \
+		      signed_int('Args').setParseAction( lambda s,l,t: [ int(t[0]) ] ) + \
+		      Optional(COMMA + dblQuotedString('ArgList').setParseAction(removeQuotes)))
+
+Command = line('Command')
+
+#define grammar for parsing the help strings (arguments of the commands)
+Wrd = Word(alphas,alphanums+'_')
+StringArg = QuotedString("<",endQuoteChar=">")
+BoolArg = QuotedString("[",endQuoteChar="]")
+
+_HelpString = Group(  ZeroOrMore(Wrd) + Optional(StringArg('StringParam')) + \
+					Optional(BoolArg('BoolParam')))
+
+HelpString = _HelpString('Str')
@@ -29,12 +29,24 @@
 ###############################################################################
 #!/usr/bin/python
 
-from gi.repository import Gtk, Gdk, Pango
+from gi.repository import Gtk, Gdk, Pango, GObject
 from parser import *
+from cache import ParseCache
+from registry import CommandRegistry
+from assistant import SyntaxAssistant
+from setfile import TEXT_SET_EXTENSION, BINARY_SET_EXTENSION
+from importer import ImportWorker
+from watcher import SourceWatcher
+from render import OutputBacklog, ScrollbackExcess, FRAME_INTERVAL
+from sessionlog import SessionLogReader, SessionReplay, LOG_EXTENSION, COMPRESSIONS, LOG_CLOSE_TIMEOUT
+from transport import GObjectLoop
+from logviewer import SessionLogViewer
 from CLIManager import * 
 
 import os
 import sys
+import time
+import Queue
 
 
 UI_MENU = """
@@ -43,8 +55,12 @@ UI_MENU = """
     <menu action='FileMenu'>
       <menuitem action='FileOpen' />
       <menuitem action='ImportFromSource' />
+      <menuitem action='ImportFromDirectory' />
       <menuitem action='SaveAs' />
       <separator/>
+      <menuitem action='OpenSessionLog' />
+      <menuitem action='ReplaySessionLog' />
+      <separator/>
       <menuitem action='FileQuit' />
     </menu>
     <menu action='ConnectionsMenu'>
@@ -66,6 +82,8 @@ UI_MENU = """
       <separator/>
       <menuitem action='HideAssistantPopover' />
       <menuitem action='HideEscapeChar' />
+      <separator/>
+      <menuitem action='WatchSources' />
     </menu>
   </menubar>
   <toolbar name='ToolBar'>
@@ -82,6 +100,13 @@ UI_MENU = """
 """
 
 _APP_NAME = "CLI Manager for FreeRTOS"
+REPLAY_SPEEDS = [("Original speed", 1.0), ("2x", 2.0), ("10x", 10.0), ("100x", 100.0), ("As fast as possible", 0)]
+ASSISTANT_DELAY = 50  # Delay (ms) used to group the updates of the syntax assistant
+IMPORT_POLL_PERIOD = 50 # Period (ms) of the loading of the records sent by the import worker
+IMPORT_TIME_SLICE = 0.02  # Time (s) spent loading records at each period
+MAX_REPORTED_CONFLICTS = 20 # Conflicting definitions listed in the warning dialog
+WATCH_POLL_PERIOD = 1000  # Period (ms) of the polling of the sources when inotify is not available
+WATCH_DELAY = 300 # Delay (ms) used to group the changes of the watched sources
 
 
 class MainWindow(Gtk.Window):
@@ -102,7 +127,8 @@ class MainWindow(Gtk.Window):
     self.grid.set_column_spacing(10)	
     self.add(self.grid)
 
-    #Liststore which contains the list of commands
+    #Commands currently loaded and the liststore displaying them
+    self.CommandRegistry = CommandRegistry()
     self.CommandsListstore = Gtk.ListStore(str, int, str, str)
 
     #create the treeview for the set of commands
@@ -113,6 +139,13 @@ class MainWindow(Gtk.Window):
       self.CmdSetTreeview.append_column(column)
 
     self.AssistantPopoverActive = False
+    self.Assistant = SyntaxAssistant(self.CommandRegistry)
+    self.AssistantTimeoutId = None  # Pending update of the syntax assistant
+
+    self.OutputBacklog = OutputBacklog()  # Responses not displayed yet
+    self.OutputFlushId = None
+    self.LastResponse = None
+    self.Replay = None	# Session log being replayed in the CLI
 
     ActionGroup = Gtk.ActionGroup("MenuActions")
     self.AddFileMenuActions(ActionGroup)
@@ -185,6 +218,22 @@ class MainWindow(Gtk.Window):
     self.CLITextview.set_accepts_tab(True)
     self.CLITextview.grab_focus()
 
+    # Background import
+    self.ImportWorker = None
+
+    # Watch mode: the imported sources are parsed again when they change
+    self.WatchedPaths = []
+    self.SourceWatcher = None
+    self.WatchSourceId = None
+    self.WatchTimeoutId = None  # Pending update of the changed sources
+    self.ChangedSources = set()
+
+    # Parsed files are cached from one import to another
+    try:
+      self.ParseCache = ParseCache()
+    except OSError:
+      self.ParseCache = None  # Cache directory can't be created
+
     # Init variables for command history
     self.CLIHistory = []
     self.CLIHistoryOffset = 0
@@ -228,14 +277,16 @@ class MainWindow(Gtk.Window):
 
     # Completion
     if event.keyval == Gdk.KEY_Tab:
-      # Completion possible only if one suggested command
-      if self.IsAssistantPopoverActive() and self.IsOneSuggestion():
+      self.FlushAssistantUpdate() # The popover must reflect what is typed
+      # Completion up to the longest prefix shared by the suggested commands
+      if self.IsAssistantPopoverActive():
 	StartMark = self.CLITextbuffer.get_mark("CmdId")
 	Start = self.CLITextbuffer.get_iter_at_mark(StartMark)
 	End = self.CLITextbuffer.get_end_iter()
 
-	String = self.GetCompletionString(self.CLITextbuffer.get_text(Start, End, False))
-	if String is not None:	# No completion if nothing matches
+	Input = self.CLITextbuffer.get_text(Start, End, False)
+	String = self.GetCompletionString(Input)
+	if String is not None and String != Input:	# No completion if nothing matches
 	  self.CLITextbuffer.delete(Start, End)
 	  self.CLITextbuffer.insert(Start, String)
 	  self.UpdtateAssistantPopover("")
@@ -254,7 +305,7 @@ class MainWindow(Gtk.Window):
       self.DestroyAssistantPopover()
 
       if self.CLIManager.ConManager.IsConnectionActive():
-	self.fd = self.CLIManager.ConManager.Send(Command)
+	self.CLIManager.ConManager.Send(Command)
 
       self.CLITextview.scroll_to_mark(self.CLITextbuffer.get_insert(),0.0,False,0.5,0.5)
 
@@ -276,32 +327,49 @@ class MainWindow(Gtk.Window):
 
 
   def GetCompletionString(self, pattern):
-    """ Returns the row starting with the requested pattern """
-    for Row in self.CommandsListstore:
-      if Row[0].startswith(pattern):
-	return Row[0]
+    """ Returns the longest string shared by the commands starting with the
+	requested pattern (the command itself when only one matches) """
+    return self.CommandRegistry.Trie.LongestCommonPrefix(pattern)
 
 
   def InsertTextCallback(self, widget, location, text, length):
     """ Handle syntax assistant popover according to user input """
-  
-    StartMark = self.CLITextbuffer.get_mark("CmdId")
-    Start = self.CLITextbuffer.get_iter_at_mark(StartMark)
-    End = self.CLITextbuffer.get_end_iter()
-        
-    UserInput = self.CLITextbuffer.get_text(Start, End, False)
-
-    Line = UserInput + text	# group the whole input
-
-    self.FillSyntaxAssistantContent(Line)
+    self.ScheduleAssistantUpdate()
 
 
   def DeleteTextCallback(self, buffer, start, end):
     """ Handle syntax assistant popover when some text is deleted """
+    self.ScheduleAssistantUpdate()
+
+
+  def ScheduleAssistantUpdate(self):
+    """ The syntax assistant is updated once the input stops changing for a
+	moment, so a fast typing or a paste leads to a single update """
+    if self.AssistantTimeoutId is not None:
+      GObject.source_remove(self.AssistantTimeoutId)
+    self.AssistantTimeoutId = GObject.timeout_add(ASSISTANT_DELAY, self.OnAssistantTimeout)
+
+
+  def OnAssistantTimeout(self):
+    """ Called when the input stopped changing """
+    self.AssistantTimeoutId = None
+    self.UpdateSyntaxAssistant()
+    return False  # One shot
+
+
+  def FlushAssistantUpdate(self):
+    """ Perform the pending update of the syntax assistant immediately """
+    if self.AssistantTimeoutId is not None:
+      GObject.source_remove(self.AssistantTimeoutId)
+      self.AssistantTimeoutId = None
+      self.UpdateSyntaxAssistant()
+
+
+  def UpdateSyntaxAssistant(self):
+    """ Update the syntax assistant popover with what is currently typed """
     StartMark = self.CLITextbuffer.get_mark("CmdId")
     Start = self.CLITextbuffer.get_iter_at_mark(StartMark)
     End = self.CLITextbuffer.get_end_iter()
-    End.backward_char() #Last char is being suppressed
 
     UserInput = self.CLITextbuffer.get_text(Start, End, False)
 
@@ -315,55 +383,8 @@ class MainWindow(Gtk.Window):
 
   def FillSyntaxAssistantContent(self, Line):
     """ Fills the syntax assistant popover with suggestions according to user input """
-    AssistantPopoverContent = ""
-    ShowPopover = False
-
-    CurrentLine = Line.split() # Split to get the command without parameter
-
-    for Row in self.CommandsListstore:
-      if Row[0].startswith(CurrentLine[0]):
-	ShowPopover = True
-	# Exact match no need to show assistant anymore
-	if Row[0] == CurrentLine[0] and Row[1] == 0:
-	  ShowPopover = False
-
-	# Command input complete but the popover will display the parameters
-	elif Row[0] == CurrentLine[0] and Row[1] != 0:
-	  # Parse the Help string to extract parameters if possible
-	  Parser = CmdParser()
-	  ParamList = Parser.ParseHelpString(Row[2], Row[1])
-	  
-	  if ParamList != None:
-	    if len(ParamList) != 0:
-	      for Param in ParamList:
-		if AssistantPopoverContent != "":
-		  AssistantPopoverContent += " "
-		AssistantPopoverContent += "<b><i>[ " + Param + " ]</i></b>"
-	    else:
-	    # Special case. No argument found in the help string but
-	    # the nb of declared arguments is not 0
-	      AssistantPopoverContent += "<b><i>[ ... ]</i></b>"
-
-	# Handle whitespaces in the command string
-	elif (Row[0] != CurrentLine[0]) and (" " in Line):
-	    ShowPopover = False
-    
-	# The command name is not complete yet
-	else:
-	  # Parse the help string to extract command parameters if possible
-	  Parser = CmdParser()
-	  ParamList = Parser.ParseHelpString(Row[2], Row[1])
-
-	  if AssistantPopoverContent != "":
-	    AssistantPopoverContent += "\n"
-	  AssistantPopoverContent += '<b>' + Row[0] + "</b>"
-	  if ParamList != None:
-	    if len(ParamList) != 0:
-	      for Param in ParamList:
-		AssistantPopoverContent += " " + "<i>[ " + Param + " ]</i>"
-	    else:
-		AssistantPopoverContent += " " + "<i>[ ... ]</i>"
-		
+    ShowPopover, AssistantPopoverContent = self.Assistant.Update(Line)
+
     if ShowPopover == True:
       if self.AssistantPopoverActive == True:
 	# Just update the popover
@@ -455,16 +476,6 @@ class MainWindow(Gtk.Window):
     return self.AssistantPopoverActive
 
 
-  def IsOneSuggestion(self):
-    """ Tells if there is only one command corresponding to what is typed """
-    text = self.PopoverLabel.get_text()
-    # Check if there's more than one line in the label
-    if "\n" in text:
-      return False
-    else:
-      return True
-
-
   def AddToHistory(self, command):
     """ Add a command to history. Called after the user sent a command """
 
@@ -544,8 +555,14 @@ class MainWindow(Gtk.Window):
              self.OnMenuImportFromSet),
             ("ImportFromSource", Gtk.STOCK_CONVERT, "Import from source", None, None,
              self.OnMenuImportFromSource),
+	    ("ImportFromDirectory", Gtk.STOCK_DIRECTORY, "Import from directory", None, None,
+	     self.OnMenuImportFromDirectory),
             ("SaveAs", Gtk.STOCK_FLOPPY, "Save As", None, None,
-             self.OnMenuSaveAs)])
+	     self.OnMenuSaveAs),
+	    ("OpenSessionLog", None, "Open session log", None, None,
+	     self.OnMenuOpenSessionLog),
+	    ("ReplaySessionLog", None, "Replay session log", None, None,
+	     self.OnMenuReplaySessionLog)])
 
     FilequitAction = Gtk.Action("FileQuit", None, None, Gtk.STOCK_QUIT)
     FilequitAction.connect("activate", self.OnMenuFileQuit)
@@ -571,14 +588,22 @@ class MainWindow(Gtk.Window):
     SyntaxAssistant.set_active(self.CLIManager.GetHideSyntaxAssistantParam())
     ActionGroup.add_action(SyntaxAssistant)
 
+    WatchSources = Gtk.ToggleAction("WatchSources", "Watch imported sources", \
+				      None, None)
+    WatchSources.connect("toggled", self.OnOptionWatchSourcesToggled)
+    ActionGroup.add_action(WatchSources)
+    self.WatchSourcesAction = WatchSources
+
     ActionGroup.add_actions([
             ("ColorNone", None, "None", None, None, self.OnOptionSelectColor),
             ("ColorSea", None, "Sea", None, None, self.OnOptionSelectColor),
             ("ColorConsole", None, "Console", None, None, self.OnOptionSelectColor) ])
 
 
-  def OnMenuFileQuit(self, widget):
-    """ Called when the cross is clicked or quit from file menu """
+  def OnMenuFileQuit(self, widget, event=None):
+    """ Called when the cross is clicked or quit from file menu. The session
+	log is written before quitting """
+    self.CLIManager.ConManager.Disconnect(LOG_CLOSE_TIMEOUT)
     Gtk.main_quit()
 
 
@@ -680,28 +705,93 @@ class MainWindow(Gtk.Window):
       self.CLIManager.ConManager.SetConnectionType("TCP")
 
 
-  def DataHandler(self, data):
-    """ Callback to handle data received from the socket """
+  def DataHandler(self, response):
+    """ Callback to handle a complete response received from the socket """
+    if response.Size == 0:
+      if response.Command is not None:
+	self.AppStatusbar.ResponseReceived(response)  # No response to the command
+      return
+
+    # Displayed with the next frame, each response followed by a new prompt
+    self.LastResponse = response
+    self.QueueOutput(response.Text.encode("utf-8") + "\n> ")
+
+
+  def QueueOutput(self, data):
+    """ The data is displayed with the next frame """
+    self.OutputBacklog.Add(data)
+    if self.OutputFlushId is None:
+      self.OutputFlushId = GObject.timeout_add(FRAME_INTERVAL, self.OnOutputFrame)
+
+
+  def OnOutputFrame(self):
+    """ Display the responses received since the last frame with a single insert
+	and a single scroll. Called again while some are left """
+    data = self.OutputBacklog.Take()
 
     CmdStartMark = self.CLITextbuffer.get_mark("CmdId")
     Start = self.CLITextbuffer.get_iter_at_mark(CmdStartMark)
     end = self.CLITextbuffer.get_end_iter()
     self.CLITextbuffer.delete(Start, end)
     self.CLITextbuffer.insert(Start, data)
-    self.CLITextbuffer.insert_at_cursor("\n> ",3)
+    self.CLITextbuffer.place_cursor(self.CLITextbuffer.get_end_iter())
 
     # Update the mark
     self.CLITextbuffer.delete_mark_by_name("CmdId")
     self.CLITextbuffer.create_mark("CmdId", self.CLITextbuffer.get_end_iter(), True) 
 
+    self.TrimScrollback()
     self.CLITextview.scroll_to_mark(self.CLITextbuffer.get_insert(),0.0,True,0.5,0.5)
 
+    if self.LastResponse is not None:
+      self.AppStatusbar.ResponseReceived(self.LastResponse, len(self.OutputBacklog), \
+					 self.OutputBacklog.CatchingUp)
+    if len(self.OutputBacklog):
+      return True
+    self.OutputFlushId = None
+    return False
+
+
+  def TrimScrollback(self):
+    """ Remove the oldest lines once the scrollback exceeds its limit. The line
+	of the prompt and the input of the user are kept """
+    Lines, Chars = self.CLIManager.GetScrollbackConfig()
+    End = self.CLITextbuffer.get_start_iter()
+
+    Excess = ScrollbackExcess(self.CLITextbuffer.get_line_count(), Lines)
+    if Excess:
+      End = self.CLITextbuffer.get_iter_at_line(Excess)
+    Excess = ScrollbackExcess(self.CLITextbuffer.get_char_count(), Chars)
+    if Excess:
+      CharsEnd = self.CLITextbuffer.get_iter_at_offset(Excess)
+      if not CharsEnd.starts_line():
+	CharsEnd.forward_line()  # Whole lines only
+      if CharsEnd.compare(End) > 0:
+	End = CharsEnd
+
+    CmdStartMark = self.CLITextbuffer.get_mark("CmdId")
+    PromptLine = self.CLITextbuffer.get_iter_at_mark(CmdStartMark).get_line()
+    PromptStart = self.CLITextbuffer.get_iter_at_line(PromptLine)
+    if End.compare(PromptStart) > 0:
+      End = PromptStart
+    if End.get_offset() > 0:
+      self.CLITextbuffer.delete(self.CLITextbuffer.get_start_iter(), End)
+
 
   def OnMenuConnect(self, widget):
     """ Called when the user ask for opening the port/establish connection """
-    Error = self.CLIManager.ConManager.Connect(self.DataHandler)
+    Error = self.CLIManager.ConManager.Connect(self.DataHandler, self.OnConnectionState)
+    self.SetConnectionStatusInTitle()
+    if Error is None:
+      self.AppStatusbar.Connecting()  # Established in the background
+    else:
+      self.AppStatusbar.Connect(Error)
+
+
+  def OnConnectionState(self, error):
+    """ Called when the connection is established (no error), failed or lost """
     self.SetConnectionStatusInTitle()
-    self.AppStatusbar.Connect(Error)	#Update the status bar
+    self.AppStatusbar.Connect(error)	#Update the status bar
 
 
   def OnMenuDisconnect(self, widget):
@@ -734,6 +824,11 @@ class MainWindow(Gtk.Window):
     self.ImportFrom('Source')
 
 
+  def OnMenuImportFromDirectory(self, widget):
+    """ Called when the user request to import all the sources of a directory """
+    self.ImportFrom('Directory')
+
+
   def ImportFrom(self, FileType):
     """ Called when a list of commands should be loaded to the gtk liststore """
 
@@ -747,32 +842,55 @@ class MainWindow(Gtk.Window):
       FilterAll = Gtk.FileFilter()
       FilterAll.set_name("All")
       FilterAll.add_pattern("*")
+      Action = Gtk.FileChooserAction.OPEN
+
+    elif FileType == 'Directory':
+      DialogTitle = "Select source directory"
+      FilterMain = None
+      FilterAll = None
+      Action = Gtk.FileChooserAction.SELECT_FOLDER
 
     elif FileType == 'List':
       DialogTitle = "Select list of commands file (.set)"
       # Filters for the file chooser
       FilterMain = Gtk.FileFilter()
-      FilterMain.set_name(".set")
-      FilterMain.add_pattern("*.set")
+      FilterMain.set_name(".set, .bset")
+      FilterMain.add_pattern("*" + TEXT_SET_EXTENSION)
+      FilterMain.add_pattern("*" + BINARY_SET_EXTENSION)
 
       FilterAll = Gtk.FileFilter()
       FilterAll.set_name("All")
       FilterAll.add_pattern("*")
+      Action = Gtk.FileChooserAction.OPEN
 
     Dialog = Gtk.FileChooserDialog(DialogTitle, self,
-             Gtk.FileChooserAction.OPEN,
+	     Action,
             (Gtk.STOCK_CANCEL, Gtk.ResponseType.CANCEL,
              Gtk.STOCK_OPEN, Gtk.ResponseType.OK))
 
-    Dialog.add_filter(FilterMain)
-    Dialog.add_filter(FilterAll)
+    if FilterMain is not None:
+      Dialog.add_filter(FilterMain)
+      Dialog.add_filter(FilterAll)
+
+    # Several source files or directories can be imported at once
+    Dialog.set_select_multiple(FileType != 'List')
 
     Response = Dialog.run()
+    Filenames = Dialog.get_filenames()
     Filename = Dialog.get_filename() # Filename is nonetype when cancel button pressed
     Dialog.destroy()  # Dialog not needed anymore
 
     if Response == Gtk.ResponseType.OK:
 
+      # A single import at a time
+      if self.ImportWorker is not None:
+	Dialog = Gtk.MessageDialog(self, 0, Gtk.MessageType.ERROR,
+		 Gtk.ButtonsType.CANCEL, "Error")
+	Dialog.format_secondary_text("An import is already in progress")
+	Dialog.run()
+	Dialog.destroy()
+	return
+
       #Check if a set is already loaded
       if self.CLIManager.IsCommandsSetLoaded():
 	AddToListDialog = AppendToListDialog(self)
@@ -784,19 +902,300 @@ class MainWindow(Gtk.Window):
 	  return # Import cancelled
 
 	if AppendResponse == Gtk.ResponseType.NO:
-	  #liststore should be emptied first
+	  #registry and liststore should be emptied first
+	  self.CommandRegistry.Clear()
 	  self.CommandsListstore.clear()
 	  self.CLIManager.SetCommandsSetLoaded(False)
+	  self.WatchedPaths = []
+	  self.StopWatcher()
+
+      # parse the file(s) in the background, the records are loaded as they come
+      if FileType == 'List':
+	self.ImportPaths = [Filename]
+      else:
+	self.ImportPaths = Filenames
+	FileType = 'Source'
+      self.ImportType = FileType
+      self.ImportTimings = []
+      self.ImportNbConflicts = len(self.CommandRegistry.Conflicts)
+
+      self.ImportWorker = ImportWorker(self.ImportPaths, FileType, cache=self.ParseCache)
+      self.ImportWorker.start()
+      GObject.timeout_add(IMPORT_POLL_PERIOD, self.OnImportProgress)
+      self.AppStatusbar.ImportStarted()
+
+
+  def OnImportProgress(self):
+    """ Load the records sent by the import worker. Called periodically, the time
+	spent here is limited so the main loop stays responsive """
+    Deadline = time.time() + IMPORT_TIME_SLICE
+    while time.time() < Deadline:
+      try:
+	Message = self.ImportWorker.Queue.get_nowait()
+      except Queue.Empty:
+	return True # Wait for the next period
+
+      if Message[0] == 'Records':
+	self.LoadRecords(Message[2], Message[1])
+	self.AppStatusbar.ImportProgress(float(Message[3]) / Message[4])
+      elif Message[0] == 'File':
+	self.ImportTimings.append(Message[1:])
+      else:
+	self.ImportFinished(Message)
+	return False  # Import over, no more periodic calls
+
+    return True
+
+
+  def OnImportCancel(self, widget):
+    """ Called when the cancel button of the status bar is pressed """
+    if self.ImportWorker is not None:
+      self.ImportWorker.Cancel()
+
+
+  def LoadRecords(self, records, source):
+    """ Add records to the registry. Duplicates are not added. The liststore is
+	filled once the import is over """
+    self.CommandRegistry.AddRecords(records, source)
+
+
+  def FillCommandsListstore(self):
+    """ Fill the liststore from the registry in a single pass """
+
+    # The model is detached from the treeview so it's not updated on each row
+    self.CmdSetTreeview.set_model(None)
+    self.CommandsListstore.clear()
+    for Record in self.CommandRegistry:
+      self.CommandsListstore.append((Record.Name, Record.Args, Record.Help, \
+				     self.CLIManager.StripEscapeChars(Record.Help)))
+    self.CmdSetTreeview.set_model(self.CommandsListstore)
+
+
+  def ImportFinished(self, message):
+    """ Called when the import worker is done, cancelled or failed """
+    self.ImportWorker = None
+    self.FillCommandsListstore()  # With the commands loaded so far
+
+    self.SetVisibleColumn(self.CLIManager.GetHideEscapeParam())
+    self.CLIManager.SetCommandsSetLoaded(len(self.CommandRegistry) != 0)
+
+    if message[0] == 'Done':
+      if self.ImportType == 'List':
+	self.AppStatusbar.FileImported(self.ImportPaths[0])
+      else:
+	self.AppStatusbar.FilesImported(self.ImportPaths, self.ImportTimings, message[1:])
+	for Path in self.ImportPaths:
+	  if Path not in self.WatchedPaths:
+	    self.WatchedPaths.append(Path)
+	if self.WatchSourcesAction.get_active():
+	  self.StartWatcher()
+    elif message[0] == 'Cancelled':
+      self.AppStatusbar.ImportCancelled(len(self.CommandRegistry))
+    else:
+      self.AppStatusbar.ImportFailed(message[1])
+
+    self.ReportConflicts(self.CommandRegistry.Conflicts[self.ImportNbConflicts:])
+
 
-      #parse the file and load the generated list
-      Parser = CmdParser()
-      Parser.CmdParse(Filename, FileType, self.CommandsListstore)
+  def OnOptionWatchSourcesToggled(self, widget):
+    """ Called when the watch mode option state is changed """
+    if widget.get_active():
+      self.StartWatcher()
+    else:
+      self.StopWatcher()
+
+
+  def StartWatcher(self):
+    """ Watch the sources imported so far """
+    self.StopWatcher()
+    if len(self.WatchedPaths) == 0:
+      return
+
+    self.SourceWatcher = SourceWatcher(self.WatchedPaths)
+    if self.SourceWatcher.IsPolling():
+      self.WatchSourceId = GObject.timeout_add(WATCH_POLL_PERIOD, self.OnSourcesPolled)
+    else:
+      self.WatchSourceId = GObject.io_add_watch(self.SourceWatcher.fileno(), GObject.IO_IN, \
+						self.OnSourcesNotified)
+
+
+  def StopWatcher(self):
+    if self.SourceWatcher is None:
+      return
+    GObject.source_remove(self.WatchSourceId)
+    if self.WatchTimeoutId is not None:
+      GObject.source_remove(self.WatchTimeoutId)
+    self.SourceWatcher.Close()
+    self.SourceWatcher = None
+    self.WatchSourceId = None
+    self.WatchTimeoutId = None
+    self.ChangedSources = set()
+
+
+  def OnSourcesNotified(self, source, condition):
+    """ Called when inotify reports events on the watched sources """
+    return self.OnSourcesPolled()
+
+
+  def OnSourcesPolled(self):
+    """ Collect the changed sources. They are parsed once no change happened for
+	a while, an editor saving a file generates several events """
+    Changed = self.SourceWatcher.GetChanges()
+    if Changed:
+      self.ChangedSources.update(Changed)
+      if self.WatchTimeoutId is not None:
+	GObject.source_remove(self.WatchTimeoutId)
+      self.WatchTimeoutId = GObject.timeout_add(WATCH_DELAY, self.OnWatchTimeout)
+    return True
+
+
+  def OnWatchTimeout(self):
+    """ Parse the changed sources again and apply the differences """
+    if self.ImportWorker is not None:
+      return True # Applied once the import is over
+
+    self.WatchTimeoutId = None
+    Filenames = sorted(self.ChangedSources)
+    self.ChangedSources = set()
+
+    Parser = CmdParser(cache=self.ParseCache)
+    Added, Removed, Modified = [], [], []
+    for Filename in Filenames:
+      try:
+	Records = Parser.ParseFile(Filename, 'Source')
+      except (IOError, OSError):
+	Records = []  # Removed, its commands too
+      FileAdded, FileRemoved, FileModified = self.CommandRegistry.ReplaceSource(Filename, Records)
+      Added.extend(FileAdded)
+      Removed.extend(FileRemoved)
+      Modified.extend(FileModified)
+
+    self.UpdateCommandsListstore(Added, Removed, Modified)
+    self.CLIManager.SetCommandsSetLoaded(len(self.CommandRegistry) != 0)
+    self.AppStatusbar.SourcesUpdated(Filenames, len(Added), len(Removed), len(Modified))
+    return False
+
+
+  def UpdateCommandsListstore(self, added, removed, modified):
+    """ Apply the changes of the registry to the liststore in place: the rows
+	left are not touched so the selection and the scroll position are kept """
+    if removed or modified:
+      RemovedNames = set([Record.Name for Record in removed])
+      ModifiedRecords = dict([(Record.Name, Record) for Record in modified])
+
+      Iter = self.CommandsListstore.get_iter_first()
+      while Iter is not None:
+	Name = self.CommandsListstore[Iter][0]
+	if Name in RemovedNames:
+	  # The iter points to the next row once removed
+	  if not self.CommandsListstore.remove(Iter):
+	    Iter = None
+	  continue
+
+	Record = ModifiedRecords.get(Name)
+	if Record is not None:
+	  self.CommandsListstore.set(Iter, [1, 2, 3], [Record.Args, Record.Help, \
+				     self.CLIManager.StripEscapeChars(Record.Help)])
+	Iter = self.CommandsListstore.iter_next(Iter)
+
+    for Record in added:
+      self.CommandsListstore.append((Record.Name, Record.Args, Record.Help, \
+				     self.CLIManager.StripEscapeChars(Record.Help)))
+
+
+  def ReportConflicts(self, conflicts):
+    """ Warn the user when commands with the same name have different definitions """
+    if len(conflicts) == 0:
+      return
+
+    Text = ""
+    for Kept, Rejected in conflicts[:MAX_REPORTED_CONFLICTS]:
+      Text += "%s: %d argument(s) kept, %d argument(s) ignored\n" % (Kept.Name, Kept.Args, Rejected.Args)
+      if Kept.Help != Rejected.Help:
+	Text += "    help strings differ\n"
+    if len(conflicts) > MAX_REPORTED_CONFLICTS:
+      Text += "... and " + str(len(conflicts) - MAX_REPORTED_CONFLICTS) + " more"
+
+    Dialog = Gtk.MessageDialog(self, 0, Gtk.MessageType.WARNING,
+	     Gtk.ButtonsType.OK, str(len(conflicts)) + " conflicting command definition(s)")
+    Dialog.format_secondary_text("The first definition of each command is kept:\n" + Text)
+    Dialog.run()
+    Dialog.destroy()
+
+
+  def ChooseSessionLog(self, title, speeds=False):
+    """ Ask for a session log, and for the speed of the replay when needed.
+	Returns the filename (None if cancelled) and the speed """
+    Dialog = Gtk.FileChooserDialog(title, self,
+	     Gtk.FileChooserAction.OPEN,
+	    (Gtk.STOCK_CANCEL, Gtk.ResponseType.CANCEL,
+	     Gtk.STOCK_OPEN, Gtk.ResponseType.OK))
+
+    FilterLog = Gtk.FileFilter()
+    FilterLog.set_name("Session logs (" + LOG_EXTENSION + ")")
+    FilterLog.add_pattern("*" + LOG_EXTENSION)
+    for Extension, Open in COMPRESSIONS.values():
+      FilterLog.add_pattern("*" + LOG_EXTENSION + Extension)
+    Dialog.add_filter(FilterLog)
+    if os.path.isdir(self.CLIManager.ConManager.SessionLogDirectory):
+      Dialog.set_current_folder(self.CLIManager.ConManager.SessionLogDirectory)
+
+    if speeds:
+      SpeedCombo = Gtk.ComboBoxText()
+      for Name, Speed in REPLAY_SPEEDS:
+	SpeedCombo.append_text(Name)
+      SpeedCombo.set_active(0)
+      Dialog.set_extra_widget(SpeedCombo)
+
+    Filename = None
+    Speed = None
+    if Dialog.run() == Gtk.ResponseType.OK:
+      Filename = Dialog.get_filename()
+      if speeds:
+	Speed = REPLAY_SPEEDS[SpeedCombo.get_active()][1]
+    Dialog.destroy()
+    return Filename, Speed
+
+
+  def OnMenuOpenSessionLog(self, widget):
+    """ Called when the user request to read a session log """
+    Filename, Speed = self.ChooseSessionLog("Open session log")
+    if Filename is not None:
+      try:
+	SessionLogViewer(self, Filename, self.CLIFont).show_all()
+      except (IOError, OSError), Error:
+	self.AppStatusbar.SessionLogError(str(Error))
+
+
+  def OnMenuReplaySessionLog(self, widget):
+    """ Called when the user request to replay a session log in the CLI """
+    Filename, Speed = self.ChooseSessionLog("Replay session log", True)
+    if Filename is None:
+      return
+    if self.Replay is not None:
+      self.Replay.Stop()
+      self.OnReplayDone()
+
+    try:
+      Reader = SessionLogReader(Filename)
+    except (IOError, OSError), Error:
+      self.AppStatusbar.SessionLogError(str(Error))
+      return
+    self.LastResponse = None  # The status bar tells about the replay
+    self.Replay = SessionReplay(Reader, GObjectLoop(), self.OnReplayEvent, Speed, self.OnReplayDone)
+    self.AppStatusbar.ReplayStarted(Filename)
+    self.Replay.Begin()
+
+
+  def OnReplayEvent(self, kind, text):
+    """ A recorded command or response is displayed as it was """
+    self.QueueOutput(text.decode("utf-8", "replace").encode("utf-8"))
 
-      self.CLIManager.SetHideEscapeCharColumn(self.CommandsListstore)
-      self.SetVisibleColumn(self.CLIManager.GetHideEscapeParam())
 
-      self.CLIManager.SetCommandsSetLoaded(True)
-      self.AppStatusbar.FileImported(Filename)
+  def OnReplayDone(self):
+    self.Replay.Reader.Close()
+    self.Replay = None
+    self.AppStatusbar.ReplayDone()
 
 
   def OnMenuSaveAs(self,widget):
@@ -807,6 +1206,16 @@ class MainWindow(Gtk.Window):
 	      (Gtk.STOCK_CANCEL, Gtk.ResponseType.CANCEL,
 	       Gtk.STOCK_SAVE, Gtk.ResponseType.OK))
 
+      FilterText = Gtk.FileFilter()
+      FilterText.set_name("Text (.set)")
+      FilterText.add_pattern("*" + TEXT_SET_EXTENSION)
+      Dialog.add_filter(FilterText)
+
+      FilterBinary = Gtk.FileFilter()
+      FilterBinary.set_name("Binary (.bset)")
+      FilterBinary.add_pattern("*" + BINARY_SET_EXTENSION)
+      Dialog.add_filter(FilterBinary)
+
       FilterAll = Gtk.FileFilter()
       FilterAll.set_name("All")
       FilterAll.add_pattern("*")
@@ -815,9 +1224,13 @@ class MainWindow(Gtk.Window):
       Response = Dialog.run()
       if Response == Gtk.ResponseType.OK:
 	Filename = Dialog.get_filename()
-	if not Filename.endswith ('.set'):
-	  Filename += '.set'
-	self.CLIManager.GenerateCommandsSetFile(Filename, self.CommandsListstore )
+	# The format is given by the extension, the binary filter selects the binary one
+	if not Filename.endswith(TEXT_SET_EXTENSION) and not Filename.endswith(BINARY_SET_EXTENSION):
+	  if Dialog.get_filter() == FilterBinary:
+	    Filename += BINARY_SET_EXTENSION
+	  else:
+	    Filename += TEXT_SET_EXTENSION
+	self.CLIManager.GenerateCommandsSetFile(Filename, self.CommandRegistry)
 	self.AppStatusbar.FileSaved(Filename)
 
       Dialog.destroy()
@@ -1008,6 +1421,16 @@ class Statusbar(Gtk.Statusbar):
     self.ContextId = self.get_context_id("Application status")
     self.push(self.ContextId, "Ready...")
 
+    # Progress of the imports, only shown while importing
+    self.ImportProgressBar = Gtk.ProgressBar()
+    self.ImportProgressBar.set_show_text(True)
+    self.ImportProgressBar.set_no_show_all(True)
+    self.ImportCancelButton = Gtk.Button.new_from_stock(Gtk.STOCK_CANCEL)
+    self.ImportCancelButton.connect("clicked", parent.OnImportCancel)
+    self.ImportCancelButton.set_no_show_all(True)
+    self.pack_end(self.ImportCancelButton, False, False, 0)
+    self.pack_end(self.ImportProgressBar, False, False, 0)
+
 
   def Pop(self):
     """ Pop the message in the status bar """
@@ -1030,11 +1453,107 @@ class Statusbar(Gtk.Statusbar):
 
   def FileImported(self, filename):
     """ Set the message in the status bar once the file is imported """
+    self.ImportOver()
     self.Pop()
     Msg = "List imported from: " + os.path.basename(filename)
     self.push(self.ContextId, Msg)
 
 
+  def SourcesUpdated(self, filenames, added, removed, modified):
+    """ Set the message in the status bar when watched sources changed """
+    self.Pop()
+    Msg = str(len(filenames)) + " source(s) changed: " + str(added) + " added, " + \
+	  str(removed) + " removed, " + str(modified) + " modified"
+    self.push(self.ContextId, Msg)
+    self.set_tooltip_text("\n".join(filenames))
+
+
+  def ImportStarted(self):
+    """ Show the progress bar and the cancel button when an import starts """
+    self.Pop()
+    self.push(self.ContextId, "Importing...")
+    self.ImportProgressBar.set_fraction(0.0)
+    self.ImportProgressBar.show()
+    self.ImportCancelButton.show()
+
+
+  def ImportProgress(self, fraction):
+    """ Update the progress bar of the import """
+    self.ImportProgressBar.set_fraction(fraction)
+
+
+  def ImportOver(self):
+    """ Hide the progress bar and the cancel button """
+    self.ImportProgressBar.hide()
+    self.ImportCancelButton.hide()
+
+
+  def ImportCancelled(self, nbcommands):
+    """ Set the message in the status bar when an import is cancelled """
+    self.ImportOver()
+    self.Pop()
+    Msg = "Import cancelled (" + str(nbcommands) + " commands loaded)"
+    self.push(self.ContextId, Msg)
+
+
+  def ImportFailed(self, error):
+    """ Set the message in the status bar when an import failed """
+    self.ImportOver()
+    self.Pop()
+    Msg = "Import failed: " + error
+    self.push(self.ContextId, Msg)
+
+
+  def FilesImported(self, filenames, timings, cachestats):
+    """ Set the message in the status bar once several files are imported.
+	The parsing time of each file is given in the tooltip """
+    self.ImportOver()
+    self.Pop()
+    if len(filenames) == 1:
+      Msg = "List imported from: " + os.path.basename(filenames[0])
+    else:
+      Msg = "List imported from " + str(len(filenames)) + " locations"
+    Msg += " (" + str(len(timings)) + " files, " + \
+	   "%.2f s of parsing" % sum([Elapsed for Filename, NbCommands, Elapsed in timings]) + \
+	   ", cache: %d hits, %d misses" % cachestats + ")"
+    self.push(self.ContextId, Msg)
+
+    # Slowest files first
+    Tooltip = ""
+    for Filename, NbCommands, Elapsed in sorted(timings, key=lambda Timing: -Timing[2]):
+      if Tooltip != "":
+	Tooltip += "\n"
+      Tooltip += "%s: %d commands in %.3f s" % (Filename, NbCommands, Elapsed)
+    self.set_tooltip_text(Tooltip)
+
+
+  def ResponseReceived(self, response, backlog=0, catchingup=False):
+    """ Set the message in the status bar when a response is received """
+    self.Pop()
+    if response.Size == 0:
+      Msg = "No response after %.1f ms" % (response.Duration * 1000)
+    else:
+      Msg = "Response: %d bytes in %d chunks, %.1f ms" % (response.Size, len(response.Chunks), \
+							    response.Duration * 1000)
+    if response.Attempts > 1:
+      Msg += " (%d attempts)" % response.Attempts
+    Queue = self.parent.CLIManager.ConManager.Queue
+    if Queue.Retries:
+      Msg += " - UDP: " + str(Queue.Stats)
+    LogStats = self.parent.CLIManager.ConManager.LogStats
+    if LogStats is not None and (LogStats.Dropped or LogStats.Error):
+      Msg += " - Session log: " + str(LogStats)
+    if catchingup:
+      Msg += " - Catching up, %d KB behind" % (backlog // 1024)
+    self.push(self.ContextId, Msg)
+
+
+  def Connecting(self):
+    """ Set the message in the status bar while the connection is being established """
+    self.Pop()
+    self.push(self.ContextId, "Connecting...")
+
+
   def Connect(self, error):
     """ Set the message in the status bar when the app is connected """
     self.Pop()
@@ -1051,6 +1570,24 @@ class Statusbar(Gtk.Statusbar):
     self.push(self.ContextId, Msg)
 
 
+  def SessionLogError(self, error):
+    """ Set the message in the status bar when a session log can't be read """
+    self.Pop()
+    self.push(self.ContextId, "Session log error: " + error)
+
+
+  def ReplayStarted(self, filename):
+    """ Set the message in the status bar when a session log is replayed """
+    self.Pop()
+    self.push(self.ContextId, "Replaying " + os.path.basename(filename) + "...")
+
+
+  def ReplayDone(self):
+    """ Set the message in the status bar at the end of a replay """
+    self.Pop()
+    self.push(self.ContextId, "Replay over")
+
+
   def Disconnect(self):
     """ Set the message in the status bar when the app is disconnected """
     self.Pop()
@@ -0,0 +1,382 @@
+##############################################################################
+#
+# Command line interface manager (CLIManager) for FreeRTOS+CLI
+# File: headless.py
+# This file contains the headless mode: the commands are sent to the device
+# from the command line, a REPL or the standard input, without Gtk.
+#
+# This software is released under the MIT licence
+#
+# Copyright (c) 2015 Jean-Baptiste Quelard
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+###############################################################################
+#!/usr/bin/python
+
+import os
+import sys
+import argparse
+
+from CLIManager import ConnectionManagement, CONFIG_FILENAME
+from registry import CommandRegistry
+from setfile import IsBinarySet, BinarySet
+from transport import SelectLoop
+from devices import GroupSession, ParseDevice, ReadDeviceGroups, OUTPUT_FORMATS
+from framer import RESPONSE_TIMEOUT
+from sessionlog import COMPRESSIONS, LOG_CLOSE_TIMEOUT
+
+
+CONNECT_TIMEOUT = 5.0	# Time (s) waiting for the connection
+PROMPT = "> "
+
+
+def ReadCommands(stream):
+  """ Commands read from a stream, one per line. Empty lines and lines starting
+      with '#' are ignored """
+  for Line in stream:
+    if Line.strip() != "" and not Line.lstrip().startswith("#"):
+      yield Line.strip()
+
+
+def LoadCommandSet(filename, lookup=False):
+  """ Load a .set or .bset file. The parser is only imported here. When the
+      commands are only looked up (lookup), a .bset is searched in its index
+      instead of being loaded """
+  if lookup and IsBinarySet(filename):
+    return BinarySet(filename)
+  from parser import CmdParser
+
+  Registry = CommandRegistry()
+  CmdParser().CmdParse(filename, 'List', Registry)
+  return Registry
+
+
+class HeadlessCLI:
+  """ Send commands to the device and write the responses to a stream. The
+      connection is driven by a SelectLoop run while a response is awaited """
+
+  def __init__(self, connection, registry=None, output=sys.stdout, timing=False):
+    self.Connection = connection
+    self.Registry = registry	# Commands checked and completed when given
+    self.Output = output
+    self.Timing = timing	# Timing of each response written to stderr
+    self.Loop = SelectLoop()
+    self.Error = None
+    self.Pending = 0	# Commands sent and not answered yet
+
+
+  def Connect(self, timeout=CONNECT_TIMEOUT):
+    """ Open the connection. Returns an error message or None """
+    self.Error = self.Connection.Connect(self.OnData, self.OnState, self.Loop)
+    if self.Error is None:
+      self.Wait(timeout)
+      if not self.Connection.IsConnectionActive() and self.Error is None:
+	self.Error = "Connection timeout"
+    if self.Error is not None:
+      self.Connection.Disconnect(LOG_CLOSE_TIMEOUT)  # The session log is written before quitting
+    return self.Error
+
+
+  def Wait(self, timeout):
+    """ Run the loop until it is stopped by an event or the timeout """
+    Timer = self.Loop.CallLater(timeout, self.Loop.Stop)
+    self.Loop.Run()
+    Timer.Cancel()
+
+
+  def OnState(self, error):
+    """ Connection established, failed or lost """
+    self.Error = error
+    self.Loop.Stop()
+
+
+  def OnData(self, response):
+    """ Complete response, or data received while no command was sent """
+    self.Output.write(response.GetData())
+    if response.Command is not None:
+      self.Output.write("\n")
+      if self.Timing:
+	sys.stderr.write(FormatResponseTiming(response) + "\n")
+      self.Pending -= 1
+      self.Loop.Stop()
+    self.Output.flush()
+
+
+  def Execute(self, command):
+    """ Send a command and write its response. Returns False if the connection was closed """
+    return self.RunCommands([command])
+
+
+  def RunCommands(self, commands):
+    """ Send the commands in turn. The connection queue keeps up to its pipeline
+	depth in flight, the responses are written in the order of the commands.
+	Returns False if the connection was closed """
+    Depth = self.Connection.Queue.Depth
+    for Command in commands:
+      Command = Command.strip()
+      if Command == "":
+	continue
+      CheckCommand(Command, self.Registry)
+      self.Pending += 1
+      self.Connection.Send(Command)
+      # Each response (or its timeout) stops the loop
+      while self.Pending >= Depth and self.Connection.IsConnectionActive():
+	self.Loop.Run()
+      if not self.Connection.IsConnectionActive():
+	return False
+
+    while self.Pending and self.Connection.IsConnectionActive():
+      self.Loop.Run()
+    return self.Connection.IsConnectionActive()
+
+
+  def RunStream(self, stream):
+    """ Send the commands read from a stream """
+    return self.RunCommands(ReadCommands(stream))
+
+
+  def RunRepl(self):
+    """ Interactive mode, ended by EOF (Ctrl-D). Tab completes the command names """
+    try:
+      import readline
+    except ImportError:
+      readline = None # Line edition not available
+
+    if readline is not None and self.Registry is not None:
+      readline.set_completer(self.Complete)
+      readline.parse_and_bind("tab: complete")
+
+    while True:
+      try:
+	Line = raw_input(PROMPT)
+      except EOFError:
+	self.Output.write("\n")
+	return True
+      except KeyboardInterrupt:
+	self.Output.write("\n")
+	continue
+      if not self.Execute(Line):
+	return False
+
+
+  def Complete(self, text, state):
+    """ readline completer: the command names starting with the text """
+    if state == 0:
+      self.Completions = self.Registry.Trie.Complete(text)
+    if state < len(self.Completions):
+      return self.Completions[state] + " "
+    return None
+
+
+def FormatResponseTiming(response):
+  """ Command, first byte and total time of a response """
+  Text = "#%d %s: " % (response.Number, response.Command)
+  if response.FirstByte is None:
+    Text += "no response, "
+  else:
+    Text += "first byte %.1f ms, " % (response.FirstByte * 1000)
+  Text += "total %.1f ms (%s)" % (response.Duration * 1000, response.End)
+  if response.Queued >= 0.00005:
+    Text += ", queued %.1f ms" % (response.Queued * 1000)
+  if response.Attempts > 1:
+    Text += ", %d attempts" % response.Attempts
+  return Text
+
+
+def CheckCommand(command, registry):
+  """ Warn when the command is not in the set of commands loaded """
+  if registry is not None and command.split()[0] not in registry:
+    sys.stderr.write("Warning: " + command.split()[0] + " is not in the set of commands\n")
+
+
+def RunGroup(devices, commands, registry, args, connection):
+  """ Send each command to all the devices at once and write their responses
+      in the requested format. The session logs are those of the connection.
+      Returns the exit status """
+  Compression = None if connection.LogCompression == "none" else connection.LogCompression
+  if Compression is not None and Compression not in COMPRESSIONS:
+    sys.stderr.write("Session log error: " + Compression + " compression not available\n")
+    return 1
+  Group = GroupSession(devices, args.timeout, args.idle, args.terminator, args.rcvbuf, None, \
+		       connection.SessionLogDirectory, connection.LogRotateSize, \
+		       connection.LogRotateTime, Compression)
+  Status = 0
+  for Device, Error in Group.Connect():
+    sys.stderr.write(Device.Name + ": " + Error + "\n")
+    Status = 1
+
+  if args.output is not None:
+    Output = open(args.output, "w")
+  else:
+    Output = sys.stdout
+
+  try:
+    for Command in commands:
+      CheckCommand(Command, registry)
+      Results, Total = Group.Send(Command)
+      Output.write(OUTPUT_FORMATS[args.format](Results))
+      Output.flush()
+
+      Answered = [Result for Result in Results if Result.Error is None]
+      Msg = "%s: %d/%d devices answered in %.1f ms" % (Command, len(Answered), len(Results), Total * 1000)
+      if Answered:
+	Msg += " (slowest %.1f ms)" % (max([Result.Elapsed for Result in Answered]) * 1000)
+      sys.stderr.write(Msg + "\n")
+      if len(Answered) != len(Results):
+	Status = 1
+  finally:
+    Group.Close(LOG_CLOSE_TIMEOUT)
+    if Output is not sys.stdout:
+      Output.close()
+
+  return Status
+
+
+def Main(argv):
+  """ Entry point of the headless mode. Returns the exit status """
+  ArgParser = argparse.ArgumentParser(prog="CLIManager.py", description= \
+    "Send commands to a FreeRTOS+CLI device without the GUI. The commands given with "
+    "-c are sent, else they are read from the standard input when it is not a "
+    "terminal, else an interactive prompt is started.")
+  ArgParser.add_argument("-c", "--command", action="append", default=[], \
+			 help="command to send, can be repeated")
+  ArgParser.add_argument("-s", "--set", help="set of commands (.set or .bset) used to check and complete the commands")
+  ArgParser.add_argument("-t", "--type", choices=["UDP", "TCP"], help="connection type (default: from the configuration file)")
+  ArgParser.add_argument("-a", "--address", help="IP address of the device")
+  ArgParser.add_argument("-p", "--port", help="port of the device")
+  ArgParser.add_argument("--timeout", type=float, default=RESPONSE_TIMEOUT, \
+			 help="time (s) waiting for a response (default: %(default)s)")
+  ArgParser.add_argument("--idle", type=float, default=None, \
+			 help="time (s) without data ending a response (default: from the configuration file)")
+  ArgParser.add_argument("--terminator", default=None, \
+			 help="end of the responses, with escapes such as \\r\\n (default: from the configuration file)")
+  ArgParser.add_argument("--rcvbuf", type=int, default=None, \
+			 help="size (bytes) of the socket receive buffer (default: from the configuration file)")
+  ArgParser.add_argument("--pipeline", type=int, default=None, \
+			 help="commands sent without waiting for their response, needs a terminator (default: from the configuration file)")
+  ArgParser.add_argument("--command-end", default=None, \
+			 help="end appended to the commands, with escapes such as \\n (default: from the configuration file)")
+  ArgParser.add_argument("--retries", type=int, default=None, \
+			 help="retransmissions of a UDP command left without response (default: from the configuration file)")
+  ArgParser.add_argument("--log", default=None, \
+			 help="directory of the session logs, empty to log nothing (default: from the configuration file)")
+  ArgParser.add_argument("--log-rotate-size", type=int, default=None, \
+			 help="size (MB) of a session log segment, 0 for no limit (default: from the configuration file)")
+  ArgParser.add_argument("--log-rotate-time", type=float, default=None, \
+			 help="duration (minutes) of a session log segment, 0 for no limit (default: from the configuration file)")
+  ArgParser.add_argument("--log-compression", choices=["gzip", "lzma", "none"], default=None, \
+			 help="compression of the previous segments (default: from the configuration file)")
+  ArgParser.add_argument("--timing", action="store_true", help="write the timing of each response to the standard error")
+  ArgParser.add_argument("-i", "--interactive", action="store_true", help="force the interactive prompt")
+  ArgParser.add_argument("-g", "--group", help="send the commands to all the devices of a group of the configuration file")
+  ArgParser.add_argument("-d", "--device", action="append", default=[], \
+			 help="send the commands to this device (TYPE:ADDRESS:PORT), can be repeated")
+  ArgParser.add_argument("-f", "--format", choices=sorted(OUTPUT_FORMATS), default="side", \
+			 help="output of the responses of several devices (default: %(default)s)")
+  ArgParser.add_argument("-o", "--output", help="file receiving the responses of several devices")
+  Args = ArgParser.parse_args(argv)
+
+  Registry = None
+  if Args.set is not None:
+    # Only the prompt completes the commands, the others are just checked
+    Prompt = not Args.command and (Args.interactive or sys.stdin.isatty()) and \
+	     not Args.device and Args.group is None
+    Registry = LoadCommandSet(Args.set, not Prompt)
+
+  # The configuration file gives the connection and the end of the responses,
+  # the options override it
+  Connection = ConnectionManagement()
+  if Args.idle is None:
+    Args.idle = Connection.IdleGap
+  if Args.terminator is None:
+    Args.terminator = Connection.Terminator
+  else:
+    Args.terminator = Args.terminator.decode("string_escape")
+  if Args.log is not None:
+    Connection.SessionLogDirectory = Args.log
+  if Args.log_rotate_size is not None:
+    Connection.LogRotateSize = Args.log_rotate_size * 1000000
+  if Args.log_rotate_time is not None:
+    Connection.LogRotateTime = Args.log_rotate_time * 60
+  if Args.log_compression is not None:
+    Connection.LogCompression = Args.log_compression
+
+  # Several devices at once
+  try:
+    Devices = [ParseDevice(Device) for Device in Args.device]
+  except ValueError, Error:
+    ArgParser.error(str(Error))
+  if Args.group is not None:
+    Groups = ReadDeviceGroups(CONFIG_FILENAME) if os.path.exists(CONFIG_FILENAME) else {}
+    if Args.group not in Groups:
+      ArgParser.error("unknown group: " + Args.group)
+    Devices.extend(Groups[Args.group])
+  if Devices:
+    return RunGroup(Devices, Args.command or ReadCommands(sys.stdin), Registry, Args, Connection)
+
+  Connection.ResponseTimeout = Args.timeout
+  Connection.IdleGap = Args.idle
+  Connection.Terminator = Args.terminator
+  if Args.rcvbuf is not None:
+    Connection.ReceiveBufferSize = Args.rcvbuf
+  if Args.pipeline is not None:
+    Connection.PipelineDepth = Args.pipeline
+  if Args.retries is not None:
+    Connection.Retries = Args.retries
+  if Args.command_end is not None:
+    Connection.CommandEnd = Args.command_end.decode("string_escape")
+  if Args.type is not None:
+    Connection.ConnectionType = Args.type
+  if Connection.ConnectionType == "UDP":
+    Connection.UDPAddress = Args.address or Connection.UDPAddress
+    Connection.UDPPort = Args.port or Connection.UDPPort
+  else:
+    Connection.TCPAddress = Args.address or Connection.TCPAddress
+    Connection.TCPPort = Args.port or Connection.TCPPort
+
+  if Connection.PipelineDepth > 1 and not Connection.Terminator:
+    sys.stderr.write("Warning: no terminator, the commands are not pipelined\n")
+  CLI = HeadlessCLI(Connection, Registry, sys.stdout, Args.timing)
+  Error = CLI.Connect()
+  if Error is not None:
+    sys.stderr.write(Error + "\n")
+    return 1
+
+  try:
+    if Args.command:
+      Open = CLI.RunCommands(Args.command)
+    elif Args.interactive or sys.stdin.isatty():
+      Open = CLI.RunRepl()
+    else:
+      Open = CLI.RunStream(sys.stdin)
+  finally:
+    if Connection.Queue.Retries:
+      sys.stderr.write("UDP: " + str(Connection.Queue.Stats) + "\n")
+    Connection.Disconnect(LOG_CLOSE_TIMEOUT)
+    if Connection.LogStats is not None and Connection.LogStats.Dropped:
+      sys.stderr.write("Session log: " + str(Connection.LogStats) + "\n")
+
+  if not Open:
+    sys.stderr.write((CLI.Error or "Connection closed by the device") + "\n")
+    return 1
+  return 0
+
+
+if __name__ == "__main__":
+  sys.exit(Main(sys.argv[1:]))
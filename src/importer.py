@@ -0,0 +1,136 @@
+##############################################################################
+#
+# Command line interface manager (CLIManager) for FreeRTOS+CLI
+# File: importer.py
+# This file contains the worker importing the commands in the background. The
+# records are sent back by batches through a queue so the GUI main loop stays
+# responsive during the import. It is independent from Gtk.
+#
+# This software is released under the MIT licence
+#
+# Copyright (c) 2015 Jean-Baptiste Quelard
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+###############################################################################
+#!/usr/bin/python
+
+import os
+import time
+import Queue
+import threading
+
+from parser import CmdParser, DEFAULT_ENGINE
+
+
+BATCH_SIZE = 500	# Maximum number of records sent at once to the main loop
+MAX_PENDING_BATCHES = 16	# The worker waits when the main loop is late
+
+
+class ImportWorker(threading.Thread):
+  """ Parse files in a background thread. The messages put in the queue are:
+	('Records', filename, records, bytes parsed, total bytes)
+	('File', filename, nb commands, elapsed time)
+	('Done', cache hits, cache misses)
+	('Cancelled',)
+	('Error', message) """
+
+  def __init__(self, paths, source, engine=DEFAULT_ENGINE, cache=None, processes=None):
+    threading.Thread.__init__(self)
+    self.daemon = True	# Never prevents the application from quitting
+
+    self.Paths = paths
+    self.Source = source
+    self.Parser = CmdParser(engine, cache)
+    self.Processes = processes
+    self.Queue = Queue.Queue(MAX_PENDING_BATCHES)
+    self.CancelEvent = threading.Event()
+
+
+  def Cancel(self):
+    """ Ask the worker to stop as soon as possible """
+    self.CancelEvent.set()
+
+
+  def IsCancelled(self):
+    return self.CancelEvent.is_set()
+
+
+  def Put(self, message):
+    """ Send a message to the main loop. Returns False if the import was cancelled meanwhile """
+    while not self.IsCancelled():
+      try:
+	self.Queue.put(message, True, 0.1)
+	return True
+      except Queue.Full:
+	pass
+    return False
+
+
+  def PutRecords(self, filename, records, done, total):
+    """ Send the records by batches """
+    for Start in range(0, len(records), BATCH_SIZE):
+      if not self.Put(('Records', filename, records[Start:Start + BATCH_SIZE], done, total)):
+	return False
+    return True
+
+
+  def run(self):
+    try:
+      if self.Import():
+	self.Queue.put(('Done',) + self.Parser.GetCacheStats())
+      else:
+	self.Queue.put(('Cancelled',))
+    except Exception, Error:
+      self.Queue.put(('Error', str(Error)))
+
+
+  def Import(self):
+    """ Parse the files. Returns False if cancelled """
+
+    if self.Source == 'Source':
+      Filenames = self.Parser.SelectFiles(self.Paths, self.Source)
+    else:
+      Filenames = self.Paths
+    Sizes = dict([(Filename, os.path.getsize(Filename)) for Filename in Filenames])
+    Total = max(sum(Sizes.values()), 1)
+    Done = 0
+
+    if len(Filenames) == 1:
+      # A single file is parsed here so the progress is known within the file
+      Start = time.time()
+      NbCommands = 0
+      for Records, FileDone, FileSize in self.Parser.IterParseFile(Filenames[0], self.Source):
+	if not self.PutRecords(Filenames[0], Records, FileDone, Total):
+	  return False
+	NbCommands += len(Records)
+      return self.Put(('File', Filenames[0], NbCommands, time.time() - Start))
+
+    # Several files are parsed in parallel, the progress is given file by file
+    Files = self.Parser.IterParseFiles(Filenames, self.Source, self.Processes)
+    try:
+      for Filename, Records, Elapsed in Files:
+	Done += Sizes[Filename]
+	if not self.PutRecords(Filename, Records, Done, Total):
+	  return False
+	if not self.Put(('File', Filename, len(Records), Elapsed)):
+	  return False
+    finally:
+      Files.close()   # Stops the worker processes when cancelled
+
+    return True
@@ -0,0 +1,128 @@
+##############################################################################
+#
+# Command line interface manager (CLIManager) for FreeRTOS+CLI
+# File: logviewer.py
+# This file contains the viewer of the session logs: only the lines visible
+# in the window are read from the transcript and drawn, so a transcript of
+# any size opens and scrolls at once.
+#
+# This software is released under the MIT licence
+#
+# Copyright (c) 2015 Jean-Baptiste Quelard
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+###############################################################################
+#!/usr/bin/python
+
+import os
+
+from gi.repository import Gtk, Gdk, PangoCairo
+from sessionlog import SessionLogReader
+
+
+MAX_LINE_LENGTH = 1000	# Characters of a line drawn, the rest is cut
+MARGIN = 4		# Space (pixels) around the text
+
+
+class SessionLogViewer(Gtk.Window):
+  """ Window showing a transcript. The scrollbar counts lines: the position
+      gives the first line drawn """
+
+  def __init__(self, parent, filename, font):
+    Gtk.Window.__init__(self, title=os.path.basename(filename))
+    self.set_transient_for(parent)
+    self.set_default_size(800, 600)
+
+    self.Reader = SessionLogReader(filename)
+    self.Font = font  # Pango.FontDescription of the CLI
+    self.LineHeight = 1
+
+    self.Area = Gtk.DrawingArea()
+    self.Area.set_hexpand(True)
+    self.Area.set_vexpand(True)
+    self.Area.set_can_focus(True)
+    self.Area.add_events(Gdk.EventMask.SCROLL_MASK | Gdk.EventMask.KEY_PRESS_MASK)
+    self.Area.connect("draw", self.OnDraw)
+    self.Area.connect("scroll-event", self.OnScroll)
+    self.Area.connect("key-press-event", self.OnKeyPress)
+    self.Area.connect("size-allocate", self.OnSizeAllocate)
+
+    self.Adjustment = Gtk.Adjustment(0, 0, self.Reader.GetLineCount(), 1, 1, 1)
+    self.Adjustment.connect("value-changed", lambda Adjustment: self.Area.queue_draw())
+    Scrollbar = Gtk.Scrollbar(orientation=Gtk.Orientation.VERTICAL, adjustment=self.Adjustment)
+
+    Grid = Gtk.Grid()
+    Grid.attach(self.Area, 0, 0, 1, 1)
+    Grid.attach(Scrollbar, 1, 0, 1, 1)
+    self.add(Grid)
+    self.connect("destroy", lambda Window: self.Reader.Close())
+
+
+  def GetVisibleLines(self):
+    return max(self.Area.get_allocated_height() // self.LineHeight, 1)
+
+
+  def OnSizeAllocate(self, widget, allocation):
+    """ A page of the scrollbar is the number of lines fitting in the window """
+    Layout = self.Area.create_pango_layout("X")
+    Layout.set_font_description(self.Font)
+    self.LineHeight = max(Layout.get_pixel_size()[1], 1)
+    Page = self.GetVisibleLines()
+    self.Adjustment.configure(self.Adjustment.get_value(), 0, self.Reader.GetLineCount(), \
+			      1, Page, Page)
+
+
+  def OnDraw(self, widget, cr):
+    First = int(self.Adjustment.get_value())
+    Layout = widget.create_pango_layout("")
+    Layout.set_font_description(self.Font)
+    for Row, Line in enumerate(self.Reader.GetLines(First, self.GetVisibleLines() + 1, MAX_LINE_LENGTH)):
+      Layout.set_text(Line.decode("utf-8", "replace").rstrip("\r"), -1)
+      cr.move_to(MARGIN, Row * self.LineHeight)
+      PangoCairo.show_layout(cr, Layout)
+    return False
+
+
+  def ScrollBy(self, lines):
+    Value = self.Adjustment.get_value() + lines
+    self.Adjustment.set_value(min(max(Value, 0), self.Adjustment.get_upper() - self.Adjustment.get_page_size()))
+
+
+  def OnScroll(self, widget, event):
+    if event.direction == Gdk.ScrollDirection.UP:
+      self.ScrollBy(-3)
+    elif event.direction == Gdk.ScrollDirection.DOWN:
+      self.ScrollBy(3)
+    elif event.direction == Gdk.ScrollDirection.SMOOTH:
+      self.ScrollBy(event.delta_y * 3)
+    return True
+
+
+  def OnKeyPress(self, widget, event):
+    Page = self.GetVisibleLines()
+    Moves = {Gdk.KEY_Up: -1, Gdk.KEY_Down: 1, Gdk.KEY_Page_Up: -Page, Gdk.KEY_Page_Down: Page}
+    if event.keyval in Moves:
+      self.ScrollBy(Moves[event.keyval])
+    elif event.keyval == Gdk.KEY_Home:
+      self.Adjustment.set_value(0)
+    elif event.keyval == Gdk.KEY_End:
+      self.ScrollBy(self.Reader.GetLineCount())
+    else:
+      return False
+    return True
@@ -30,82 +30,254 @@
 ###############################################################################
 #!/usr/bin/python
 
-from pyparsing import *
+import os
+import glob
+import time
+import multiprocessing
+from scanner import CmdScanner, ScanHelpString
+from cache import ParseCache
+from registry import DecodeArgList
+from setfile import IsBinarySet, ReadBinarySet
+
+
+SOURCE_EXTENSIONS = ('.c', '.h')	# Files looked for when a directory is imported
+DEFINITION_TOKEN = 'CLI_Command_Definition_t'	# Token searched by the prefilter
+PREFILTER_CHUNK = 1 << 20		# Size of the chunks read by the prefilter
+PARSER_ENGINES = ('scanner', 'pyparsing')	# 'scanner' falls back on pyparsing when needed
+DEFAULT_ENGINE = 'scanner'
+PARSER_VERSION = 2	# To be incremented when the records produced by the parser change
+
+
+def ExpandSourcePaths(paths):
+  """ Expand a list of files, directories and glob patterns into a sorted list of files """
+  Filenames = set()
+  for Path in paths:
+    if os.path.isdir(Path):
+      for Root, Dirs, Files in os.walk(Path):
+	for Name in Files:
+	  if Name.endswith(SOURCE_EXTENSIONS):
+	    Filenames.add(os.path.join(Root, Name))
+    elif os.path.isfile(Path):
+      Filenames.add(Path)
+    else:
+      # Not an existing path, try it as a glob pattern
+      for Match in glob.glob(Path):
+	if os.path.isdir(Match):
+	  Filenames.update(ExpandSourcePaths([Match]))
+	else:
+	  Filenames.add(Match)
+
+  return sorted(Filenames)
+
+
+def HasCommandDefinitions(filename):
+  """ Cheap byte level check telling if a file may contain command definitions """
+  Overlap = len(DEFINITION_TOKEN) - 1
+  Tail = ""
+  with open(filename, "rb") as cfile:
+    while True:
+      Chunk = cfile.read(PREFILTER_CHUNK)
+      if not Chunk:
+	return False
+      # Keep the end of the previous chunk for tokens split between two reads
+      if DEFINITION_TOKEN in Tail + Chunk[:Overlap] or DEFINITION_TOKEN in Chunk:
+	return True
+      Tail = Chunk[-Overlap:]
+
+
+_WorkerParser = None	# Parser instance of a worker process of the pool
+
+
+def _ParseFileWorker(args):
+  """ Parse a single file in a worker process.
+      Returns the records, the elapsed time and whether the cache was hit """
+  global _WorkerParser
+  filename, source, engine, cache = args
+  if _WorkerParser is None:
+    if cache is not None:
+      cache = ParseCache(*cache)
+    _WorkerParser = CmdParser(engine, cache)
+
+  Hits, Misses = _WorkerParser.GetCacheStats()
+  Start = time.time()
+  Records = _WorkerParser.ParseFile(filename, source)
+  Elapsed = time.time() - Start
+  return filename, Records, Elapsed, _WorkerParser.GetCacheStats()[0] > Hits
+
+
+def _Grammar():
+  """ The pyparsing grammar, imported the first time a declaration, a .set file
+      or a help string is parsed: pyparsing is slow to load """
+  import grammar
+  return grammar
 
 
 class CmdParser:
 
-  def __init__(self):
-
-    #define grammar for parsing source .c file
-    LEFT_BRACE,RIGHT_BRACE,EQ,COMMA = map(Suppress,"{}=,")
-    _def = Suppress('static const CLI_Command_Definition_t')
-    self.sign = oneOf("+ -")
-    self.integer = Word(nums)
-    signed_int = Combine(Optional(self.sign) + self.integer)
-    CmdString = dblQuotedString(alphanums+"_")
-    CmdHelp = dblQuotedString(alphanums+"_")
-    identifier = Word(alphas,alphanums+'_')
-    comment = Word(alphas,alphanums+'_')
-    comment.ignore(cStyleComment)
-
-    Declaration = Group( _def + identifier + EQ + LEFT_BRACE + \
-			      CmdString('NameString').setParseAction(removeQuotes)  + \
-			      COMMA + \
-			      Optional(comment) + \
-			      CmdHelp('Help').setParseAction(removeQuotes)  + \
-			      COMMA + \
-			      identifier + \
-			      COMMA + \
-			      Optional(comment) + \
-			      signed_int('Args').setParseAction( lambda s,l,t: [ int(t[0]) ] ) + \
-			      Optional(comment) + \
-			      RIGHT_BRACE )
-
-    self.CommandDefinition = Declaration('Command')
-    self.CommandDefinition.ignore(cStyleComment)
-
-    #define grammar for parsing the set of commands (.set file)
-    line = Group( CmdString('NameString').setParseAction(removeQuotes) + \
-			  COMMA + \
-			  CmdHelp('Help').setParseAction(removeQuotes) + \
-			  COMMA + \
-			  signed_int('Args').setParseAction( lambda s,l,t: [ int(t[0]) ] ))
-    
-    self.Command = line('Command')
-
-
-  def CmdParse(self, filename, source, liststore):
-
-    #Open and read the file
-    with open(filename,"r") as cfile:
-      FileLines = cfile.readlines()
-    cfile.close()
-
-    FileContent = "".join(FileLines)
-
-    # Set the string to parse
+  def __init__(self, engine=DEFAULT_ENGINE, cache=None):
+
+    if engine not in PARSER_ENGINES:
+      raise ValueError("Unknown parser engine: " + str(engine))
+    self.Engine = engine
+    self.Scanner = CmdScanner()
+    self.Cache = cache	# ParseCache instance, None when the results are not cached
+    # The cache may be shared by several imports, only those of this parser are counted
+    self.CacheStatsStart = cache.GetStats() if cache is not None else (0, 0)
+
+
+  def CmdParse(self, filename, source, registry):
+    """ Parse a file and add its commands to the registry. Returns the conflicts found """
+
+    return registry.AddRecords(self.ParseFile(filename, source), filename)
+
+
+  def ParseFile(self, filename, source):
+    """ Parse a file and return the list of (NameString, Args, Help, ArgList) records found """
+
+    Records = []
+    for Chunk, Done, Size in self.IterParseFile(filename, source):
+      Records.extend(Chunk)
+    return Records
+
+
+  def IterParseFile(self, filename, source):
+    """ Parse a file progressively. Yields the records found in each part of the
+	file with the number of bytes parsed so far and the size of the file.
+	The records are cached only if the whole file has been parsed """
+
+    Size = os.path.getsize(filename)
+
+    if source == 'List' and IsBinarySet(filename):
+      yield ReadBinarySet(filename), Size, Size  # Nothing to parse
+      return
+
+    if self.Cache is not None:
+      Key = self.Cache.Key(filename, PARSER_VERSION, self.Engine, source)
+      Records = self.Cache.Get(Key)
+      if Records is not None:
+	yield Records, Size, Size  # File unchanged since it was last parsed
+	return
+
+    if source == 'Source' and self.Engine == 'scanner':
+      # Streamed from a memory map, the file is never loaded at once
+      Records = []
+      for Chunk, Done, Size in self.Scanner.IterChunks(filename, self.ParseDeclaration):
+	Chunk = [(NameString, Args, Help, self.ParseHelpString(Help, Args)) \
+		 for NameString, Args, Help in Chunk]
+	Records.extend(Chunk)
+	yield Chunk, Done, Size
+    else:
+      #Open and read the file
+      with open(filename,"r") as cfile:
+	FileLines = cfile.readlines()
+      cfile.close()
+
+      FileContent = "".join(FileLines)
+      Records = self.ParseContent(FileContent, source)
+      yield Records, Size, Size
+
+    if self.Cache is not None:
+      self.Cache.Put(Key, Records)
+
+
+  def IterRecords(self, filename):
+    """ Generator of the records of a source file, streamed by the scanner """
+    for NameString, Args, Help in self.Scanner.IterRecords(filename, self.ParseDeclaration):
+      yield NameString, Args, Help, self.ParseHelpString(Help, Args)
+
+
+  def GetCacheStats(self):
+    """ Returns the number of cache hits and misses of this parser """
+    if self.Cache is None:
+      return 0, 0
+    Hits, Misses = self.Cache.GetStats()
+    return Hits - self.CacheStatsStart[0], Misses - self.CacheStatsStart[1]
+
+
+  def ParseContent(self, FileContent, source):
+    """ Parse a string and return the list of (NameString, Args, Help, ArgList) records found.
+	The arguments of a command are extracted from its help string once, at import """
+
+    if source == 'Source':
+      if self.Engine == 'scanner':
+	Records = self.Scanner.Scan(FileContent, self.ParseDeclaration)
+      else:
+	Records = self.ParseDeclaration(FileContent)
+      return [(NameString, Args, Help, self.ParseHelpString(Help, Args)) \
+	      for NameString, Args, Help in Records]
+
+    Records = []
+    for item,start,stop in _Grammar().Command.scanString(FileContent):
+      if 'ArgList' in item.Command:
+	# Arguments saved in the .set file, no need to parse the help string
+	ArgList = DecodeArgList(item.Command.ArgList, item.Command.Args)
+      else:
+	ArgList = self.ParseHelpString(item.Command.Help, item.Command.Args)
+      Records.append((item.Command.NameString, item.Command.Args, item.Command.Help, ArgList))
+
+    return Records
+
+
+  def ParseDeclaration(self, declaration):
+    """ Parse a single declaration with the pyparsing grammar (scanner fallback) """
+    Records = []
+    for item,start,stop in _Grammar().CommandDefinition.scanString(declaration):
+      Records.append((item.Command.NameString, item.Command.Args, item.Command.Help))
+    return Records
+
+
+  def CmdParseFiles(self, paths, source, registry, processes=None):
+    """ Parse several files, directories or glob patterns and merge them in the registry.
+	Files are parsed in parallel. Returns a list of (filename, nb commands, elapsed time) """
+
+    Timings = []
+    for Filename, Records, Elapsed in self.IterParseFiles(self.SelectFiles(paths, source), \
+							  source, processes):
+      registry.AddRecords(Records, Filename)
+      Timings.append((Filename, len(Records), Elapsed))
+
+    return Timings
+
+
+  def SelectFiles(self, paths, source):
+    """ Files to parse for a list of files, directories or glob patterns """
+    Filenames = ExpandSourcePaths(paths)
     if source == 'Source':
-      ScannedString = self.CommandDefinition.scanString(FileContent)
-    elif source == 'List':
-      ScannedString = self.Command.scanString(FileContent)
-
-    for item,start,stop in ScannedString:
-      if len(liststore) != 0:
-	Duplicate = False # (Re)Init duplicate flag
-	for Row in liststore:
-	  if Row[0] == item.Command.NameString:
-	    Duplicate = True
-	if Duplicate is False:	# Added to the list only if not a duplicate
-	  liststore.append((item.Command.NameString, \
-			    item.Command.Args, \
-			    item.Command.Help, \
-			    ""))
-      else: # No command in the list yet
-	liststore.append((item.Command.NameString, \
-			  item.Command.Args, \
-			  item.Command.Help, \
-			  ""))
+      # Only the files containing a definition are worth parsing
+      Filenames = [Filename for Filename in Filenames if HasCommandDefinitions(Filename)]
+    return Filenames
+
+
+  def IterParseFiles(self, filenames, source, processes=None):
+    """ Parse the files in parallel. Yields (filename, records, elapsed time) for each
+	file, in the order of the list whatever the order of completion. The worker
+	processes are stopped if the caller stops iterating """
+
+    if self.Cache is not None:
+      Cache = (self.Cache.Directory, self.Cache.MaxSize)
+    else:
+      Cache = None
+    Jobs = [(Filename, source, self.Engine, Cache) for Filename in filenames]
+
+    if len(Jobs) > 1 and processes != 1:
+      Pool = multiprocessing.Pool(processes)
+      try:
+	for Filename, Records, Elapsed, Hit in Pool.imap(_ParseFileWorker, Jobs):
+	  # Account the cache accesses of the workers in this parser statistics
+	  if Hit:
+	    self.Cache.Hits += 1
+	  elif self.Cache is not None:
+	    self.Cache.Misses += 1
+	  yield Filename, Records, Elapsed
+	Pool.close()
+      finally:
+	Pool.terminate()
+	Pool.join()
+    else:
+      for Job in Jobs:
+	Start = time.time()
+	Records = self.ParseFile(Job[0], source)
+	yield Job[0], Records, time.time() - Start
 
 
   def ParseHelpString(self, string, nbargs):
@@ -114,18 +286,11 @@ class CmdParser:
     if nbargs == 0:
       return None #No assistance can be provided to populate arguments
 
-    # Define Grammar
-    Wrd = Word(alphas,alphanums+'_')
-    StringArg = QuotedString("<",endQuoteChar=">")
-    BoolArg = QuotedString("[",endQuoteChar="]")
-
-    _HelpString = Group(  ZeroOrMore(Wrd) + Optional(StringArg('StringParam')) + \
-					    Optional(BoolArg('BoolParam')))
-
-    HelpString = _HelpString('Str')
+    if self.Engine == 'scanner':
+      return ScanHelpString(string)
 
     Arglist = []
-    for item,start,stop in HelpString.scanString(string):
+    for item,start,stop in _Grammar().HelpString.scanString(string):
       if item.Str.StringParam != "":
 	Arglist.append(item.Str.StringParam)
       if item.Str.BoolParam != "":
@@ -0,0 +1,242 @@
+##############################################################################
+#
+# Command line interface manager (CLIManager) for FreeRTOS+CLI
+# File: pipeline.py
+# This file contains the command queue: the commands are sent one after the
+# other, or several at once when the device allows it, and each response is
+# tagged with the command it answers. It is independent from Gtk.
+#
+# This software is released under the MIT licence
+#
+# Copyright (c) 2015 Jean-Baptiste Quelard
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+###############################################################################
+#!/usr/bin/python
+#
+# The responses come back in the order of the commands. Several commands can
+# only be in flight when the responses end with a terminator: an idle gap
+# can't separate two responses sent back to back. Without terminator the
+# queue sends a command once the previous response is complete.
+#
+# Over UDP a lost datagram means no response at all. When retries are enabled
+# a command left without any response is sent again with a longer timeout
+# each time. A late response then comes twice: the copy received after the
+# command was answered is dropped. The copies are only told apart from the
+# responses by their content, so the next command is held until they have all
+# come or can't come anymore: a command answering the same ("OK") is never
+# taken for a copy.
+
+from collections import deque
+
+from framer import ResponseFramer, IDLE_GAP, RESPONSE_TIMEOUT
+
+
+RETRY_BACKOFF = 2.0	# Factor applied to the timeout at each retransmission
+MAX_RETRY_TIMEOUT = 10.0  # Longest time (s) waiting for a retransmitted command
+
+
+class QueuedCommand:
+  """ Command of the queue, numbered in the order it was sent """
+
+  def __init__(self, number, command, queued):
+    self.Number = number
+    self.Command = command
+    self.Queued = queued  # Time it entered the queue
+    self.Sent = None	# Time it was first written to the socket
+    self.Attempts = 0
+    self.LastSent = None  # Time of the last attempt
+    self.Timeout = None	# Time (s) waiting for the response to the last attempt
+
+
+class QueueStats:
+  """ Counters of the commands sent by the queue """
+
+  def __init__(self):
+    self.Sent = 0	  # Commands sent, retransmissions excluded
+    self.Retransmitted = 0  # Retransmissions
+    self.Lost = 0	  # Commands without response after all the retransmissions
+    self.Duplicates = 0	  # Copies of responses dropped
+
+
+  def __str__(self):
+    return "%d commands, %d retransmitted, %d lost, %d duplicates dropped" % \
+	   (self.Sent, self.Retransmitted, self.Lost, self.Duplicates)
+
+
+class CommandQueue:
+  """ Send the commands and correlate the responses. The callback receives each
+      response (framer.Response) tagged with the command it answers """
+
+  def __init__(self, loop, write, callback, terminator="", idle=IDLE_GAP, \
+	       timeout=RESPONSE_TIMEOUT, depth=1, commandend="", retries=0):
+    self.Loop = loop
+    self.Write = write	# Function sending the data to the device
+    self.CommandEnd = commandend  # Lets a device reading a stream split the commands
+    self.Callback = callback
+    self.Framer = ResponseFramer(loop, self.ResponseReceived, terminator, idle, timeout)
+    self.Timeout = timeout
+    self.Retries = retries  # Retransmissions of a command left without response
+    # A retransmitted command must be the only one in flight: the responses
+    # of the next ones would be taken for its response
+    self.Depth = max(depth, 1) if terminator and not retries else 1
+    self.Waiting = deque()  # Commands not sent yet
+    self.InFlight = deque() # Commands sent, waiting for their response
+    self.Number = 0
+    self.Stats = QueueStats()
+    self.Copies = []	# Copies of retransmitted responses expected: [data, count, deadline]
+    self.HoldTimer = None # Sends the next command once the copies can't come anymore
+
+
+  def __len__(self):
+    """ Number of commands not answered yet """
+    return len(self.Waiting) + len(self.InFlight)
+
+
+  def Send(self, command):
+    """ Queue a command. It is sent as soon as the pipeline depth allows it """
+    self.Number += 1
+    self.Waiting.append(QueuedCommand(self.Number, command, self.Loop.Time()))
+    self.Pump()
+
+
+  def Pump(self):
+    """ Send the waiting commands while there is room in the pipeline """
+    if self.Waiting and self.IsHeld():
+      return
+    while self.Waiting and len(self.InFlight) < self.Depth:
+      Command = self.Waiting.popleft()
+      Command.Sent = self.Loop.Time()
+      Command.Attempts = 1
+      Command.LastSent = Command.Sent
+      Command.Timeout = self.Timeout
+      self.InFlight.append(Command)
+      self.Stats.Sent += 1
+      self.Write(Command.Command + self.CommandEnd)
+      if len(self.InFlight) == 1:
+	self.Framer.Start(Command.Command, Command.Sent)
+
+
+  def IsHeld(self):
+    """ Tells if copies of a retransmitted response may still come. Then the
+	next command waits, a timer sends it at the deadline of the copies """
+    Now = self.Loop.Time()
+    self.Copies = [Copy for Copy in self.Copies if Copy[2] > Now]
+    if not self.Copies:
+      return False
+    if self.HoldTimer is None:
+      self.HoldTimer = self.Loop.CallLater(max([Copy[2] for Copy in self.Copies]) - Now, self.Release)
+    return True
+
+
+  def Release(self):
+    if self.HoldTimer is not None:
+      self.HoldTimer.Cancel()
+      self.HoldTimer = None
+    self.Pump()
+
+
+  def Retransmit(self, command):
+    """ Send the command again, waiting longer for its response """
+    command.Attempts += 1
+    command.LastSent = self.Loop.Time()
+    command.Timeout = min(command.Timeout * RETRY_BACKOFF, MAX_RETRY_TIMEOUT)
+    self.Stats.Retransmitted += 1
+    self.Write(command.Command + self.CommandEnd)
+    self.Framer.Start(command.Command, command.Sent, command.Timeout)
+
+
+  def Feed(self, data):
+    """ Data received from the device """
+    self.Framer.Feed(data)
+
+
+  def ResponseReceived(self, response):
+    if self.StripDuplicate(response):
+      if response.Command is not None and self.InFlight:
+	# The copy was taken for the response of the command in flight
+	Command = self.InFlight[0]
+	self.Framer.Start(Command.Command, Command.Sent, Command.Timeout)
+      elif not self.Copies:
+	self.Release()	# All the copies came, no need to wait any longer
+      return
+    if response.Command is None or not self.InFlight:
+      self.Callback(response) # Data received while no command was waiting
+      return
+
+    Command = self.InFlight[0]
+    if response.Size == 0 and response.End == 'timeout':
+      if Command.Attempts <= self.Retries:
+	self.Retransmit(Command)
+	return
+      if self.Retries:
+	self.Stats.Lost += 1
+    elif Command.Attempts > 1 and response.Size:
+      # The responses to the other attempts may still come: the last attempt is
+      # given twice the delay of this response
+      self.Copies.append(["".join(response.Chunks), Command.Attempts - 1, \
+			  Command.LastSent + 2 * max(response.Duration, Command.Timeout)])
+
+    self.InFlight.popleft()
+    response.Number = Command.Number
+    response.Queued = Command.Sent - Command.Queued
+    response.Attempts = Command.Attempts
+    # The data following in the same chunk belongs to the next command
+    if self.InFlight:
+      self.Framer.Start(self.InFlight[0].Command, self.InFlight[0].Sent)
+    self.Callback(response)
+    self.Pump()
+
+
+  def StripDuplicate(self, response):
+    """ Remove the copy of a retransmitted response the data starts with.
+	Returns True if nothing is left """
+    if not self.Copies:
+      return False
+    Now = self.Loop.Time()
+    self.Copies = [Copy for Copy in self.Copies if Copy[2] > Now]
+    Received = "".join(response.Chunks)
+    for Copy in self.Copies:
+      if Received.startswith(Copy[0]):
+	break
+    else:
+      return False
+
+    self.Stats.Duplicates += 1
+    Copy[1] -= 1
+    if Copy[1] == 0:
+      self.Copies.remove(Copy)
+    Rest = Received[len(Copy[0]):]
+    response.Chunks = [Rest] if Rest else []
+    response.Size = len(Rest)
+    return not Rest
+
+
+  def Close(self):
+    """ The connection is closed: the commands in flight get the data received
+	so far, the waiting ones are dropped """
+    self.Waiting.clear()
+    if self.HoldTimer is not None:
+      self.HoldTimer.Cancel()
+      self.HoldTimer = None
+    self.Framer.Close()
+    while self.InFlight:
+      if self.Framer.Current is None:
+	self.Framer.Start(self.InFlight[0].Command, self.InFlight[0].Sent)
+      self.Framer.Close()
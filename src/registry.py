@@ -0,0 +1,327 @@
+##############################################################################
+#
+# Command line interface manager (CLIManager) for FreeRTOS+CLI
+# File: registry.py
+# This file contains the registry of the commands currently loaded. It is
+# independent from Gtk, the list of commands displayed by the GUI is filled
+# from it.
+#
+# This software is released under the MIT licence
+#
+# Copyright (c) 2015 Jean-Baptiste Quelard
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+###############################################################################
+#!/usr/bin/python
+
+import re
+
+
+_ENCODED_ARG = re.compile("<([^>]*)>")
+
+
+def EncodeArgList(arglist):
+  """ Encode the arguments of a command for the .set file: "<arg1><arg2>" """
+  if arglist is None:
+    return ""
+  return "".join(["<" + Arg + ">" for Arg in arglist])
+
+
+def DecodeArgList(string, nbargs):
+  """ Decode the arguments of a command read from a .set file """
+  if nbargs == 0:
+    return None #No assistance can be provided to populate arguments
+  return _ENCODED_ARG.findall(string)
+
+
+class CommandRecord(object):
+  """ A command of the set: its name, number of arguments, help string, the
+      arguments found in the help string (None when no argument is expected)
+      and the file it comes from """
+
+  __slots__ = ('Name', 'Args', 'Help', 'ArgList', 'Source')
+
+  def __init__(self, name, args, help, arglist=None, source=None):
+    self.Name = name
+    self.Args = args
+    self.Help = help
+    self.ArgList = arglist
+    self.Source = source
+
+
+  def __eq__(self, other):
+    return self.Name == other.Name and self.Args == other.Args and self.Help == other.Help
+
+
+  def __ne__(self, other):
+    return not self.__eq__(other)
+
+
+  def __repr__(self):
+    return "CommandRecord(%r, %r, %r)" % (self.Name, self.Args, self.Help)
+
+
+class TrieNode(object):
+  """ Node of the prefix trie """
+
+  __slots__ = ('Children', 'Count', 'Name')
+
+  def __init__(self):
+    self.Children = {}	# Next character -> node
+    self.Count = 0	# Number of names below this node (itself included)
+    self.Name = None	# Name ending at this node
+
+
+class PrefixTrie:
+  """ Prefix trie of the command names. The queries on a prefix are answered in
+      a time proportional to the prefix length (plus the size of the answer) """
+
+  def __init__(self):
+    self.Root = TrieNode()
+
+
+  def Insert(self, name):
+    """ Add a name to the trie (the name must not be in the trie yet) """
+    Node = self.Root
+    Node.Count += 1
+    for Char in name:
+      Child = Node.Children.get(Char)
+      if Child is None:
+	Child = Node.Children[Char] = TrieNode()
+      Node = Child
+      Node.Count += 1
+    Node.Name = name
+
+
+  def Remove(self, name):
+    """ Remove a name from the trie (the name must be in the trie) """
+    Node = self.Root
+    Node.Count -= 1
+    for Char in name:
+      Child = Node.Children[Char]
+      Child.Count -= 1
+      if Child.Count == 0:
+	del Node.Children[Char]	# Nothing left below
+	return
+      Node = Child
+    Node.Name = None
+
+
+  def Clear(self):
+    """ Remove all the names """
+    self.Root = TrieNode()
+
+
+  def Find(self, prefix):
+    """ Returns the node of the prefix or None if no name starts with it """
+    Node = self.Root
+    for Char in prefix:
+      Node = Node.Children.get(Char)
+      if Node is None:
+	return None
+    return Node
+
+
+  def Count(self, prefix):
+    """ Number of names starting with the prefix """
+    Node = self.Find(prefix)
+    if Node is None:
+      return 0
+    return Node.Count
+
+
+  def Complete(self, prefix):
+    """ All the names starting with the prefix, in alphabetical order """
+    Node = self.Find(prefix)
+    if Node is None:
+      return []
+
+    Names = []
+    Stack = [Node]
+    while Stack:
+      Node = Stack.pop()
+      if Node.Name is not None:
+	Names.append(Node.Name)
+      # Reversed so that the smallest character is popped first
+      for Char in sorted(Node.Children, reverse=True):
+	Stack.append(Node.Children[Char])
+    return Names
+
+
+  def UniqueCompletion(self, prefix):
+    """ The name starting with the prefix if there is only one, else None """
+    Node = self.Find(prefix)
+    if Node is None or Node.Count != 1:
+      return None
+    while Node.Name is None:
+      Node = Node.Children.values()[0]
+    return Node.Name
+
+
+  def LongestCommonPrefix(self, prefix):
+    """ Longest prefix shared by all the names starting with the prefix.
+	None when no name starts with the prefix """
+    Node = self.Find(prefix)
+    if Node is None:
+      return None
+    Common = prefix
+    while Node.Name is None and len(Node.Children) == 1:
+      Char, Node = Node.Children.items()[0]
+      Common += Char
+    return Common
+
+
+class CommandRegistry:
+  """ Ordered set of commands indexed by name """
+
+  def __init__(self):
+    self.Records = []	# Commands in the order they were added
+    self.Index = {}	# Name -> record
+    self.Trie = PrefixTrie()	# Names, for the completion and the syntax assistant
+    self.Conflicts = []	# (kept record, rejected record) with the same name but a different definition
+    self.Shadowed = {}	# Name -> the other definitions of the command, in the order they were added
+    self.Generation = 0	# Incremented on each modification of the set of commands
+
+
+  def __len__(self):
+    return len(self.Records)
+
+
+  def __iter__(self):
+    return iter(self.Records)
+
+
+  def __contains__(self, name):
+    return name in self.Index
+
+
+  def Get(self, name):
+    """ Returns the record of the command or None """
+    return self.Index.get(name)
+
+
+  def Add(self, name, args, help, arglist=None, source=None):
+    """ Add a command. Returns False if a command with the same name is already
+	loaded, in which case the first definition is kept """
+    Existing = self.Index.get(name)
+    if Existing is not None:
+      if Existing.Args != args or Existing.Help != help:
+	self.Conflicts.append((Existing, CommandRecord(name, args, help, source=source)))
+      # Taken instead if the kept definition goes away with its file
+      self.Shadowed.setdefault(name, []).append(CommandRecord(name, args, help, arglist, source))
+      return False
+
+    Record = CommandRecord(name, args, help, arglist, source)
+    self.Records.append(Record)
+    self.Index[name] = Record
+    self.Trie.Insert(name)
+    self.Generation += 1
+    return True
+
+
+  def Remove(self, name):
+    """ Remove a command. Returns False if it is not loaded """
+    Record = self.Index.get(name)
+    if Record is None:
+      return False
+    self.RemoveRecords([Record])
+    return True
+
+
+  def RemoveRecords(self, records):
+    """ Remove loaded commands, the list of the records is rebuilt once """
+    if not records:
+      return
+    for Record in records:
+      del self.Index[Record.Name]
+      self.Shadowed.pop(Record.Name, None)
+      self.Trie.Remove(Record.Name)
+    self.Records = [Record for Record in self.Records if self.Index.get(Record.Name) is Record]
+    self.Generation += 1
+
+
+  def AddRecords(self, records, source=None):
+    """ Add a list of (NameString, Args, Help, ArgList) records.
+	Returns the conflicts found while adding them """
+    NbConflicts = len(self.Conflicts)
+    for NameString, Args, Help, ArgList in records:
+      self.Add(NameString, Args, Help, ArgList, source)
+    return self.Conflicts[NbConflicts:]
+
+
+  def ReplaceSource(self, source, records):
+    """ Apply a new parse of a file: the commands it doesn't define anymore are
+	removed, or replaced by the definition of another file which is kept
+	aside, the others are updated or added. Returns the lists of added,
+	removed and modified records """
+    Previous = dict([(Record.Name, Record) for Record in self.Records if Record.Source == source])
+    # The definitions of the file set aside are those of the new parse
+    for Name, Definitions in self.Shadowed.items():
+      Definitions[:] = [Definition for Definition in Definitions if Definition.Source != source]
+      if not Definitions:
+	del self.Shadowed[Name]
+
+    Added = []
+    Modified = []
+    for NameString, Args, Help, ArgList in records:
+      Record = Previous.pop(NameString, None)
+      if Record is not None:
+	if Record.Args != Args or Record.Help != Help or Record.ArgList != ArgList:
+	  Record.Args = Args
+	  Record.Help = Help
+	  Record.ArgList = ArgList
+	  Modified.append(Record)
+      elif self.Add(NameString, Args, Help, ArgList, source):
+	Added.append(self.Index[NameString])
+
+    Removed = []
+    for Record in Previous.values():
+      Definitions = self.Shadowed.get(Record.Name)
+      if not Definitions:
+	Removed.append(Record)
+	continue
+      # Defined by another file too: its definition takes over, in the same row
+      Definition = Definitions.pop(0)
+      if not Definitions:
+	del self.Shadowed[Record.Name]
+      Record.Args = Definition.Args
+      Record.Help = Definition.Help
+      Record.ArgList = Definition.ArgList
+      Record.Source = Definition.Source
+      Modified.append(Record)
+    self.RemoveRecords(Removed)
+
+    if Modified:
+      self.Generation += 1
+    return Added, Removed, Modified
+
+
+  def Complete(self, prefix):
+    """ Records of the commands starting with the prefix, in alphabetical order """
+    return [self.Index[Name] for Name in self.Trie.Complete(prefix)]
+
+
+  def Clear(self):
+    """ Remove all the commands """
+    self.Records = []
+    self.Index = {}
+    self.Trie.Clear()
+    self.Conflicts = []
+    self.Shadowed = {}
+    self.Generation += 1
@@ -0,0 +1,108 @@
+##############################################################################
+#
+# Command line interface manager (CLIManager) for FreeRTOS+CLI
+# File: render.py
+# This file contains the output backlog: the text received from the device is
+# gathered and displayed at most once per frame, as a single insert. It is
+# independent from Gtk.
+#
+# This software is released under the MIT licence
+#
+# Copyright (c) 2015 Jean-Baptiste Quelard
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+###############################################################################
+#!/usr/bin/python
+#
+# Each insert in the text buffer costs a layout and a scroll of the view,
+# whatever the size of the text. A device flooding the CLI with small responses
+# would keep the main loop busy with them: the responses are queued and
+# flushed together at the frame rate. A frame normally takes a bounded amount
+# of text so the view stays responsive; when the backlog grows beyond what
+# the frames absorb, the view catches up by flushing the whole backlog at once.
+#
+# The scrollback is bounded as well: past the limit, the oldest lines are
+# trimmed, a batch at a time rather than a line per insert.
+
+from collections import deque
+
+
+FRAME_INTERVAL = 40	# Time (ms) between two flushes of the output
+FRAME_BUDGET = 64 * 1024  # Bytes displayed by a frame
+CATCH_UP_SIZE = 1024 * 1024 # Backlog (bytes) starting the catching up
+SCROLLBACK_SLACK = 0.1	# Part of the scrollback limit exceeded before trimming
+
+
+class OutputBacklog:
+  """ Text received and not displayed yet. The pieces are never split: they may
+      be UTF-8 strings cut on character boundaries only """
+
+  def __init__(self, budget=FRAME_BUDGET, catchup=CATCH_UP_SIZE):
+    self.Budget = budget
+    self.CatchUpSize = catchup
+    self.Pieces = deque()
+    self.Size = 0
+    self.CatchingUp = False
+
+
+  def __len__(self):
+    return self.Size
+
+
+  def Add(self, text):
+    self.Pieces.append(text)
+    self.Size += len(text)
+
+
+  def Take(self):
+    """ Text of the next frame: the pieces fitting in the budget (one at
+	least), or the whole backlog while catching up """
+    if self.Size > self.CatchUpSize:
+      self.CatchingUp = True
+    elif self.Size <= self.Budget:
+      self.CatchingUp = False
+
+    if self.CatchingUp:
+      Taken = list(self.Pieces)
+      self.Pieces.clear()
+      self.Size = 0
+      return "".join(Taken)
+
+    Taken = [self.Pieces.popleft()]
+    Size = len(Taken[0])
+    while self.Pieces and Size + len(self.Pieces[0]) <= self.Budget:
+      Size += len(self.Pieces[0])
+      Taken.append(self.Pieces.popleft())
+    self.Size -= Size
+    return "".join(Taken)
+
+
+  def Clear(self):
+    self.Pieces.clear()
+    self.Size = 0
+    self.CatchingUp = False
+
+
+def ScrollbackExcess(count, limit):
+  """ Lines (or characters) to trim from the head of the scrollback. None until
+      the limit is exceeded by the slack, then back to the limit. A limit of 0
+      means no limit """
+  if limit <= 0 or count <= limit + max(int(limit * SCROLLBACK_SLACK), 1):
+    return 0
+  return count - limit
@@ -0,0 +1,279 @@
+##############################################################################
+#
+# Command line interface manager (CLIManager) for FreeRTOS+CLI
+# File: scanner.py
+# This file contains a fast scanner extracting the commands definitions from
+# the source. It is an alternative to the pyparsing grammar of parser.py which
+# is only used when a declaration can't be understood by the scanner.
+#
+# This software is released under the MIT licence
+#
+# Copyright (c) 2015 Jean-Baptiste Quelard
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+###############################################################################
+#!/usr/bin/python
+
+import os
+import re
+import sys
+import mmap
+
+
+DEFAULT_CHUNK_SIZE = 4 << 20	# Size of the windows scanned in a memory mapped file
+HEAD_MARGIN = 4096		# A declaration head is assumed shorter than this
+
+
+# Tokens of interest at the top level of the file. The characters that can't
+# start a token are skipped first. Comments and literals are matched before the
+# declarations so that a declaration inside a comment or a string is ignored.
+_TOKEN = re.compile(r'''
+  [^/"'s]*
+  (?:
+      (?P<Comment>/\*.*?\*/ | //[^\n]*)
+    | (?P<String>"(?:[^"\\\n]|\\.)*")
+    | (?P<Char>'(?:[^'\\\n]|\\.)*')
+    | (?P<Declaration>(?<!\w)static\s+const\s+CLI_Command_Definition_t\s+[A-Za-z_]\w*\s*=\s*\{)
+    | (?P<Open>/\*|["'])
+    | (?P<Skip>.)
+  )?
+  ''', re.S | re.X)
+
+# Tokens inside the braces of a declaration
+_BODY_TOKEN = re.compile(r'''
+    (?P<Space>\s+)
+  | (?P<Comment>/\*.*?\*/ | //[^\n]*)
+  | (?P<String>"(?:[^"\\\n]|\\.)*")
+  | (?P<Integer>[+-]?\d+)
+  | (?P<Identifier>[A-Za-z_]\w*)
+  | (?P<Separator>[,}])
+  | (?P<Other>.)
+  ''', re.S | re.X)
+
+# Arguments in a help string: <string> or [choice], on a single line, as the
+# quoted strings of the HelpString grammar
+_HELP_ARGUMENT = re.compile(r'<([^>\n\r]*)>|\[([^\]\n\r]*)\]')
+# Escaped whitespace converted in the arguments, as pyparsing does
+_WHITESPACE_ESCAPES = [(r'\t', '\t'), (r'\n', '\n'), (r'\f', '\f'), (r'\r', '\r')]
+
+
+def ScanHelpString(string):
+  """ Arguments of a help string, in order, without loading the grammar """
+  ArgList = []
+  for Match in _HELP_ARGUMENT.finditer(string):
+    Argument = Match.group(1) if Match.group(1) is not None else Match.group(2)
+    if '\\' in Argument:
+      for Literal, Character in _WHITESPACE_ESCAPES:
+	Argument = Argument.replace(Literal, Character)
+    if Argument != "":
+      ArgList.append(Argument)
+  return ArgList
+
+
+class CmdScanner:
+  """ Linear scanner for the CLI_Command_Definition_t declarations """
+
+  def Scan(self, content, fallback=None):
+    """ Scan the content and return the list of records found.
+	The declarations that can't be understood are given to the fallback
+	function which returns the records to insert in their place """
+    return self.ScanChunk(content, True, fallback)[0]
+
+
+  def ScanChunk(self, content, final, fallback=None):
+    """ Scan a chunk of a file. Returns the records found and the number of
+	characters consumed. When the chunk is not the last one of the file, the
+	scan stops before a comment, literal or declaration cut by the end of the
+	chunk so that it can be scanned again with the following data """
+    Records = []
+    Length = len(content)
+    if final:
+      Limit = Length
+    else:
+      Limit = max(0, Length - HEAD_MARGIN)
+    pos = 0
+    LastEnd = 0	# End of the last token scanned
+
+    while pos < Length:
+      Match = _TOKEN.match(content, pos)
+      Kind = Match.lastgroup
+      if Kind is None or Kind == 'Skip':
+	pos = Match.end()
+	continue
+      Start = Match.start(Kind)
+      if Start >= Limit:
+	break
+
+      if Kind == 'Open':
+	# Comment or literal without its end
+	if not final and (Match.group() == '/*' or content.find('\n', Start) == -1):
+	  return Records, Start
+      elif Kind == 'Comment':
+	if not final and Match.end() == Length:
+	  return Records, Start	# Line comment cut by the end of the chunk
+      elif Kind == 'Declaration':
+	Record, End = self.ScanBody(content, Match.end(), final)
+	if End is None:
+	  return Records, Start	# Declaration cut by the end of the chunk
+	if Record is not None:
+	  Records.append(Record)
+	elif fallback is not None:
+	  Records.extend(fallback(content[Start:End]))
+	pos = LastEnd = End
+	continue
+
+      pos = LastEnd = Match.end()
+
+    if final:
+      return Records, Length
+
+    # Resume at the beginning of a line of code, never in the middle of a word
+    return Records, max(LastEnd, content.rfind('\n', LastEnd, Limit) + 1)
+
+
+  def ScanBody(self, content, pos, final=True):
+    """ Scan the fields of a declaration starting after its opening brace.
+	Returns the (NameString, Args, Help) record or None and the end position.
+	The end position is None when the declaration is cut by the end of a chunk """
+    Fields = [[]]
+    Length = len(content)
+
+    while pos < Length:
+      Token = _BODY_TOKEN.match(content, pos)
+      pos = Token.end()
+      Kind = Token.lastgroup
+
+      if Kind == 'Space' or Kind == 'Comment':
+	if not final and pos == Length:
+	  return None, None
+	continue
+      elif Kind == 'Separator':
+	if Token.group() == '}':
+	  return self.BuildRecord(Fields), pos
+	Fields.append([])
+      elif Kind == 'Other':
+	if not final:
+	  Rest = content[Token.start():]
+	  if (Rest[0] == '"' and '\n' not in Rest) or Rest.startswith('/*') or Rest == '/':
+	    return None, None	# String or comment cut by the end of the chunk
+	return None, pos  # Not something this scanner understands
+      else:
+	Fields[-1].append((Kind, Token.group()))
+
+    if not final:
+      return None, None
+    return None, pos  # Unterminated declaration
+
+
+  def IterChunks(self, filename, fallback=None, chunksize=DEFAULT_CHUNK_SIZE):
+    """ Scan a file through a memory map, one window at a time. Yields for each
+	window the records found, the number of bytes scanned and the file size """
+    with open(filename, "rb") as cfile:
+      Size = os.fstat(cfile.fileno()).st_size
+      Pos = 0
+      Window = chunksize
+      while Pos < Size:
+	End = min(Pos + Window, Size)
+
+	# Only the window is mapped so the pages of the file already scanned
+	# are released, the offset of a map must be aligned
+	Offset = Pos - Pos % mmap.ALLOCATIONGRANULARITY
+	Map = mmap.mmap(cfile.fileno(), End - Offset, access=mmap.ACCESS_READ, offset=Offset)
+	try:
+	  Chunk = Map[Pos - Offset:]
+	finally:
+	  Map.close()
+
+	Records, Consumed = self.ScanChunk(Chunk, End == Size, fallback)
+	if Consumed == 0 and End < Size:
+	  Window *= 2	# A single declaration or comment larger than the window
+	  continue
+	Pos += Consumed
+	Window = chunksize
+	yield Records, Pos, Size
+
+
+  def IterRecords(self, filename, fallback=None, chunksize=DEFAULT_CHUNK_SIZE):
+    """ Generator of the records of a file. Memory use doesn't depend on the file size """
+    for Records, Done, Size in self.IterChunks(filename, fallback, chunksize):
+      for Record in Records:
+	yield Record
+
+
+  def BuildRecord(self, fields):
+    """ Check the fields of a declaration and build the record """
+
+    if len(fields) == 5 and fields[4] == []:
+      fields = fields[:4]   # Trailing comma
+    if len(fields) != 4:
+      return None
+
+    Name = self.Concatenate(fields[0])
+    Help = self.Concatenate(fields[1])
+    if Name is None or Help is None:
+      return None
+    if len(fields[2]) != 1 or fields[2][0][0] != 'Identifier':
+      return None
+    if len(fields[3]) != 1 or fields[3][0][0] != 'Integer':
+      return None
+
+    return (Name, int(fields[3][0][1]), Help)
+
+
+  def Concatenate(self, tokens):
+    """ Concatenate adjacent string literals, as the C compiler does """
+    if len(tokens) == 0:
+      return None
+    String = ""
+    for Kind, Value in tokens:
+      if Kind != 'String':
+	return None
+      String += Value[1:-1]
+    return String
+
+
+def VerifyEngines(filenames):
+  """ Parse the files with both engines and report the differences.
+      Returns True when the outputs are identical """
+  from parser import CmdParser
+
+  Identical = True
+  for Filename in filenames:
+    Scanner = CmdParser('scanner').ParseFile(Filename, 'Source')
+    Grammar = CmdParser('pyparsing').ParseFile(Filename, 'Source')
+    if Scanner == Grammar:
+      print Filename + ": " + str(len(Scanner)) + " commands, identical"
+    else:
+      Identical = False
+      print Filename + ": engines differ"
+      for Record in Scanner:
+	if Record not in Grammar:
+	  print "  scanner only:   " + repr(Record)
+      for Record in Grammar:
+	if Record not in Scanner:
+	  print "  pyparsing only: " + repr(Record)
+
+  return Identical
+
+
+if __name__ == "__main__":
+
+  if VerifyEngines(sys.argv[1:]):
+    sys.exit(0)
+  sys.exit(1)
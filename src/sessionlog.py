@@ -0,0 +1,559 @@
+##############################################################################
+#
+# Command line interface manager (CLIManager) for FreeRTOS+CLI
+# File: sessionlog.py
+# This file contains the session log: the commands sent and the responses
+# received are appended to a transcript with an index of its lines and a
+# record of the events, so a long transcript is read without loading it and
+# a session can be replayed. It is independent from Gtk.
+#
+# This software is released under the MIT licence
+#
+# Copyright (c) 2015 Jean-Baptiste Quelard
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+###############################################################################
+#!/usr/bin/python
+#
+# A session is made of three files sharing the same name:
+#   session-20150601-101500-1234.log  transcript, the text of the CLI pane
+#   session-20150601-101500-1234.idx  offset (8 bytes) of the start of each line
+#   session-20150601-101500-1234.evt  one record per command or response: time,
+#				      offset and size of its text, 'S'ent or 'R'eceived
+# The name holds the start of the session and the process recording it, then
+# a number when the same second gave several sessions and the device of a
+# group session: two sessions never share their files.
+# The files are only appended to. After a crash the index may miss the last
+# lines: they are found by reading the end of the transcript only.
+#
+# A long session is rotated into segments, each one readable by itself:
+#   session-20150601-101500-1234.001.log, .idx, .evt and so on. The previous
+# segments may be compressed (session-20150601-101500-1234.log.gz...), they are
+# decompressed into a temporary directory to be read.
+
+import os
+import re
+import gzip
+import errno
+import time
+import mmap
+import Queue
+import shutil
+import struct
+import tempfile
+import itertools
+import threading
+
+try:
+  import lzma	# Python 3 or backports.lzma
+except ImportError:
+  try:
+    from backports import lzma
+  except ImportError:
+    lzma = None
+
+
+PROMPT = "> "	# Prompt of the CLI pane, the transcript reads like it
+LOG_EXTENSION = ".log"
+INDEX_EXTENSION = ".idx"
+EVENTS_EXTENSION = ".evt"
+
+SENT = "S"
+RECEIVED = "R"
+
+_OFFSET = struct.Struct("<Q")
+_EVENT = struct.Struct("<dQIc")	# Time, offset, size, kind
+REPLAY_BATCH = 1000	# Events replayed at once at the maximum speed
+
+LOG_QUEUE_SIZE = 10000	# Entries waiting for the writer, the next ones are dropped
+LOG_BATCH = 1000	# Entries written at once
+LOG_POLL_INTERVAL = 1.0 # Time (s) between two checks of the rotation when idle
+LOG_CLOSE_TIMEOUT = 5.0	# Time (s) waiting for the queue to be written when quitting
+COPY_CHUNK_SIZE = 1024 * 1024
+
+# Compression of the rotated segments: extension and opening function
+COMPRESSIONS = {"gzip": (".gz", gzip.open)}
+if lzma is not None:
+  COMPRESSIONS["lzma"] = (".xz", lzma.open)
+
+
+def SessionFilename(directory, start=None, label=None):
+  """ Name of the transcript of a session starting now, the transcript is
+      created empty to reserve it. The name holds the process and a number when
+      another session of the same second took it, the label (a device) if any """
+  if not os.path.isdir(directory):
+    os.makedirs(directory)
+  Base = time.strftime("session-%Y%m%d-%H%M%S", time.localtime(start)) + "-%d" % os.getpid()
+  if label:
+    Base += "-" + re.sub(r"[^\w.-]", "_", label)
+  for Number in itertools.count():
+    Filename = os.path.join(directory, Base + ("-%d" % Number if Number else "") + LOG_EXTENSION)
+    # Its first segment may have been compressed already
+    if [Extension for Extension, Open in COMPRESSIONS.values() if os.path.exists(Filename + Extension)]:
+      continue
+    try:
+      os.close(os.open(Filename, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0666))
+      return Filename
+    except OSError, Error:
+      if Error.errno != errno.EEXIST:
+	raise
+
+
+def _Companion(filename, extension):
+  return os.path.splitext(filename)[0] + extension
+
+
+class LogSegment:
+  """ Files of a session, or of a part of it once rotated. The text is gathered
+      and written by Flush, with a write() per file """
+
+  def __init__(self, filename):
+    Directory = os.path.dirname(filename)
+    if Directory and not os.path.isdir(Directory):
+      os.makedirs(Directory)
+    self.Filename = filename
+    self.Created = time.time()
+    # Unbuffered, the writes are batched here
+    self.Log = open(filename, "ab", 0)
+    self.Index = open(_Companion(filename, INDEX_EXTENSION), "ab", 0)
+    self.Events = open(_Companion(filename, EVENTS_EXTENSION), "ab", 0)
+    self.Offset = self.Log.tell()
+    self.Pending = ([], [], [])	# Transcript, index and events not written yet
+    if self.Offset == 0:
+      self.Pending[1].append(_OFFSET.pack(0))	# First line
+      self.Append(PROMPT)  # The pane starts with a prompt
+
+
+  def Append(self, text):
+    """ Add text to the transcript and the start of its lines to the index """
+    self.Pending[0].append(text)
+    End = text.find("\n")
+    while End >= 0:
+      self.Pending[1].append(_OFFSET.pack(self.Offset + End + 1))
+      End = text.find("\n", End + 1)
+    self.Offset += len(text)
+
+
+  def Write(self, kind, text, now=None):
+    """ Record a command sent or a response received, as displayed by the pane:
+        followed by a new prompt """
+    Start = self.Offset
+    self.Append(text + "\n" + PROMPT)
+    self.Pending[2].append(_EVENT.pack(time.time() if now is None else now, Start, \
+				       self.Offset - Start, kind))
+
+
+  def Flush(self):
+    """ Write what was gathered. The transcript goes first: the index and the
+        events never point past it """
+    for File, Pending in zip((self.Log, self.Index, self.Events), self.Pending):
+      if Pending:
+	File.write("".join(Pending))
+	del Pending[:]
+
+
+  def Close(self):
+    self.Flush()
+    for File in (self.Log, self.Index, self.Events):
+      File.close()
+
+
+class LogStats:
+  """ Counters of a session log """
+
+  def __init__(self):
+    self.Queued = 0	# Entries waiting for the writer
+    self.Written = 0
+    self.Dropped = 0	# Entries given while the queue was full
+    self.Batches = 0
+    self.Segments = 1
+    self.Error = None	# Error which stopped the writing
+
+
+  def __str__(self):
+    Text = "%d written in %d batches, %d queued, %d dropped" % (self.Written, self.Batches, \
+								 self.Queued, self.Dropped)
+    if self.Segments > 1:
+      Text += ", %d segments" % self.Segments
+    if self.Error is not None:
+      Text += ", " + self.Error
+    return Text
+
+
+class SessionLog:
+  """ Record the commands and the responses of a session without ever blocking
+      the caller: the entries are timestamped and queued, a thread writes them.
+      The segments are rotated past a size (bytes) or an age (s), 0 for none,
+      and the previous ones compressed when a compression is given """
+
+  def __init__(self, filename, rotatesize=0, rotatetime=0, compression=None, \
+	       queuesize=LOG_QUEUE_SIZE):
+    self.Filename = filename
+    self.Stats = LogStats()
+    self.Entries = Queue.Queue(queuesize)
+    self.Closed = threading.Event()
+    # The first segment is opened here, its errors are the caller's
+    self.Writer = LogWriter(self, LogSegment(filename), rotatesize, rotatetime, compression)
+    self.Writer.start()
+
+
+  def Write(self, kind, text, now=None):
+    try:
+      self.Entries.put_nowait((time.time() if now is None else now, kind, text))
+    except Queue.Full:
+      self.Stats.Dropped += 1
+    self.Stats.Queued = self.Entries.qsize()
+
+
+  def Close(self):
+    """ The writer ends by itself once the queue is written """
+    self.Closed.set()
+    try:
+      self.Entries.put_nowait(None)  # Wakes the writer up
+    except Queue.Full:
+      pass
+
+
+  def Wait(self, timeout=None):
+    """ Wait for the end of the writer, once closed """
+    self.Writer.join(timeout)
+
+
+class LogWriter(threading.Thread):
+  """ Thread taking the entries of a session log by batches and writing them.
+      It never keeps the application running: closing the log and waiting for
+      the writer is up to the application when it quits """
+
+  def __init__(self, sessionlog, segment, rotatesize, rotatetime, compression):
+    threading.Thread.__init__(self, name="SessionLog")
+    self.daemon = True
+    self.SessionLog = sessionlog
+    self.Segment = segment
+    self.RotateSize = rotatesize
+    self.RotateTime = rotatetime
+    self.Compression = compression
+    self.Base = os.path.splitext(segment.Filename)[0]
+
+
+  def run(self):
+    Entries = self.SessionLog.Entries
+    Stats = self.SessionLog.Stats
+    while True:
+      Batch = self.Take(Entries)
+      if self.Segment is not None:
+	try:
+	  self.WriteBatch(Batch)
+	except (IOError, OSError), Error:
+	  Stats.Error = str(Error)
+	  self.Segment = None  # The queue is still emptied
+      Stats.Queued = Entries.qsize()
+      if not Batch and self.SessionLog.Closed.is_set() and Entries.empty():
+	break
+
+    if self.Segment is not None:
+      try:
+	self.Segment.Close()
+      except (IOError, OSError), Error:
+	Stats.Error = str(Error)
+
+
+  def Take(self, entries):
+    """ The entries waiting, up to a batch, once the first one is there """
+    Batch = []
+    try:
+      Entry = entries.get(timeout=LOG_POLL_INTERVAL)
+      while True:
+	if Entry is not None:
+	  Batch.append(Entry)
+	if len(Batch) == LOG_BATCH:
+	  break
+	Entry = entries.get_nowait()
+    except Queue.Empty:
+      pass
+    return Batch
+
+
+  def WriteBatch(self, batch):
+    Stats = self.SessionLog.Stats
+    if batch:
+      for Time, Kind, Text in batch:
+	self.Segment.Write(Kind, Text, Time)
+      self.Segment.Flush()
+      Stats.Written += len(batch)
+      Stats.Batches += 1
+    if self.IsRotationDue():
+      self.Rotate()
+
+
+  def IsRotationDue(self):
+    if self.Segment.Offset <= len(PROMPT) or self.SessionLog.Closed.is_set():
+      return False  # Nothing recorded yet, or nothing more to record
+    if self.RotateSize > 0 and self.Segment.Offset >= self.RotateSize:
+      return True
+    return self.RotateTime > 0 and time.time() - self.Segment.Created >= self.RotateTime
+
+
+  def Rotate(self):
+    """ Go on in a new segment, the previous one is compressed aside """
+    Previous = self.Segment.Filename
+    self.Segment.Close()
+    self.Segment = None
+    Stats = self.SessionLog.Stats
+    self.Segment = LogSegment("%s.%03d%s" % (self.Base, Stats.Segments, LOG_EXTENSION))
+    Stats.Segments += 1
+    if self.Compression:
+      threading.Thread(target=CompressSegment, args=(Previous, self.Compression), \
+		       name="SessionLogCompression").start()
+
+
+def SegmentFiles(filename):
+  """ Transcript, index and events of a segment """
+  return [filename, _Companion(filename, INDEX_EXTENSION), _Companion(filename, EVENTS_EXTENSION)]
+
+
+def CompressSegment(filename, compression):
+  """ Replace the files of a segment by their compressed copies """
+  Extension, Open = COMPRESSIONS[compression]
+  for Filename in SegmentFiles(filename):
+    if not os.path.exists(Filename):
+      continue
+    with open(Filename, "rb") as Source:
+      Target = Open(Filename + Extension, "wb")
+      try:
+	shutil.copyfileobj(Source, Target, COPY_CHUNK_SIZE)
+      finally:
+	Target.close()
+    os.remove(Filename)
+
+
+def GetCompression(filename):
+  """ Compression of a segment from its name, None when it is not compressed """
+  for Compression, (Extension, Open) in COMPRESSIONS.items():
+    if filename.endswith(Extension):
+      return Compression
+  return None
+
+
+def DecompressSegment(filename, directory):
+  """ Copy the files of a compressed segment into the directory. Returns the
+      name of the transcript there """
+  Extension, Open = COMPRESSIONS[GetCompression(filename)]
+  Transcript = os.path.join(directory, os.path.basename(filename)[:-len(Extension)])
+  for Filename in SegmentFiles(Transcript):
+    Source = os.path.join(os.path.dirname(filename), os.path.basename(Filename)) + Extension
+    if not os.path.exists(Source):
+      continue
+    Compressed = Open(Source, "rb")
+    try:
+      with open(Filename, "wb") as Target:
+	shutil.copyfileobj(Compressed, Target, COPY_CHUNK_SIZE)
+    finally:
+      Compressed.close()
+  return Transcript
+
+
+class SessionLogReader:
+  """ Read a transcript through a memory map: only the lines asked for are read """
+
+  def __init__(self, filename):
+    self.Filename = filename
+    self.TemporaryDirectory = None
+    if GetCompression(filename) is not None:
+      self.TemporaryDirectory = tempfile.mkdtemp()
+      try:
+	filename = DecompressSegment(filename, self.TemporaryDirectory)
+      except Exception:
+	shutil.rmtree(self.TemporaryDirectory)
+	raise
+    self.File = open(filename, "rb")
+    self.Size = os.fstat(self.File.fileno()).st_size
+    self.Map = self.MapFile(self.File)
+
+    IndexFilename = _Companion(filename, INDEX_EXTENSION)
+    if not os.path.exists(IndexFilename):
+      BuildIndex(filename)
+    self.IndexFile = open(IndexFilename, "rb")
+    self.IndexMap = self.MapFile(self.IndexFile)
+    self.Indexed = self.ValidIndexEntries()
+
+    # Lines written after the last index entry
+    self.Extra = []
+    if self.Indexed:
+      Offset = self.GetIndexEntry(self.Indexed - 1)
+    else:
+      Offset = 0
+      self.Extra.append(0)
+    End = self.Map.find("\n", Offset) if self.Map is not None else -1
+    while End >= 0:
+      self.Extra.append(End + 1)
+      End = self.Map.find("\n", End + 1)
+
+    EventsFilename = _Companion(filename, EVENTS_EXTENSION)
+    self.EventsFile = open(EventsFilename, "rb") if os.path.exists(EventsFilename) else None
+    self.EventsMap = self.MapFile(self.EventsFile) if self.EventsFile is not None else None
+
+
+  def MapFile(self, file):
+    """ Memory map of a file, None when it is empty """
+    if os.fstat(file.fileno()).st_size == 0:
+      return None
+    return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+  def GetIndexEntry(self, number):
+    return _OFFSET.unpack_from(self.IndexMap, number * _OFFSET.size)[0]
+
+
+  def ValidIndexEntries(self):
+    """ Number of index entries pointing into the transcript. The index is
+	written after the transcript, it never goes past it unless damaged """
+    if self.IndexMap is None:
+      return 0
+    Low, High = 0, len(self.IndexMap) // _OFFSET.size
+    while Low < High:
+      Middle = (Low + High) // 2
+      if self.GetIndexEntry(Middle) <= self.Size:
+	Low = Middle + 1
+      else:
+	High = Middle
+    return Low
+
+
+  def GetLineCount(self):
+    return self.Indexed + len(self.Extra)
+
+
+  def GetLineStart(self, number):
+    if number < self.Indexed:
+      return self.GetIndexEntry(number)
+    return self.Extra[number - self.Indexed]
+
+
+  def GetLines(self, first, count, maxlength=None):
+    """ Text of the lines (without their end of line), cut at maxlength when given """
+    Lines = []
+    LineCount = self.GetLineCount()
+    for Number in range(max(first, 0), min(first + count, LineCount)):
+      Start = self.GetLineStart(Number)
+      End = self.GetLineStart(Number + 1) - 1 if Number + 1 < LineCount else self.Size
+      if maxlength is not None:
+	End = min(End, Start + maxlength)
+      Lines.append(self.Map[Start:End] if self.Map is not None else "")
+    return Lines
+
+
+  def GetEventCount(self):
+    if self.EventsMap is None:
+      return 0
+    return len(self.EventsMap) // _EVENT.size
+
+
+  def Events(self, first=0):
+    """ Recorded events: (time, kind, text) """
+    for Number in range(first, self.GetEventCount()):
+      Time, Offset, Size, Kind = _EVENT.unpack_from(self.EventsMap, Number * _EVENT.size)
+      if Offset + Size > self.Size:
+	return  # Text not written before a crash
+      yield Time, Kind, self.Map[Offset:Offset + Size]
+
+
+  def Close(self):
+    for Map in (self.Map, self.IndexMap, self.EventsMap):
+      if Map is not None:
+	Map.close()
+    for File in (self.File, self.IndexFile, self.EventsFile):
+      if File is not None:
+	File.close()
+    if self.TemporaryDirectory is not None:
+      shutil.rmtree(self.TemporaryDirectory)
+
+
+def BuildIndex(filename, chunksize=16 * 1024 * 1024):
+  """ Write the index of a transcript which has none """
+  with open(filename, "rb") as Log:
+    with open(_Companion(filename, INDEX_EXTENSION), "wb") as Index:
+      Index.write(_OFFSET.pack(0))
+      Offset = 0
+      while True:
+	Chunk = Log.read(chunksize)
+	if not Chunk:
+	  break
+	Lines = []
+	End = Chunk.find("\n")
+	while End >= 0:
+	  Lines.append(_OFFSET.pack(Offset + End + 1))
+	  End = Chunk.find("\n", End + 1)
+	Index.write("".join(Lines))
+	Offset += len(Chunk)
+
+
+class SessionReplay:
+  """ Give the recorded events to the callback with their original delays,
+      divided by the speed. A speed of 0 replays as fast as possible """
+
+  def __init__(self, reader, loop, callback, speed=1.0, donecallback=None):
+    self.Reader = reader
+    self.Loop = loop
+    self.Callback = callback	# Called with the kind and the text of each event
+    self.DoneCallback = donecallback
+    self.Speed = speed
+    self.Events = reader.Events()
+    self.Next = None
+    self.Start = None	# Loop time and recorded time of the first event
+    self.Timer = None
+
+
+  def Begin(self):
+    self.Next = next(self.Events, None)
+    if self.Next is not None:
+      self.Start = (self.Loop.Time(), self.Next[0])
+    self.Play()
+
+
+  def GetDue(self, event):
+    """ Loop time at which the event is replayed """
+    return self.Start[0] + (event[0] - self.Start[1]) / self.Speed
+
+
+  def Play(self):
+    """ Replay the events which are due, then wait for the next one """
+    self.Timer = None
+    Now = self.Loop.Time()
+    Played = 0
+    while self.Next is not None:
+      if self.Speed > 0 and self.GetDue(self.Next) > Now:
+	self.Timer = self.Loop.CallLater(self.GetDue(self.Next) - Now, self.Play)
+	return
+      if self.Speed <= 0 and Played == REPLAY_BATCH:
+	self.Timer = self.Loop.CallLater(0, self.Play)  # Let the loop breathe
+	return
+      Time, Kind, Text = self.Next
+      self.Callback(Kind, Text)
+      Played += 1
+      self.Next = next(self.Events, None)
+
+    if self.DoneCallback is not None:
+      self.DoneCallback()
+
+
+  def Stop(self):
+    if self.Timer is not None:
+      self.Timer.Cancel()
+      self.Timer = None
+    self.Next = None
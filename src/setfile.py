@@ -0,0 +1,237 @@
+##############################################################################
+#
+# Command line interface manager (CLIManager) for FreeRTOS+CLI
+# File: setfile.py
+# This file contains the readers and writers of the files holding a set of
+# commands: the text .set file and the binary .bset file. The binary file is
+# memory mapped and read without any parsing.
+#
+# This software is released under the MIT licence
+#
+# Copyright (c) 2015 Jean-Baptiste Quelard
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+###############################################################################
+#!/usr/bin/python
+#
+# Layout of the binary file (little endian):
+#   header    magic, version, number of records and offsets of the sections
+#   records   fixed size: name, help and arguments (offset and length in the
+#	      string table) and the number of arguments
+#   index     record numbers sorted by command name
+#   strings   string table, each distinct string is stored once
+# A command is found by a binary search of the index, without reading the other
+# records. The version 2 had no index, its commands are found by a scan.
+
+import os
+import sys
+import mmap
+import struct
+
+from registry import EncodeArgList, DecodeArgList
+
+
+TEXT_SET_EXTENSION = ".set"
+BINARY_SET_EXTENSION = ".bset"
+
+BINARY_SET_MAGIC = "CLIMSET\0"
+BINARY_SET_VERSION = 3
+_UNINDEXED_VERSION = 2
+
+_HEADER = struct.Struct("<8sHHIIII")	# Magic, version, header size, count, records, index, strings
+_HEADER_V2 = struct.Struct("<8sHHIII")	# Magic, version, header size, count, records, strings
+_RECORD = struct.Struct("<IIIIIIi")	# Name, help and arguments (offset, length), nb of arguments
+_INDEX = struct.Struct("<I")
+
+
+class SetFileError(Exception):
+  """ Raised when a binary set file can't be read """
+  pass
+
+
+def IsBinarySet(filename):
+  """ Tells if the file is a binary set of commands """
+  with open(filename, "rb") as SetFile:
+    return SetFile.read(len(BINARY_SET_MAGIC)) == BINARY_SET_MAGIC
+
+
+def WriteTextSet(filename, records):
+  """ Write the records in a text .set file """
+  with open(filename,"w") as cfile:
+    for Record in records:
+      cfile.write('"' + Record.Name + '","' + Record.Help + '",' + str(Record.Args) + \
+		  ',"' + EncodeArgList(Record.ArgList) + '"\n')
+
+
+def WriteBinarySet(filename, records):
+  """ Write the records in a binary .bset file """
+  records = list(records)
+  Strings = []
+  StringOffsets = {}	# Each distinct string is stored once
+  StringsSize = [0]
+
+  def AddString(String):
+    Offset = StringOffsets.get(String)
+    if Offset is None:
+      Offset = StringOffsets[String] = StringsSize[0]
+      Strings.append(String)
+      StringsSize[0] += len(String)
+    return Offset, len(String)
+
+  Records = []
+  for Record in records:
+    Name = AddString(Record.Name)
+    Help = AddString(Record.Help)
+    ArgList = AddString(EncodeArgList(Record.ArgList))
+    Records.append(_RECORD.pack(Name[0], Name[1], Help[0], Help[1], ArgList[0], ArgList[1], Record.Args))
+
+  Index = sorted(range(len(Records)), key=lambda Number: records[Number].Name)
+
+  RecordsOffset = _HEADER.size
+  IndexOffset = RecordsOffset + len(Records) * _RECORD.size
+  StringsOffset = IndexOffset + len(Index) * _INDEX.size
+
+  with open(filename, "wb") as SetFile:
+    SetFile.write(_HEADER.pack(BINARY_SET_MAGIC, BINARY_SET_VERSION, _HEADER.size, \
+			       len(Records), RecordsOffset, IndexOffset, StringsOffset))
+    SetFile.write("".join(Records))
+    SetFile.write("".join([_INDEX.pack(Number) for Number in Index]))
+    SetFile.write("".join(Strings))
+
+
+class BinarySet:
+  """ Memory mapped binary set of commands. Nothing is read until requested """
+
+  def __init__(self, filename):
+    with open(filename, "rb") as SetFile:
+      if os.fstat(SetFile.fileno()).st_size < _HEADER.size:
+	raise SetFileError(filename + ": not a binary set of commands")
+      self.Map = mmap.mmap(SetFile.fileno(), 0, access=mmap.ACCESS_READ)
+
+    Magic, Version, HeaderSize = struct.unpack_from("<8sHH", self.Map, 0)
+    if Magic != BINARY_SET_MAGIC:
+      self.Close()
+      raise SetFileError(filename + ": not a binary set of commands")
+    if Version > BINARY_SET_VERSION:
+      self.Close()
+      raise SetFileError(filename + ": unsupported version " + str(Version))
+    if Version == _UNINDEXED_VERSION:
+      self.Count, self.RecordsOffset, self.StringsOffset = _HEADER_V2.unpack_from(self.Map, 0)[3:]
+      self.IndexOffset = None
+    else:
+      self.Count, self.RecordsOffset, self.IndexOffset, self.StringsOffset = _HEADER.unpack_from(self.Map, 0)[3:]
+
+
+  def __len__(self):
+    return self.Count
+
+
+  def __iter__(self):
+    for Number in xrange(self.Count):
+      yield self.GetRecord(Number)
+
+
+  def __contains__(self, name):
+    return self.Find(name) is not None
+
+
+  def Close(self):
+    self.Map.close()
+
+
+  def GetString(self, offset, length):
+    Start = self.StringsOffset + offset
+    return self.Map[Start:Start + length]
+
+
+  def GetName(self, number):
+    """ Name of a record, without reading the rest of it """
+    NameOffset, NameLength = struct.unpack_from("<II", self.Map, self.RecordsOffset + number * _RECORD.size)
+    return self.GetString(NameOffset, NameLength)
+
+
+  def GetRecord(self, number):
+    """ Returns the (NameString, Args, Help, ArgList) record """
+    NameOffset, NameLength, HelpOffset, HelpLength, ArgListOffset, ArgListLength, Args = \
+	_RECORD.unpack_from(self.Map, self.RecordsOffset + number * _RECORD.size)
+    return (self.GetString(NameOffset, NameLength), Args, self.GetString(HelpOffset, HelpLength), \
+	    DecodeArgList(self.GetString(ArgListOffset, ArgListLength), Args))
+
+
+  def Find(self, name):
+    """ Binary search of a command in the name index. Returns its record or None """
+    if self.IndexOffset is None:
+      for Number in xrange(self.Count):
+	if self.GetName(Number) == name:
+	  return self.GetRecord(Number)
+      return None
+
+    Low, High = 0, self.Count
+    while Low < High:
+      Middle = (Low + High) // 2
+      Number = _INDEX.unpack_from(self.Map, self.IndexOffset + Middle * _INDEX.size)[0]
+      if self.GetName(Number) < name:
+	Low = Middle + 1
+      else:
+	High = Middle
+
+    if Low < self.Count:
+      Number = _INDEX.unpack_from(self.Map, self.IndexOffset + Low * _INDEX.size)[0]
+      if self.GetName(Number) == name:
+	return self.GetRecord(Number)
+    return None
+
+
+def ReadBinarySet(filename):
+  """ Returns the list of (NameString, Args, Help, ArgList) records of a binary set """
+  Set = BinarySet(filename)
+  try:
+    return list(Set)
+  finally:
+    Set.Close()
+
+
+def WriteSet(filename, records):
+  """ Write the records in a binary or text file according to the file extension """
+  if filename.endswith(BINARY_SET_EXTENSION):
+    WriteBinarySet(filename, records)
+  else:
+    WriteTextSet(filename, records)
+
+
+def ConvertSetFile(source, destination):
+  """ Convert a text set of commands into a binary one or the reverse.
+      The format written depends on the extension of the destination """
+  from parser import CmdParser
+  from registry import CommandRegistry
+
+  Registry = CommandRegistry()
+  CmdParser().CmdParse(source, 'List', Registry)
+  WriteSet(destination, Registry)
+  return len(Registry)
+
+
+if __name__ == "__main__":
+
+  if len(sys.argv) != 3:
+    print "Usage: python setfile.py source.set destination.bset"
+    print "       python setfile.py source.bset destination.set"
+    sys.exit(2)
+
+  print str(ConvertSetFile(sys.argv[1], sys.argv[2])) + " commands converted"
@@ -0,0 +1,412 @@
+##############################################################################
+#
+# Command line interface manager (CLIManager) for FreeRTOS+CLI
+# File: transport.py
+# This file contains the connection engine: non-blocking UDP and TCP transports
+# delivering their events to a protocol object, driven by an event loop. The
+# loop is either a select() loop (headless use) or the GObject main loop (GUI).
+#
+# This software is released under the MIT licence
+#
+# Copyright (c) 2015 Jean-Baptiste Quelard
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+###############################################################################
+#!/usr/bin/python
+#
+# The design follows the protocols and transports of asyncio, which is not
+# available in Python 2: a transport calls ConnectionMade, DataReceived,
+# ErrorReceived and ConnectionLost on its protocol, and no call ever blocks.
+
+import os
+import time
+import heapq
+import errno
+import select
+import socket
+
+
+RECEIVE_BUFFER_SIZE = 256 << 10	# Buffer the data is read into, one per loop
+MAX_DATAGRAM_SIZE = 64 << 10	# Room kept in the buffer for a datagram, never truncated
+MAX_DRAIN_SIZE = 4 << 20	# Bytes read at most per wakeup, the loop must stay responsive
+
+_RETRY_ERRORS = (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR)
+
+
+def GetReceiveView(loop):
+  """ Buffer the transports of a loop read into. The loop runs them one at a
+      time and they copy the data they deliver, so they can share it """
+  if loop.ReceiveView is None:
+    loop.ReceiveView = memoryview(bytearray(RECEIVE_BUFFER_SIZE))
+  return loop.ReceiveView
+
+
+class Timer:
+  """ Call scheduled by CallLater """
+
+  def __init__(self, deadline, callback, args):
+    self.Deadline = deadline
+    self.Callback = callback
+    self.Args = args
+    self.Cancelled = False
+
+
+  def Cancel(self):
+    self.Cancelled = True
+
+
+  def Fire(self):
+    if not self.Cancelled:
+      self.Cancelled = True # Fired once
+      self.Callback(*self.Args)
+
+
+class SelectLoop:
+  """ Event loop based on select(), independent from Gtk """
+
+  def __init__(self):
+    self.Readers = {}	# File descriptor -> callback
+    self.Writers = {}
+    self.Timers = []	# Heap of (deadline, sequence number, timer)
+    self.Sequence = 0
+    self.Stopping = False	# Stop requested, kept until Run returns
+    self.ReceiveView = None	# Buffer shared by the transports, see GetReceiveView
+
+
+  def Time(self):
+    return time.time()
+
+
+  def AddReader(self, fd, callback):
+    self.Readers[fd] = callback
+
+
+  def RemoveReader(self, fd):
+    self.Readers.pop(fd, None)
+
+
+  def AddWriter(self, fd, callback):
+    self.Writers[fd] = callback
+
+
+  def RemoveWriter(self, fd):
+    self.Writers.pop(fd, None)
+
+
+  def CallLater(self, delay, callback, *args):
+    """ Call the callback after the delay (s). Returns a timer which can be cancelled """
+    Entry = Timer(self.Time() + delay, callback, args)
+    self.Sequence += 1
+    heapq.heappush(self.Timers, (Entry.Deadline, self.Sequence, Entry))
+    return Entry
+
+
+  def RunOnce(self, timeout=None):
+    """ Wait for the events for at most the timeout (s) and dispatch them """
+    while self.Timers and self.Timers[0][2].Cancelled:
+      heapq.heappop(self.Timers)
+    if self.Timers:
+      Delay = max(self.Timers[0][0] - self.Time(), 0)
+      if timeout is None or Delay < timeout:
+	timeout = Delay
+
+    if self.Readers or self.Writers:
+      try:
+	Readable, Writable, Errors = select.select(list(self.Readers), list(self.Writers), [], timeout)
+      except select.error, Error:
+	if Error.args[0] != errno.EINTR:
+	  raise
+	Readable, Writable = [], []
+      for Fd in Readable:
+	Callback = self.Readers.get(Fd)
+	if Callback is not None:  # May have been removed by a previous callback
+	  Callback()
+      for Fd in Writable:
+	Callback = self.Writers.get(Fd)
+	if Callback is not None:
+	  Callback()
+    elif timeout is not None:
+      time.sleep(timeout)
+
+    Now = self.Time()
+    while self.Timers and self.Timers[0][0] <= Now:
+      heapq.heappop(self.Timers)[2].Fire()
+
+
+  def Run(self):
+    """ Dispatch the events until Stop is called, before or while running """
+    try:
+      while not self.Stopping:
+	self.RunOnce()
+    finally:
+      self.Stopping = False
+
+
+  def Stop(self):
+    self.Stopping = True
+
+
+class GObjectLoop:
+  """ Same interface, the events are dispatched by the GObject main loop run by Gtk """
+
+  def __init__(self):
+    from gi.repository import GObject
+    self.GObject = GObject
+    self.Readers = {}	# File descriptor -> source id
+    self.Writers = {}
+    self.ReceiveView = None	# Buffer shared by the transports, see GetReceiveView
+
+
+  def Time(self):
+    return time.time()
+
+
+  def Dispatch(self, source, condition, callback):
+    callback()
+    return True
+
+
+  def AddReader(self, fd, callback):
+    self.RemoveReader(fd)
+    self.Readers[fd] = self.GObject.io_add_watch(fd, self.GObject.IO_IN | self.GObject.IO_HUP | \
+						 self.GObject.IO_ERR, self.Dispatch, callback)
+
+
+  def RemoveReader(self, fd):
+    if fd in self.Readers:
+      self.GObject.source_remove(self.Readers.pop(fd))
+
+
+  def AddWriter(self, fd, callback):
+    self.RemoveWriter(fd)
+    self.Writers[fd] = self.GObject.io_add_watch(fd, self.GObject.IO_OUT | self.GObject.IO_HUP | \
+						 self.GObject.IO_ERR, self.Dispatch, callback)
+
+
+  def RemoveWriter(self, fd):
+    if fd in self.Writers:
+      self.GObject.source_remove(self.Writers.pop(fd))
+
+
+  def CallLater(self, delay, callback, *args):
+    Entry = Timer(self.Time() + delay, callback, args)
+    self.GObject.timeout_add(int(delay * 1000), self.FireTimer, Entry)
+    return Entry
+
+
+  def FireTimer(self, timer):
+    timer.Fire()
+    return False  # Single shot
+
+
+class Protocol:
+  """ Receives the events of a transport. To be derived """
+
+  def ConnectionMade(self, transport):
+    pass
+
+
+  def DataReceived(self, data):
+    pass
+
+
+  def ErrorReceived(self, error):
+    """ An error which doesn't close the transport (datagrams) """
+    pass
+
+
+  def ConnectionLost(self, error):
+    """ The transport is closed. error is None when closed locally or by the peer """
+    pass
+
+
+class Transport:
+  """ Non-blocking socket registered in a loop. Each wakeup drains the socket
+      into a reusable buffer and delivers what was read in one call """
+
+  Reserve = 1	# Room needed in the buffer before reading
+  Stream = True	# An empty read is the end of the stream
+
+  def __init__(self, loop, protocol, address, sock, rcvbuf=None):
+    self.Loop = loop
+    self.Protocol = protocol
+    self.Address = address
+    self.Socket = sock
+    self.Socket.setblocking(False)
+    if rcvbuf:
+      self.Socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf)
+    self.Fd = self.Socket.fileno()
+    self.Connected = False
+    self.Closed = False
+
+    self.View = GetReceiveView(loop)
+
+
+  def fileno(self):
+    return self.Fd
+
+
+  def IsConnected(self):
+    return self.Connected and not self.Closed
+
+
+  def Close(self, error=None):
+    """ Close the socket, the protocol is notified """
+    if self.Closed:
+      return
+    self.Closed = True
+    self.Loop.RemoveReader(self.Fd)
+    self.Loop.RemoveWriter(self.Fd)
+    self.Socket.close()
+    self.Protocol.ConnectionLost(error)
+
+
+  def MakeConnection(self):
+    if not self.Closed:
+      self.Connected = True
+      self.Loop.AddReader(self.Fd, self.OnReadable)
+      self.Protocol.ConnectionMade(self)
+
+
+  def OnReadable(self):
+    """ Read until EAGAIN: a burst of datagrams or segments costs one wakeup
+	and one call of the protocol, not one per packet """
+    Size = 0
+    Total = 0
+    Error = None
+    EndOfStream = False
+    while Total < MAX_DRAIN_SIZE:
+      if len(self.View) - Size < self.Reserve:
+	self.Protocol.DataReceived(self.View[:Size].tobytes())
+	Size = 0
+	if self.Closed:
+	  return  # Closed by the protocol
+      try:
+	Read = self.Socket.recv_into(self.View[Size:])
+      except socket.error, Error:
+	if Error.args[0] in _RETRY_ERRORS:
+	  Error = None
+	else:
+	  Error = "Socket error: " + os.strerror(Error.args[0])
+	break
+      if Read == 0 and self.Stream:
+	EndOfStream = True
+	break
+      Size += Read
+      Total += Read or 1  # Empty datagrams count, a flood of them must end too
+
+    if Size:
+      self.Protocol.DataReceived(self.View[:Size].tobytes())
+    if self.Closed:
+      return
+    if EndOfStream:
+      self.Close()	# Closed by the device
+    elif Error is not None:
+      self.ReadFailed(Error)
+
+
+class DatagramTransport(Transport):
+  """ UDP transport, the datagrams are sent to the address and received from anyone """
+
+  Reserve = MAX_DATAGRAM_SIZE
+  Stream = False  # Empty datagrams are valid
+
+  def __init__(self, loop, protocol, address, rcvbuf=None):
+    Transport.__init__(self, loop, protocol, address, socket.socket(socket.AF_INET, socket.SOCK_DGRAM), \
+		       rcvbuf)
+    self.Loop.CallLater(0, self.MakeConnection)	# As for TCP, never from the constructor
+
+
+  def Write(self, data):
+    try:
+      self.Socket.sendto(data, self.Address)
+    except socket.error, Error:
+      if Error.args[0] not in _RETRY_ERRORS:
+	self.Protocol.ErrorReceived("Socket error: " + os.strerror(Error.args[0]))
+      # Else the datagram is lost, as it would be on the network
+
+
+  def ReadFailed(self, error):
+    self.Protocol.ErrorReceived(error)  # The next datagrams may be received
+
+
+class StreamTransport(Transport):
+  """ TCP transport. The connection is established in the background, the data
+      written meanwhile is sent once connected """
+
+  def __init__(self, loop, protocol, address, rcvbuf=None):
+    Transport.__init__(self, loop, protocol, address, socket.socket(socket.AF_INET, socket.SOCK_STREAM), \
+		       rcvbuf)
+    self.OutBuffer = ""
+    # Commands are small writes waiting for a response: don't let Nagle hold them
+    self.Socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    Error = self.Socket.connect_ex(address)
+    if Error not in (0, errno.EINPROGRESS, errno.EWOULDBLOCK):
+      self.Socket.close()
+      raise socket.error(Error, os.strerror(Error))
+    self.Loop.AddWriter(self.Fd, self.OnWritable)	# Writable once connected
+
+
+  def Write(self, data):
+    self.OutBuffer += data
+    if self.Connected:
+      self.Flush()
+
+
+  def Flush(self):
+    """ Send what the socket accepts, the rest is sent when it becomes writable """
+    while self.OutBuffer:
+      try:
+	Sent = self.Socket.send(self.OutBuffer)
+      except socket.error, Error:
+	if Error.args[0] in _RETRY_ERRORS:
+	  break
+	self.Close("Socket error: " + os.strerror(Error.args[0]))
+	return
+      self.OutBuffer = self.OutBuffer[Sent:]
+
+    if self.OutBuffer:
+      self.Loop.AddWriter(self.Fd, self.OnWritable)
+    else:
+      self.Loop.RemoveWriter(self.Fd)
+
+
+  def OnWritable(self):
+    if not self.Connected:
+      Error = self.Socket.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+      if Error != 0:
+	self.Close("Socket error: " + os.strerror(Error))
+	return
+      self.MakeConnection()
+    self.Flush()
+
+
+  def ReadFailed(self, error):
+    self.Close(error)
+
+
+def OpenTransport(loop, protocol, connectiontype, address, port, rcvbuf=None):
+  """ Create the UDP or TCP transport of a connection. rcvbuf is the size of the
+      socket receive buffer (SO_RCVBUF), the system default when not given """
+  if connectiontype == "UDP":
+    return DatagramTransport(loop, protocol, (address, int(port)), rcvbuf)
+  elif connectiontype == "TCP":
+    return StreamTransport(loop, protocol, (address, int(port)), rcvbuf)
+  raise ValueError("Unknown connection type: " + str(connectiontype))
@@ -0,0 +1,231 @@
+##############################################################################
+#
+# Command line interface manager (CLIManager) for FreeRTOS+CLI
+# File: watcher.py
+# This file contains the watcher of the imported source files. The changes are
+# notified by inotify on Linux, the files are polled elsewhere. It is
+# independent from Gtk.
+#
+# This software is released under the MIT licence
+#
+# Copyright (c) 2015 Jean-Baptiste Quelard
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+###############################################################################
+#!/usr/bin/python
+
+import os
+import errno
+import struct
+import ctypes
+import ctypes.util
+
+from parser import ExpandSourcePaths, SOURCE_EXTENSIONS
+
+
+# inotify flags, from <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0x00000800
+IN_CLOEXEC = 0x00080000
+
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+EVENTS_BUFFER_SIZE = 64 << 10
+
+_EVENT = struct.Struct("iIII")	# Watch descriptor, mask, cookie, length of the name
+
+
+class Inotify:
+  """ Minimal binding of the Linux inotify API. Raises OSError when not available """
+
+  def __init__(self):
+    self.Libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+    if not hasattr(self.Libc, "inotify_init1"):
+      raise OSError(errno.ENOSYS, "inotify is not available")
+
+    self.Fd = self.Libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+    if self.Fd < 0:
+      Errno = ctypes.get_errno()
+      raise OSError(Errno, os.strerror(Errno))
+    self.Watches = {}	# Watch descriptor -> directory
+
+
+  def fileno(self):
+    return self.Fd
+
+
+  def AddWatch(self, directory):
+    Wd = self.Libc.inotify_add_watch(self.Fd, directory, WATCH_MASK)
+    if Wd < 0:
+      Errno = ctypes.get_errno()
+      raise OSError(Errno, os.strerror(Errno), directory)
+    self.Watches[Wd] = directory
+
+
+  def ReadEvents(self):
+    """ Returns the list of (path, mask) events pending. Never blocks """
+    Events = []
+    while True:
+      try:
+	Buffer = os.read(self.Fd, EVENTS_BUFFER_SIZE)
+      except OSError, Error:
+	if Error.errno == errno.EAGAIN:
+	  return Events
+	raise
+
+      Offset = 0
+      while Offset < len(Buffer):
+	Wd, Mask, Cookie, Length = _EVENT.unpack_from(Buffer, Offset)
+	Offset += _EVENT.size
+	Name = Buffer[Offset:Offset + Length].rstrip("\0")
+	Offset += Length
+
+	Directory = self.Watches.get(Wd)
+	if Mask & IN_IGNORED:
+	  self.Watches.pop(Wd, None)  # Directory removed
+	elif Mask & IN_Q_OVERFLOW:
+	  Events.append((None, Mask))
+	elif Directory is not None:
+	  Events.append((os.path.join(Directory, Name), Mask))
+
+
+  def Close(self):
+    os.close(self.Fd)
+
+
+class SourceWatcher:
+  """ Watch imported files and directories. A directory is watched with all its
+      subdirectories, the source files created in it are reported too """
+
+  def __init__(self, paths, polling=False):
+    self.Files = set()	# Files imported one by one
+    self.Roots = []	# Directories imported
+    for Path in paths:
+      Path = os.path.abspath(Path)
+      if os.path.isdir(Path):
+	self.Roots.append(Path)
+      else:
+	self.Files.add(Path)
+
+    self.Notifier = None
+    if not polling:
+      try:
+	self.Notifier = Inotify()
+      except (OSError, AttributeError):
+	pass  # Polled
+
+    if self.Notifier is not None:
+      for Directory in set([os.path.dirname(Filename) for Filename in self.Files]):
+	self.WatchDirectory(Directory, False)
+      for Root in self.Roots:
+	self.WatchDirectory(Root, True)
+    else:
+      self.Stats = self.StatFiles()
+
+
+  def IsPolling(self):
+    """ Tells if the files must be polled: GetChanges should be called periodically.
+	Otherwise it is called when fileno() becomes readable """
+    return self.Notifier is None
+
+
+  def fileno(self):
+    return self.Notifier.fileno()
+
+
+  def Close(self):
+    if self.Notifier is not None:
+      self.Notifier.Close()
+
+
+  def IsWatched(self, filename):
+    """ Tells if the file is one of the watched files """
+    if filename in self.Files:
+      return True
+    if not filename.endswith(SOURCE_EXTENSIONS):
+      return False
+    for Root in self.Roots:
+      if filename.startswith(Root + os.sep):
+	return True
+    return False
+
+
+  def WatchDirectory(self, directory, recursive):
+    """ Add an inotify watch on a directory. Returns the watched files found in it """
+    Filenames = []
+    try:
+      self.Notifier.AddWatch(directory)
+    except OSError:
+      return Filenames	# Already removed
+
+    if recursive:
+      for Name in os.listdir(directory):
+	Path = os.path.join(directory, Name)
+	if os.path.isdir(Path):
+	  Filenames.extend(self.WatchDirectory(Path, True))
+	elif self.IsWatched(Path):
+	  Filenames.append(Path)
+    return Filenames
+
+
+  def StatFiles(self):
+    """ Returns the (mtime, size) of each watched file, for the polling """
+    Stats = {}
+    for Filename in ExpandSourcePaths(list(self.Files) + self.Roots):
+      try:
+	Stat = os.stat(Filename)
+      except OSError:
+	continue
+      Stats[Filename] = (Stat.st_mtime, Stat.st_size)
+    return Stats
+
+
+  def GetChanges(self):
+    """ Returns the sorted list of the files modified, created or removed since
+	the previous call """
+    Changed = set()
+
+    if self.Notifier is None:
+      Stats = self.StatFiles()
+      for Filename in set(Stats) | set(self.Stats):
+	if Stats.get(Filename) != self.Stats.get(Filename):
+	  Changed.add(Filename)
+      self.Stats = Stats
+      return sorted(Changed)
+
+    for Path, Mask in self.Notifier.ReadEvents():
+      if Path is None:
+	# Events lost, every existing file is reported
+	Changed.update(ExpandSourcePaths(list(self.Files) + self.Roots))
+      elif Mask & IN_ISDIR:
+	if Mask & (IN_CREATE | IN_MOVED_TO) and \
+	   [Root for Root in self.Roots if Path.startswith(Root + os.sep)]:
+	  # New subdirectory, its files may be created before the watch is added
+	  Changed.update(self.WatchDirectory(Path, True))
+      elif self.IsWatched(Path):
+	Changed.add(Path)
+
+    return sorted(Changed)
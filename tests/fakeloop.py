@@ -0,0 +1,92 @@
+##############################################################################
+#
+# Command line interface manager (CLIManager) for FreeRTOS+CLI
+# File: fakeloop.py
+# This file contains the event loop of the tests: the time only moves when a
+# test says so and the timers are fired in order.
+#
+# This software is released under the MIT licence
+#
+# Copyright (c) 2015 Jean-Baptiste Quelard
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+###############################################################################
+#!/usr/bin/python
+
+import heapq
+
+
+class FakeTimer:
+
+  def __init__(self, deadline, callback, args):
+    self.Deadline = deadline
+    self.Callback = callback
+    self.Args = args
+    self.Cancelled = False
+
+
+  def Cancel(self):
+    self.Cancelled = True
+
+
+class FakeLoop:
+  """ Same interface as transport.SelectLoop for the timers, without sockets """
+
+  def __init__(self):
+    self.Now = 0.0
+    self.Timers = []	# Heap of (deadline, sequence number, timer)
+    self.Sequence = 0
+
+
+  def Time(self):
+    return self.Now
+
+
+  def CallLater(self, delay, callback, *args):
+    Timer = FakeTimer(self.Now + delay, callback, args)
+    self.Sequence += 1
+    heapq.heappush(self.Timers, (Timer.Deadline, self.Sequence, Timer))
+    return Timer
+
+
+  def FireNext(self, end=None):
+    """ Fire the next timer due before the end. Returns False if there is none """
+    while self.Timers and self.Timers[0][2].Cancelled:
+      heapq.heappop(self.Timers)
+    if not self.Timers or (end is not None and self.Timers[0][0] > end):
+      return False
+    Deadline, Sequence, Timer = heapq.heappop(self.Timers)
+    self.Now = max(self.Now, Deadline)
+    Timer.Cancelled = True
+    Timer.Callback(*Timer.Args)
+    return True
+
+
+  def Advance(self, delay):
+    """ Move the time, the timers due meanwhile are fired """
+    End = self.Now + delay
+    while self.FireNext(End):
+      pass
+    self.Now = End
+
+
+  def RunUntilIdle(self):
+    """ Fire the timers until there is none left """
+    while self.FireNext():
+      pass
@@ -0,0 +1,151 @@
+##############################################################################
+#
+# Command line interface manager (CLIManager) for FreeRTOS+CLI
+# File: test_emulator.py
+# This file contains the tests of the device emulator: commands split over
+# TCP segments, or sent without end, large responses and the UDP clients
+# remembered.
+#
+# This software is released under the MIT licence
+#
+# Copyright (c) 2015 Jean-Baptiste Quelard
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+###############################################################################
+#!/usr/bin/python
+#
+# Run with: python -m unittest discover tests
+
+
+import os
+import sys
+import socket
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from emulator import DeviceEmulator, Channel, HELP_HELP, CHANNEL_LIMIT
+from registry import CommandRegistry
+from transport import SelectLoop
+
+TERMINATOR = "\r\n> "
+
+
+class EmulatorTest(unittest.TestCase):
+
+  def setUp(self):
+    self.Loop = SelectLoop()
+    self.Client = None
+
+
+  def tearDown(self):
+    if self.Client is not None:
+      self.Client.close()
+    self.Emulator.Close()
+
+
+  def Start(self, commandend="", size=0):
+    self.Emulator = DeviceEmulator(self.Loop, CommandRegistry(), size, terminator=TERMINATOR, \
+				   commandend=commandend)
+    Port = self.Emulator.ListenTCP("127.0.0.1", 0)
+    self.Client = socket.create_connection(("127.0.0.1", Port))
+    self.RunFor(0.01)
+
+
+  def RunFor(self, duration):
+    Timer = self.Loop.CallLater(duration, self.Loop.Stop)
+    self.Loop.Run()
+    Timer.Cancel()
+
+
+  def Read(self, size):
+    """ What the client received, once the emulator has sent size bytes """
+    Data = []
+    Received = 0
+    self.Client.settimeout(0)
+    for Attempt in range(1000):
+      self.RunFor(0.001)
+      try:
+	Chunk = self.Client.recv(1 << 20)
+      except socket.error:
+	continue
+      Data.append(Chunk)
+      Received += len(Chunk)
+      if Received >= size:
+	break
+    self.RunFor(0.1)	# Anything more would come now
+    try:
+      Data.append(self.Client.recv(1 << 20))
+    except socket.error:
+      pass
+    return "".join(Data)
+
+
+  def testLineSplitOverSegments(self):
+    self.Start("\n")
+    self.Client.sendall("he")
+    self.RunFor(0.01)
+    self.Client.sendall("lp\n")
+    self.assertEqual(self.Read(len(HELP_HELP + TERMINATOR)), HELP_HELP + TERMINATOR)
+    self.assertEqual(self.Emulator.Stats.Commands, 1)
+
+
+  def testWithoutCommandEnd(self):
+    # As the CLI sends the commands by default: answered at once
+    self.Start()
+    self.Client.sendall("help")
+    self.RunFor(0.01)
+    self.assertEqual(self.Emulator.Stats.Commands, 1)
+    self.Client.sendall("help\r\nhelp\n")
+    Expected = (HELP_HELP + TERMINATOR) * 3
+    self.assertEqual(self.Read(len(Expected)), Expected)
+
+
+  def testCommandEndSplitOverSegments(self):
+    self.Start("\r\n")
+    self.Client.sendall("help\r")
+    self.RunFor(0.1)
+    self.assertEqual(self.Emulator.Stats.Commands, 0)
+    self.Client.sendall("\nhelp\r\n")
+    Expected = (HELP_HELP + TERMINATOR) * 2
+    self.assertEqual(self.Read(len(Expected)), Expected)
+
+
+  def testLargeResponse(self):
+    self.Start("\n", 8 << 20)
+    self.Client.sendall("help\nhelp\n")
+    Data = self.Read(2 * ((8 << 20) + len(TERMINATOR)))
+    self.assertEqual(len(Data), 2 * ((8 << 20) + len(TERMINATOR)))
+    self.assertTrue(Data.startswith(HELP_HELP))
+
+
+  def testIdleUDPClientsForgotten(self):
+    self.Emulator = DeviceEmulator(self.Loop, CommandRegistry())
+    self.Emulator.ListenUDP("127.0.0.1", 0)
+    Server = self.Emulator.Servers[0]
+    Now = self.Loop.Time()
+    for Number in range(CHANNEL_LIMIT):
+      Server.Channels[("127.0.0.1", Number)] = Channel(None)
+      Server.Channels[("127.0.0.1", Number)].Ready = Now + (10 if Number < 3 else -1)
+    Server.ForgetIdleChannels()
+    self.assertEqual(sorted(Server.Channels), [("127.0.0.1", Number) for Number in range(3)])
+
+
+if __name__ == "__main__":
+  unittest.main()
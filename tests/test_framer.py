@@ -0,0 +1,104 @@
+##############################################################################
+#
+# Command line interface manager (CLIManager) for FreeRTOS+CLI
+# File: test_framer.py
+# This file contains the tests of the response framer: terminators split
+# over chunks and many responses received in a single chunk.
+#
+# This software is released under the MIT licence
+#
+# Copyright (c) 2015 Jean-Baptiste Quelard
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+###############################################################################
+#!/usr/bin/python
+#
+# Run with: python -m unittest discover tests
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from framer import ResponseFramer
+from fakeloop import FakeLoop
+
+
+class ResponseFramerTest(unittest.TestCase):
+
+  def setUp(self):
+    self.Loop = FakeLoop()
+    self.Responses = []
+
+
+  def MakeFramer(self, terminator):
+    return ResponseFramer(self.Loop, self.Responses.append, terminator, idle=0.1, timeout=1.0)
+
+
+  def testTerminatorInChunk(self):
+    Framer = self.MakeFramer("\r\n> ")
+    Framer.Start("task-stats")
+    Framer.Feed("line 1\r\nline 2\r\n> ")
+    self.assertEqual(len(self.Responses), 1)
+    self.assertEqual(self.Responses[0].Command, "task-stats")
+    self.assertEqual(self.Responses[0].GetData(), "line 1\r\nline 2")
+    self.assertEqual(self.Responses[0].End, "terminator")
+
+
+  def testTerminatorSplitOverChunks(self):
+    Framer = self.MakeFramer("\r\n> ")
+    Framer.Start("ping")
+    for Chunk in ["pong\r", "\n", "> next"]:
+      Framer.Feed(Chunk)
+    self.assertEqual([Response.GetData() for Response in self.Responses], ["pong"])
+    self.Loop.Advance(0.2)  # "next" ends on the idle gap
+    self.assertEqual([Response.GetData() for Response in self.Responses], ["pong", "next"])
+    self.assertEqual(self.Responses[1].End, "idle")
+
+
+  def testManyResponsesInOneChunk(self):
+    Framer = self.MakeFramer("\n")
+    Framer.Feed("x\n" * 5000)
+    self.assertEqual(len(self.Responses), 5000)
+    self.assertTrue(all(Response.GetData() == "x" for Response in self.Responses))
+
+
+  def testIdleGapWithoutTerminator(self):
+    Framer = self.MakeFramer("")
+    Framer.Start("dir")
+    Framer.Feed("a")
+    self.Loop.Advance(0.05)
+    Framer.Feed("b")
+    self.assertEqual(self.Responses, [])
+    self.Loop.Advance(0.1)
+    self.assertEqual(self.Responses[0].GetData(), "ab")
+    self.assertEqual(self.Responses[0].End, "idle")
+
+
+  def testTimeoutWithoutData(self):
+    Framer = self.MakeFramer("\n")
+    Framer.Start("query-heap")
+    self.Loop.Advance(1.0)
+    self.assertEqual(self.Responses[0].End, "timeout")
+    self.assertEqual(self.Responses[0].Size, 0)
+
+
+if __name__ == "__main__":
+  unittest.main()
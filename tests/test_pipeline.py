@@ -0,0 +1,216 @@
+##############################################################################
+#
+# Command line interface manager (CLIManager) for FreeRTOS+CLI
+# File: test_pipeline.py
+# This file contains the tests of the command queue over a lossy link: lost
+# commands and responses, retransmissions with their backoff, late copies of
+# the responses and commands answering the same.
+#
+# This software is released under the MIT licence
+#
+# Copyright (c) 2015 Jean-Baptiste Quelard
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+###############################################################################
+#!/usr/bin/python
+#
+# Run with: python -m unittest discover tests
+
+import os
+import sys
+import random
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from pipeline import CommandQueue, MAX_RETRY_TIMEOUT
+from fakeloop import FakeLoop
+
+TERMINATOR = "\r\n> "
+
+
+class CommandQueueTest(unittest.TestCase):
+
+  def setUp(self):
+    self.Loop = FakeLoop()
+    self.Written = []	# (time, command)
+    self.Responses = []
+
+
+  def MakeQueue(self, retries=0, timeout=1.0, depth=1):
+    return CommandQueue(self.Loop, self.Write, self.Responses.append, TERMINATOR, 0.1, timeout, depth, \
+			"", retries)
+
+
+  def Write(self, data):
+    self.Written.append((self.Loop.Time(), data))
+
+
+  def Commands(self):
+    return [Command for Time, Command in self.Written]
+
+
+  def Answers(self):
+    return [(Response.Command, Response.GetData()) for Response in self.Responses]
+
+
+  def testResponsesInOrder(self):
+    Queue = self.MakeQueue()
+    Queue.Send("task-stats")
+    Queue.Send("query-heap")
+    self.assertEqual(self.Commands(), ["task-stats"])
+    Queue.Feed("tasks" + TERMINATOR + "heap" + TERMINATOR)
+    self.assertEqual(self.Commands(), ["task-stats", "query-heap"])
+    self.assertEqual(self.Answers(), [("task-stats", "tasks"), ("query-heap", "heap")])
+
+
+  def testLostCommandRetransmittedWithBackoff(self):
+    Queue = self.MakeQueue(retries=2, timeout=1.0)
+    Queue.Send("ping")
+    self.Loop.Advance(10.0)
+    self.assertEqual(self.Written, [(0.0, "ping"), (1.0, "ping"), (3.0, "ping")])
+    self.assertEqual(len(self.Responses), 1)
+    self.assertEqual(self.Responses[0].Size, 0)
+    self.assertEqual(self.Responses[0].Attempts, 3)
+    self.assertEqual((Queue.Stats.Retransmitted, Queue.Stats.Lost), (2, 1))
+
+
+  def testBackoffIsCapped(self):
+    Queue = self.MakeQueue(retries=3, timeout=4.0)
+    Queue.Send("dir")
+    self.Loop.Advance(100.0)
+    Times = [Time for Time, Command in self.Written]
+    self.assertEqual(Times, [0.0, 4.0, 12.0, 12.0 + MAX_RETRY_TIMEOUT])
+
+
+  def testAnsweredAfterRetransmission(self):
+    Queue = self.MakeQueue(retries=3, timeout=1.0)
+    Queue.Send("ping")
+    self.Loop.Advance(1.2)
+    Queue.Feed("pong" + TERMINATOR)
+    self.assertEqual(self.Answers(), [("ping", "pong")])
+    self.assertEqual(self.Responses[0].Attempts, 2)
+    self.assertEqual(Queue.Stats.Lost, 0)
+
+
+  def testLateCopyDropped(self):
+    Queue = self.MakeQueue(retries=3, timeout=1.0)
+    Queue.Send("cmd a")
+    Queue.Send("cmd b")
+    self.Loop.Advance(1.5)	# "cmd a" sent again at 1.0
+    Queue.Feed("resp a" + TERMINATOR)
+    self.assertEqual(self.Answers(), [("cmd a", "resp a")])
+    self.assertEqual(self.Commands(), ["cmd a", "cmd a"])  # "cmd b" held for the copy
+    self.Loop.Advance(0.1)
+    Queue.Feed("resp a" + TERMINATOR)	# Answer to the other attempt
+    self.assertEqual(Queue.Stats.Duplicates, 1)
+    self.assertEqual(self.Commands(), ["cmd a", "cmd a", "cmd b"])  # Sent once the copy came
+    Queue.Feed("resp b" + TERMINATOR)
+    self.assertEqual(self.Answers(), [("cmd a", "resp a"), ("cmd b", "resp b")])
+
+
+  def testIdenticalReplyWithoutCopy(self):
+    # The first "set a 1" was lost, its copy never comes
+    Queue = self.MakeQueue(retries=3, timeout=1.0)
+    Queue.Send("set a 1")
+    Queue.Send("set b 2")
+    self.Loop.Advance(1.1)
+    Queue.Feed("OK" + TERMINATOR)
+    # "set b 2" is sent once the copy can't come anymore: twice the timeout of
+    # the last attempt after it, at 1.0 + 2 * 2.0
+    self.Loop.Advance(3.8)
+    self.assertEqual(self.Commands(), ["set a 1", "set a 1"])
+    self.Loop.Advance(0.2)
+    self.assertEqual(self.Commands(), ["set a 1", "set a 1", "set b 2"])
+    Queue.Feed("OK" + TERMINATOR)
+    self.Loop.Advance(10.0)
+    self.assertEqual(self.Answers(), [("set a 1", "OK"), ("set b 2", "OK")])
+    self.assertEqual(self.Commands().count("set b 2"), 1)
+    self.assertEqual((Queue.Stats.Duplicates, Queue.Stats.Lost), (0, 0))
+
+
+  def testIdenticalReplyAfterCopy(self):
+    Queue = self.MakeQueue(retries=3, timeout=1.0)
+    Queue.Send("set a 1")
+    Queue.Send("set b 2")
+    self.Loop.Advance(1.1)
+    Queue.Feed("OK" + TERMINATOR)
+    Queue.Feed("OK" + TERMINATOR)  # Copy: the response to the first "set a 1"
+    self.assertEqual(self.Commands(), ["set a 1", "set a 1", "set b 2"])
+    Queue.Feed("OK" + TERMINATOR)
+    self.Loop.Advance(10.0)
+    self.assertEqual(self.Answers(), [("set a 1", "OK"), ("set b 2", "OK")])
+    self.assertEqual(self.Commands().count("set b 2"), 1)
+    self.assertEqual((Queue.Stats.Duplicates, Queue.Stats.Lost), (1, 0))
+
+
+  def Simulate(self, seed, reply, loss, latency, jitter, count=50, retries=3, timeout=0.05):
+    """ Device dropping the commands and the responses at the loss rate and
+	answering after the latency and jitter. Returns the queue and the
+	number of times each command was executed """
+    Random = random.Random(seed)
+    Executed = {}
+    Queue = None
+
+    def Answer(command):
+      if Random.random() >= loss:
+	Queue.Feed(reply(command) + TERMINATOR)
+
+    def Receive(data):
+      if Random.random() < loss:
+	return	# Command lost
+      Executed[data] = Executed.get(data, 0) + 1
+      self.Loop.CallLater(latency + Random.uniform(0, jitter), Answer, data)
+
+    Queue = CommandQueue(self.Loop, Receive, self.Responses.append, TERMINATOR, 0.1, timeout, 1, "", retries)
+    for Number in range(count):
+      Queue.Send("cmd %d" % Number)
+    self.Loop.RunUntilIdle()
+    return Queue, Executed
+
+
+  def testLossyLinkUniqueReplies(self):
+    for Seed in range(20):
+      del self.Responses[:]
+      Queue, Executed = self.Simulate(Seed, lambda Command: "resp:" + Command, 0.2, 0.01, 0.08)
+      Answered = [Response for Response in self.Responses if Response.Command is not None]
+      self.assertEqual([Response.Command for Response in Answered], ["cmd %d" % Number for Number in range(50)])
+      for Response in Answered:
+	self.assertTrue(Response.Size == 0 or Response.GetData() == "resp:" + Response.Command)
+
+
+  def testLossyLinkIdenticalReplies(self):
+    # No late copies: a command is only sent again when an attempt was lost,
+    # and only reported lost when all of them were
+    for Seed in range(20):
+      del self.Responses[:]
+      Queue, Executed = self.Simulate(Seed, lambda Command: "OK", 0.2, 0.01, 0.02)
+      Answered = [Response for Response in self.Responses if Response.Command is not None]
+      self.assertEqual(len(Answered), 50)
+      self.assertEqual(Queue.Stats.Duplicates, 0)
+      for Response in Answered:
+	if Response.Size == 0:
+	  self.assertEqual(Response.Attempts, 4)
+	else:
+	  self.assertEqual(Response.GetData(), "OK")
+	self.assertTrue(Executed.get(Response.Command, 0) <= Response.Attempts)
+
+
+if __name__ == "__main__":
+  unittest.main()
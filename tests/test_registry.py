@@ -0,0 +1,92 @@
+##############################################################################
+#
+# Command line interface manager (CLIManager) for FreeRTOS+CLI
+# File: test_registry.py
+# This file contains the tests of the command registry: the sources parsed
+# again in watch mode, with commands defined by several files.
+#
+# This software is released under the MIT licence
+#
+# Copyright (c) 2015 Jean-Baptiste Quelard
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+###############################################################################
+#!/usr/bin/python
+#
+# Run with: python -m unittest discover tests
+
+
+import os
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from registry import CommandRegistry
+
+
+class ReplaceSourceTest(unittest.TestCase):
+
+  def setUp(self):
+    self.Registry = CommandRegistry()
+    self.Registry.AddRecords([("task-stats", 0, "Tasks of a.c", None), ("ping", 1, "Ping", ["ip"])], "a.c")
+    self.Registry.AddRecords([("task-stats", 0, "Tasks of b.c", None), ("dir", 0, "Files", None)], "b.c")
+
+
+  def testFallbackToOtherSource(self):
+    Added, Removed, Modified = self.Registry.ReplaceSource("a.c", [("ping", 1, "Ping", ["ip"])])
+    self.assertEqual((Added, Removed), ([], []))
+    self.assertEqual([Record.Name for Record in Modified], ["task-stats"])
+    Record = self.Registry.Get("task-stats")
+    self.assertEqual((Record.Help, Record.Source), ("Tasks of b.c", "b.c"))
+    self.assertEqual([Record.Name for Record in self.Registry], ["task-stats", "ping", "dir"])
+
+    # Gone from both files
+    Added, Removed, Modified = self.Registry.ReplaceSource("b.c", [("dir", 0, "Files", None)])
+    self.assertEqual([Record.Name for Record in Removed], ["task-stats"])
+    self.assertFalse("task-stats" in self.Registry)
+    self.assertEqual(self.Registry.Complete("t"), [])
+
+
+  def testShadowedDefinitionParsedAgain(self):
+    # b.c drops its definition: a.c losing it too removes the command
+    self.Registry.ReplaceSource("b.c", [("dir", 0, "Files", None)])
+    Added, Removed, Modified = self.Registry.ReplaceSource("a.c", [("ping", 1, "Ping", ["ip"])])
+    self.assertEqual([Record.Name for Record in Removed], ["task-stats"])
+
+    # b.c defines it again, a.c defining it again takes it back
+    self.Registry.ReplaceSource("b.c", [("dir", 0, "Files", None), ("task-stats", 0, "Tasks of b.c", None)])
+    self.assertEqual(self.Registry.Get("task-stats").Source, "b.c")
+
+
+  def testManyRemoved(self):
+    Registry = CommandRegistry()
+    Count = 50000
+    Registry.AddRecords([("cmd-%d" % Number, 0, "Help", None) for Number in range(Count)], "big.c")
+    Start = time.time()
+    Added, Removed, Modified = Registry.ReplaceSource("big.c", [("cmd-0", 0, "Help", None)])
+    self.assertLess(time.time() - Start, 2.0)
+    self.assertEqual(len(Removed), Count - 1)
+    self.assertEqual([Record.Name for Record in Registry], ["cmd-0"])
+    self.assertEqual([Record.Name for Record in Registry.Complete("cmd")], ["cmd-0"])
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,86 @@
+##############################################################################
+#
+# Command line interface manager (CLIManager) for FreeRTOS+CLI
+# File: test_sessionlog.py
+# This file contains the tests of the session logs: names never shared by two
+# sessions, even started in the same second.
+#
+# This software is released under the MIT licence
+#
+# Copyright (c) 2015 Jean-Baptiste Quelard
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+###############################################################################
+#!/usr/bin/python
+#
+# Run with: python -m unittest discover tests
+
+
+import os
+import sys
+import gzip
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from sessionlog import SessionLog, SessionFilename, SENT
+
+
+class SessionFilenameTest(unittest.TestCase):
+
+  def setUp(self):
+    self.Directory = tempfile.mkdtemp()
+
+
+  def tearDown(self):
+    shutil.rmtree(self.Directory)
+
+
+  def testSameSecond(self):
+    Names = [SessionFilename(self.Directory, 1433146500) for Number in range(3)]
+    self.assertEqual(len(set(Names)), 3)
+    for Name in Names:
+      self.assertEqual(os.path.getsize(Name), 0)
+
+
+  def testSessionStillWriting(self):
+    First = SessionLog(SessionFilename(self.Directory, 1433146500))
+    First.Write(SENT, "help")
+    Second = SessionFilename(self.Directory, 1433146500)
+    First.Close()
+    First.Wait()
+    self.assertNotEqual(Second, First.Filename)
+
+
+  def testCompressedSegment(self):
+    Name = SessionFilename(self.Directory, 1433146500)
+    gzip.open(Name + ".gz", "wb").close()
+    os.remove(Name)
+    self.assertNotEqual(SessionFilename(self.Directory, 1433146500), Name)
+
+
+  def testLabel(self):
+    Name = SessionFilename(self.Directory, 1433146500, "192.168.0.10:5005")
+    self.assertTrue(os.path.basename(Name).endswith("-192.168.0.10_5005.log"))
+
+
+if __name__ == "__main__":
+  unittest.main()